@@ -2,14 +2,27 @@
 Flask web application for Strava Heatmap Generator
 """
 import os
-from flask import Flask, render_template, request, jsonify, send_file
+import shutil
+import tempfile
+from flask import Flask, g, render_template, request, jsonify, send_file
+from werkzeug.utils import safe_join
 from dotenv import load_dotenv
 import json
-from datetime import datetime
+import time
+from datetime import datetime, timezone
 
 from src.strava_api import StravaAPI
 from src.heatmap_generator import StravaHeatmapGenerator
+from src.config import Config
+from src.render_scheduler import RenderJob
+from src.job_queue import JobQueue
 from src.analytics import StravaAnalytics
+from src.tile_server import TileServer
+from src.track_store import TrackStore
+from src.spatial_index import StoreSpatialIndex, filter_collection
+from src.viewport_heatmap import activity_time_mask, viewport_cells
+from src.activity_store import load_start_times
+from src.instrumentation import metrics
 
 # Load environment variables
 load_dotenv()
@@ -21,6 +34,43 @@ app.secret_key = os.getenv('FLASK_SECRET_KEY', 'your-secret-key-here')
 strava_api = None
 heatmap_generator = StravaHeatmapGenerator()
 analytics = StravaAnalytics()
+tile_server = None
+spatial_index = None
+start_times_cache = {'key': None, 'start_times': {}}
+
+# Map jobs of /api/generate-heatmaps by map type. Every job draws only the activities of its
+# request (days_back, activity_limit, region), so the basic map renders its own tiles rather
+# than pointing at /tiles, which draws every stored track
+MAP_JOBS = {
+    'basic': RenderJob('basic', 'create_basic_heatmap', 'maps/basic_heatmap.html', kwargs={'rendering': 'tiles'}),
+    'speed': RenderJob('speed', 'create_speed_heatmap', 'maps/speed_heatmap.html'),
+    'elevation': RenderJob('elevation', 'create_elevation_heatmap', 'maps/elevation_heatmap.html'),
+    'routes': RenderJob('routes', 'create_route_map', 'maps/routes_map.html'),
+    'animated': RenderJob('animated', 'create_time_animated_heatmap', 'maps/animated_heatmap.html'),
+    'clustered': RenderJob('clustered', 'create_clustered_activity_map', 'maps/clustered_map.html'),
+    'explorer': RenderJob('explorer', 'create_interactive_route_explorer', 'maps/route_explorer.html'),
+    'comparison': RenderJob('comparison', 'create_comparison_heatmap', 'maps/comparison_heatmap.html', args=('speed',))
+}
+STATS_JOB = RenderJob('stats', 'create_activity_stats_chart', 'maps/activity_stats.png', data='dataframe')
+DASHBOARD_JOB = RenderJob('dashboard', 'create_comprehensive_dashboard', 'maps/analytics_dashboard.png',
+                          data='dataframe', target='analytics')
+# Output directories of map jobs, under maps/ and served by /maps
+JOB_DIR_PREFIX = 'job_'
+
+
+def create_job_dir(maps_dir='maps'):
+    """Make a new output directory for one map job, removing the oldest beyond the job history
+    
+    Up to Config.JOB_WORKERS jobs render at the same time, so each writes its pages and tile
+    pyramids into a directory of its own rather than replacing another job's files.
+    """
+    os.makedirs(maps_dir, exist_ok=True)
+    job_dirs = sorted((entry for entry in os.scandir(maps_dir)
+                       if entry.is_dir() and entry.name.startswith(JOB_DIR_PREFIX)),
+                      key=lambda entry: entry.stat().st_mtime)
+    for entry in job_dirs[:max(0, len(job_dirs) - Config.JOB_HISTORY_SIZE + 1)]:
+        shutil.rmtree(entry.path, ignore_errors=True)
+    return tempfile.mkdtemp(prefix=JOB_DIR_PREFIX, dir=maps_dir)
 
 
 def initialize_strava_api():
@@ -38,6 +88,91 @@ def initialize_strava_api():
     return strava_api
 
 
+def get_tile_server():
+    """Tile server over the stored GPS tracks (works without Strava credentials)"""
+    global tile_server
+    
+    if tile_server is None:
+        track_store = strava_api.track_store if strava_api and strava_api.track_store else None
+        tile_server = TileServer(track_store or TrackStore(os.path.join('cache', 'tracks')))
+    return tile_server
+
+
+def get_spatial_index():
+    """Spatial index over the stored GPS tracks, persisted next to the track cache"""
+    global spatial_index
+    
+    if spatial_index is None:
+        spatial_index = StoreSpatialIndex(get_tile_server().track_store)
+    return spatial_index.get()
+
+
+def get_activity_start_times():
+    """Activity id -> start time (epoch seconds) from the synced activity stores, reloaded when they change"""
+    cache_dir = strava_api.cache_manager.cache_dir if strava_api and strava_api.cache_manager else 'cache'
+    try:
+        key = tuple(sorted((name, os.path.getmtime(os.path.join(cache_dir, name)))
+                           for name in os.listdir(cache_dir) if name.startswith('activities_')))
+    except OSError:
+        return {}
+    if key != start_times_cache['key']:
+        start_times_cache['start_times'] = load_start_times(cache_dir)
+        start_times_cache['key'] = key
+    return start_times_cache['start_times']
+
+
+def parse_time(value):
+    """Epoch seconds from an ISO-8601 date/time or a number of seconds; None if not given"""
+    if value is None or value == '':
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        parsed = datetime.fromisoformat(value.replace('Z', '+00:00'))
+        if parsed.tzinfo is None:
+            parsed = parsed.replace(tzinfo=timezone.utc)
+        return parsed.timestamp()
+
+
+def parse_region(args):
+    """Query region from request arguments (or a JSON object with the same keys):
+    bbox=min_lat,min_lon,max_lat,max_lon, lat/lon/radius (meters), or
+    polyline=lat,lon;lat,lon;... with an optional width (meters)
+    """
+    def floats(value, count=None):
+        values = [float(v) for v in (value.split(',') if isinstance(value, str) else value)]
+        if count is not None and len(values) != count:
+            raise ValueError(f"Expected {count} comma-separated numbers, got {value!r}")
+        return values
+    
+    if 'bbox' in args:
+        return {'bbox': floats(args['bbox'], 4)}
+    if 'radius' in args:
+        return {'center': [float(args['lat']), float(args['lon'])], 'radius_m': float(args['radius'])}
+    if 'polyline' in args:
+        vertices = args['polyline'].split(';') if isinstance(args['polyline'], str) else args['polyline']
+        region = {'polyline': [floats(vertex, 2) for vertex in vertices if vertex]}
+        if 'width' in args:
+            region['width_m'] = float(args['width'])
+        return region
+    raise ValueError("Give a region as bbox, lat/lon/radius or polyline")
+
+
+@app.before_request
+def start_request_timer():
+    g.request_start = time.perf_counter()
+
+
+@app.after_request
+def record_request_time(response):
+    """Time every request by route, so /metrics shows where request time goes"""
+    if 'request_start' in g:
+        route = request.url_rule.rule if request.url_rule else 'unmatched'
+        metrics.observe('http_request', time.perf_counter() - g.request_start,
+                        route=route, method=request.method, status=response.status_code)
+    return response
+
+
 @app.route('/')
 def index():
     """Main page"""
@@ -110,87 +245,204 @@ def get_activities():
         return jsonify({'success': False, 'error': str(e)}), 500
 
 
+@metrics.timed('map_job')
+def run_generate_heatmaps(params, report):
+    """Fetch activities and GPS streams and render the requested maps (runs as a background job)"""
+    map_types = params['map_types']
+    # Quick mode draws the maps that only need route shapes from the listing's summary polylines
+    quick_maps = [m for m in map_types if m in Config.SUMMARY_POLYLINE_MAPS] if params.get('quick') else []
+    detail_maps = [m for m in map_types if m not in quick_maps]
+    
+    report('activities', 0.0, 'Fetching activities')
+    activities_df = strava_api.get_all_cycling_activities(days_back=params['days_back'])
+    
+    # Get detailed GPS data
+    if not activities_df.empty and (detail_maps or not quick_maps):
+        activity_ids = activities_df['id'].head(params['activity_limit']).tolist()
+        detailed_activities = strava_api.get_track_collection(
+            activity_ids=activity_ids,
+            progress=lambda done, total: report('streams', 0.1 + 0.5 * done / total,
+                                                f"Fetched GPS data for {done}/{total} activities")
+        )
+    else:
+        detailed_activities = []
+    summary_tracks = strava_api.get_summary_track_collection(activities_df) if quick_maps else []
+    
+    if params.get('region'):
+        if detailed_activities:
+            detailed_activities = filter_collection(detailed_activities, params['region'])
+        if summary_tracks:
+            summary_tracks = filter_collection(summary_tracks, params['region'])
+        report('streams', 0.6, f"{len(detailed_activities) or len(summary_tracks)} activities pass through the region")
+    
+    # Create output directory
+    output_dir = create_job_dir()
+    
+    # Requested maps are independent, so they are rendered in parallel
+    jobs = []
+    if detailed_activities:
+        jobs += [MAP_JOBS[map_type] for map_type in detail_maps if map_type in MAP_JOBS]
+    
+    # Statistics chart and comprehensive analytics dashboard
+    if not activities_df.empty:
+        jobs += [STATS_JOB, DASHBOARD_JOB]
+    
+    quick_jobs = [MAP_JOBS[map_type] for map_type in quick_maps if map_type in MAP_JOBS] if summary_tracks else []
+    jobs = [job.with_output_dir(output_dir) for job in jobs]
+    quick_jobs = [job.with_output_dir(output_dir) for job in quick_jobs]
+    total_jobs = len(jobs) + len(quick_jobs)
+    report('rendering', 0.6, f"Rendering {total_jobs} maps")
+    rendered = []
+    
+    def map_finished(name, result):
+        rendered.append(name)
+        status = f"failed: {result['error']}" if result['error'] else f"done in {result['seconds']:.1f}s"
+        report('rendering', 0.6 + 0.4 * len(rendered) / total_jobs, f"{name} map {status}")
+    
+    results = heatmap_generator.render_maps(quick_jobs, summary_tracks, on_complete=map_finished)
+    results.update(heatmap_generator.render_maps(jobs, detailed_activities, activities_df, on_complete=map_finished))
+    # Paths under /maps
+    generated_files = {
+        name: os.path.relpath(result['output_file'], 'maps').replace(os.sep, '/')
+        for name, result in results.items() if not result['error']
+    }
+    
+    return {
+        'generated_files': generated_files,
+        'activities_processed': len(detailed_activities),
+        'summary_activities': len(summary_tracks),
+        'total_activities': len(activities_df) if not activities_df.empty else 0
+    }
+
+
+job_queue = JobQueue(run_generate_heatmaps)
+
+
 @app.route('/api/generate-heatmaps', methods=['POST'])
 def generate_heatmaps():
-    """Generate all heatmaps"""
+    """Queue generation of the requested heatmaps and return the job id right away
+    
+    Progress streams from /api/jobs/<job_id>/events; an identical request made while
+    a job is still pending joins that job instead of starting a new one.
+    """
     try:
+        data = request.get_json(silent=True) or {}
+        params = {
+            'map_types': sorted(set(data.get('map_types', ['basic', 'speed', 'elevation', 'routes']))),
+            'activity_limit': int(data.get('activity_limit', 50)),
+            'days_back': int(data.get('days_back', 365)),
+            'quick': bool(data.get('quick', False))
+        }
+        if data.get('region'):
+            # Same syntax as /api/activities/search, e.g. {"bbox": "45.0,7.0,45.2,7.3"}
+            try:
+                params['region'] = parse_region(data['region'])
+            except (KeyError, TypeError, ValueError) as e:
+                return jsonify({'success': False, 'error': f"Invalid region: {e}"}), 400
+        
         if not strava_api:
             initialize_strava_api()
         
-        data = request.json
-        map_types = data.get('map_types', ['basic', 'speed', 'elevation', 'routes'])
-        activity_limit = data.get('activity_limit', 50)
-        days_back = data.get('days_back', 365)
-        
-        # Get activities summary
-        activities_df = strava_api.get_all_cycling_activities(days_back=days_back)
-        
-        # Get detailed GPS data
-        if not activities_df.empty:
-            activity_ids = activities_df['id'].head(activity_limit).tolist()
-            detailed_activities = strava_api.get_activities_with_detailed_streams(
-                activity_ids=activity_ids
-            )
-        else:
-            detailed_activities = []
-        
-        # Create output directory
-        os.makedirs('maps', exist_ok=True)
-        
-        generated_files = {}
-        
-        # Generate requested maps
-        if 'basic' in map_types and detailed_activities:
-            heatmap_generator.create_basic_heatmap(detailed_activities, 'maps/basic_heatmap.html')
-            generated_files['basic'] = 'basic_heatmap.html'
-        
-        if 'speed' in map_types and detailed_activities:
-            heatmap_generator.create_speed_heatmap(detailed_activities, 'maps/speed_heatmap.html')
-            generated_files['speed'] = 'speed_heatmap.html'
-        
-        if 'elevation' in map_types and detailed_activities:
-            heatmap_generator.create_elevation_heatmap(detailed_activities, 'maps/elevation_heatmap.html')
-            generated_files['elevation'] = 'elevation_heatmap.html'
-        
-        if 'routes' in map_types and detailed_activities:
-            heatmap_generator.create_route_map(detailed_activities, 'maps/routes_map.html')
-            generated_files['routes'] = 'routes_map.html'
-        
-        # New advanced visualizations
-        if 'animated' in map_types and detailed_activities:
-            heatmap_generator.create_time_animated_heatmap(detailed_activities, 'maps/animated_heatmap.html')
-            generated_files['animated'] = 'animated_heatmap.html'
-        
-        if 'clustered' in map_types and detailed_activities:
-            heatmap_generator.create_clustered_activity_map(detailed_activities, 'maps/clustered_map.html')
-            generated_files['clustered'] = 'clustered_map.html'
-        
-        if 'explorer' in map_types and detailed_activities:
-            heatmap_generator.create_interactive_route_explorer(detailed_activities, 'maps/route_explorer.html')
-            generated_files['explorer'] = 'route_explorer.html'
-        
-        if 'comparison' in map_types and detailed_activities:
-            heatmap_generator.create_comparison_heatmap(detailed_activities, 'maps/comparison_heatmap.html', 'speed')
-            generated_files['comparison'] = 'comparison_heatmap.html'
-        
-        # Generate statistics chart and dashboard
-        if not activities_df.empty:
-            heatmap_generator.create_activity_stats_chart(activities_df, 'maps/activity_stats.png')
-            generated_files['stats'] = 'activity_stats.png'
-            
-            # Generate comprehensive analytics dashboard
-            analytics.create_comprehensive_dashboard(activities_df, 'maps/analytics_dashboard.png')
-            generated_files['dashboard'] = 'analytics_dashboard.png'
-        
+        job, created = job_queue.submit(params)
+        response = jsonify({
+            'success': True,
+            'data': {
+                'job_id': job.id,
+                'status': job.status,
+                'deduplicated': not created,
+                'status_url': f"/api/jobs/{job.id}",
+                'events_url': f"/api/jobs/{job.id}/events"
+            }
+        })
+        response.status_code = 202
+        response.headers['Location'] = f"/api/jobs/{job.id}"
+        return response
+    
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+
+@app.route('/api/jobs/<job_id>')
+def job_status(job_id):
+    """Current state of a background job, including its result once finished"""
+    job = job_queue.get(job_id)
+    if job is None:
+        return jsonify({'success': False, 'error': 'Job not found'}), 404
+    return jsonify({'success': True, 'data': job.to_dict()})
+
+
+@app.route('/api/jobs/<job_id>/events')
+def job_events(job_id):
+    """Server-Sent Events stream of a job's progress, ending with a 'done' event"""
+    if job_queue.get(job_id) is None:
+        return jsonify({'success': False, 'error': 'Job not found'}), 404
+    
+    # Resume after the last event a reconnecting EventSource received
+    last_event_id = request.headers.get('Last-Event-ID', -1, type=int)
+    
+    def stream():
+        for event in job_queue.events(job_id, last_event_id):
+            if event is None:
+                yield ": keep-alive\n\n"
+            else:
+                yield f"id: {event['id']}\nevent: {event['event']}\ndata: {json.dumps(event['data'])}\n\n"
+    
+    response = app.response_class(stream(), mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    # Stop reverse proxies (nginx) from buffering the stream
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
+
+@app.route('/api/activities/search')
+def search_activities():
+    """Ids of the stored activities passing through a bounding box, circle or corridor"""
+    try:
+        region = parse_region(request.args)
+    except (KeyError, ValueError) as e:
+        return jsonify({'success': False, 'error': f"Invalid region: {e}"}), 400
+    
+    try:
+        index = get_spatial_index()
+        start = time.perf_counter()
+        activity_ids = index.query(region)
+        query_ms = (time.perf_counter() - start) * 1000
         return jsonify({
             'success': True,
             'data': {
-                'generated_files': generated_files,
-                'activities_processed': len(detailed_activities),
-                'total_activities': len(activities_df) if not activities_df.empty else 0
+                'activity_ids': [int(i) for i in activity_ids],
+                'count': len(activity_ids),
+                'query_ms': round(query_ms, 3)
             }
         })
-        
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+
+@app.route('/api/heatmap')
+def viewport_heatmap():
+    """Heatmap cells of the stored points inside a viewport, binned for its zoom level
+    
+    Takes bbox=min_lat,min_lon,max_lat,max_lon and zoom, plus optional from/to dates
+    (ISO-8601 or epoch seconds) matched against the activities' start times.
+    """
+    try:
+        region = parse_region(request.args)
+        if 'bbox' not in region:
+            raise ValueError("bbox is required")
+        zoom = request.args.get('zoom', type=int)
+        if zoom is None:
+            raise ValueError("zoom is required")
+        start, end = parse_time(request.args.get('from')), parse_time(request.args.get('to'))
+    except (KeyError, ValueError) as e:
+        return jsonify({'success': False, 'error': f"Invalid request: {e}"}), 400
+    
+    try:
+        index = get_spatial_index()
+        activity_mask = activity_time_mask(index.ids, get_activity_start_times(), start, end)
+        return jsonify({'success': True, 'data': viewport_cells(index, region['bbox'], zoom, activity_mask)})
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
 
@@ -235,24 +487,46 @@ def get_activity_insights():
                 'detailed_analysis': report.get('detailed_analysis', {})
             }
         })
-        
+    
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
 
 
-@app.route('/maps/<filename>')
+@app.route('/maps/<path:filename>')
 def serve_map(filename):
-    """Serve generated map files"""
+    """Serve generated map files, including the pages and heatmap tiles of each job directory"""
     try:
-        file_path = os.path.join('maps', filename)
-        if os.path.exists(file_path):
-            return send_file(file_path)
+        file_path = safe_join('maps', filename)
+        if file_path and os.path.isfile(file_path):
+            # Maps are written relative to the working directory; send_file would resolve against the app root
+            return send_file(os.path.abspath(file_path))
         else:
             return "File not found", 404
     except Exception as e:
         return str(e), 500
 
 
+@app.route('/tiles/<layer>/<int:z>/<int:x>/<int:y>.png')
+def serve_tile(layer, z, x, y):
+    """Serve a heatmap tile rendered on demand from the stored GPS tracks"""
+    try:
+        server = get_tile_server()
+        if not server.is_valid_tile(layer, z, x, y):
+            return "Tile not found", 404
+        
+        etag = server.etag(layer, z, x, y)
+        if request.if_none_match.contains(etag):
+            response = app.response_class(status=304)
+        else:
+            response = app.response_class(server.get_tile(layer, z, x, y), mimetype='image/png')
+        response.set_etag(etag)
+        # Revalidate on every use: tiles change whenever new activities are stored
+        response.headers['Cache-Control'] = 'no-cache'
+        return response
+    except Exception as e:
+        return str(e), 500
+
+
 @app.route('/api/map-status')
 def map_status():
     """Check which maps are available"""
@@ -280,6 +554,12 @@ def map_status():
     return jsonify({'success': True, 'data': available_maps})
 
 
+@app.route('/metrics')
+def prometheus_metrics():
+    """Request, API, cache and pipeline stage metrics in the Prometheus text format"""
+    return app.response_class(metrics.to_prometheus(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+
 if __name__ == '__main__':
     try:
         initialize_strava_api()
@@ -2,6 +2,7 @@
 """
 Command-line interface for Strava Heatmap Generator
 """
+import atexit
 import os
 import sys
 import argparse
@@ -9,6 +10,46 @@ from dotenv import load_dotenv
 
 from src.strava_api import StravaAPI
 from src.heatmap_generator import StravaHeatmapGenerator
+from src.render_scheduler import RenderJob
+from src.config import Config
+from src.bulk_import import BulkExportImporter
+from src.track_store import TrackStore
+from src.instrumentation import metrics
+
+# Generator method for each map type
+MAP_METHODS = {
+    'basic': 'create_basic_heatmap',
+    'speed': 'create_speed_heatmap',
+    'elevation': 'create_elevation_heatmap',
+    'routes': 'create_route_map'
+}
+
+
+def import_bulk_export(args):
+    """Generate maps from a Strava bulk-export archive, without any API request"""
+    print(f"Importing activities from {args.import_export}...")
+    importer = BulkExportImporter(args.import_export)
+    tracks = importer.load_tracks(TrackStore(os.path.join('cache', 'tracks')), cache_dir='cache')
+    if not tracks:
+        print("No rides with GPS data found in the archive.")
+        return
+    
+    # The statistics chart needs the API's activity summaries
+    map_types = [m for m in args.maps if m != 'stats']
+    os.makedirs(args.output_dir, exist_ok=True)
+    print(f"\nGenerating {', '.join(map_types)} maps for {len(tracks)} activities...")
+    jobs = [
+        RenderJob(map_type, MAP_METHODS[map_type], os.path.join(args.output_dir, f'{map_type}_heatmap.html'))
+        for map_type in map_types
+    ]
+    StravaHeatmapGenerator().render_maps(jobs, tracks)
+    print(f"📁 Output directory: {os.path.abspath(args.output_dir)}")
+
+
+def print_profile():
+    """Where the run's time went, by pipeline stage (--profile)"""
+    print("\n⏱  Profile by stage:")
+    print(metrics.format_summary())
 
 
 def main():
@@ -19,10 +60,31 @@ def main():
     parser.add_argument('--maps', nargs='+', default=['basic', 'speed', 'elevation', 'routes'], 
                        choices=['basic', 'speed', 'elevation', 'routes', 'stats'],
                        help='Types of maps to generate (default: all)')
+    parser.add_argument('--quick', action='store_true',
+                       help='Draw basic and route maps of every activity in --days from the listing\'s summary '
+                            'polylines, without fetching GPS streams (speed/elevation maps still fetch them)')
+    parser.add_argument('--import-export', metavar='ZIP',
+                       help='Build the maps from a Strava bulk-export archive (GPX/TCX/FIT) instead of the API; '
+                            'every ride in it is used, so --days and --limit do not apply')
     parser.add_argument('--output-dir', default='maps', help='Output directory for generated maps (default: maps)')
+    parser.add_argument('--profile', action='store_true',
+                       help='Print time spent per pipeline stage (API, cache, geometry, rendering, writing) at the end')
+    parser.add_argument('--metrics-log', metavar='FILE',
+                       help="Append every timed stage as a JSON line to FILE ('-' for stderr)")
     
     args = parser.parse_args()
     
+    if args.metrics_log:
+        # Render worker processes read the destination from the environment
+        os.environ['STRAVA_METRICS_LOG'] = args.metrics_log
+        metrics.configure_log(args.metrics_log)
+    if args.profile:
+        atexit.register(print_profile)
+    
+    if args.import_export:
+        import_bulk_export(args)
+        return
+    
     # Load environment variables
     load_dotenv()
     
@@ -69,12 +131,26 @@ def main():
             stats_file = os.path.join(args.output_dir, 'activity_stats.png')
             heatmap_generator.create_activity_stats_chart(activities_df, stats_file)
         
-        # Get detailed GPS data for maps
         map_types = [m for m in args.maps if m != 'stats']
+        
+        # Quick mode: maps that only need route shapes come from the summary polylines
+        if args.quick:
+            quick_maps = [m for m in map_types if m in Config.SUMMARY_POLYLINE_MAPS]
+            map_types = [m for m in map_types if m not in quick_maps]
+            summary_tracks = strava_api.get_summary_track_collection(activities_df) if quick_maps else None
+            if summary_tracks:
+                print(f"\nGenerating {', '.join(quick_maps)} maps from summary polylines...")
+                jobs = [
+                    RenderJob(map_type, MAP_METHODS[map_type], os.path.join(args.output_dir, f'{map_type}_heatmap.html'))
+                    for map_type in quick_maps
+                ]
+                heatmap_generator.render_maps(jobs, summary_tracks)
+        
+        # Get detailed GPS data for maps
         if map_types:
             print(f"\\nFetching detailed GPS data for up to {args.limit} activities...")
             activity_ids = activities_df['id'].head(args.limit).tolist()
-            detailed_activities = strava_api.get_activities_with_detailed_streams(activity_ids=activity_ids)
+            detailed_activities = strava_api.get_track_collection(activity_ids=activity_ids)
             
             if not detailed_activities:
                 print("No activities with GPS data found.")
@@ -82,19 +158,13 @@ def main():
             
             print(f"Successfully loaded GPS data for {len(detailed_activities)} activities")
             
-            # Generate maps
-            for map_type in map_types:
-                print(f"\\nGenerating {map_type} map...")
-                output_file = os.path.join(args.output_dir, f'{map_type}_heatmap.html')
-                
-                if map_type == 'basic':
-                    heatmap_generator.create_basic_heatmap(detailed_activities, output_file)
-                elif map_type == 'speed':
-                    heatmap_generator.create_speed_heatmap(detailed_activities, output_file)
-                elif map_type == 'elevation':
-                    heatmap_generator.create_elevation_heatmap(detailed_activities, output_file)
-                elif map_type == 'routes':
-                    heatmap_generator.create_route_map(detailed_activities, output_file)
+            # Generate maps (independent, so rendered in parallel)
+            print(f"\\nGenerating {', '.join(map_types)} maps...")
+            jobs = [
+                RenderJob(map_type, MAP_METHODS[map_type], os.path.join(args.output_dir, f'{map_type}_heatmap.html'))
+                for map_type in map_types
+            ]
+            heatmap_generator.render_maps(jobs, detailed_activities)
         
         print(f"\\n✅ All maps generated successfully!")
         print(f"📁 Output directory: {os.path.abspath(args.output_dir)}")
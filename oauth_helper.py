@@ -2,11 +2,12 @@
 """
 OAuth helper script to get a properly scoped Strava access token
 """
-import requests
 import webbrowser
 from urllib.parse import parse_qs, urlparse
 import sys
 
+from src.http_session import PooledSession
+
 
 def get_strava_token(client_id, client_secret):
     """Get a new Strava access token with proper scopes"""
@@ -71,7 +72,8 @@ def get_strava_token(client_id, client_secret):
     }
     
     try:
-        response = requests.post(token_url, data=data)
+        with PooledSession(pool_size=1) as session:
+            response = session.post(token_url, data=data, timeout=30)
         
         if response.status_code == 200:
             token_data = response.json()
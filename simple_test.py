@@ -9,11 +9,8 @@ from dotenv import load_dotenv
 # Load environment variables
 load_dotenv()
 
-# Add src directory to path
-sys.path.append(os.path.join(os.path.dirname(__file__), 'src'))
-
 try:
-    from strava_api import StravaAPI
+    from src.strava_api import StravaAPI
     
     def test_strava_connection():
         """Test connection to Strava API"""
@@ -0,0 +1,152 @@
+"""
+Persistent per-athlete activity store used for incremental Strava syncs
+"""
+import json
+import os
+from datetime import datetime, timezone
+from typing import Dict, List, Optional, Tuple
+
+
+class ActivityStore:
+    """Activity summaries for one athlete, merged across syncs and saved as JSON
+    
+    Besides the activities themselves the store remembers two sync markers:
+    the high-water mark (latest start_date seen in any listing, cycling or not)
+    and synced_since (the earliest point in time the listing has been fetched from).
+    """
+    
+    def __init__(self, store_dir: str, athlete_id: int):
+        self.store_dir = store_dir
+        self.athlete_id = athlete_id
+        self.path = os.path.join(store_dir, f"activities_{athlete_id}.json")
+        self.activities: Dict[str, Dict] = {}
+        self.high_water_mark: Optional[datetime] = None
+        self.synced_since: Optional[datetime] = None
+        self.load()
+    
+    def load(self) -> None:
+        """Load the store from disk if it exists"""
+        if not os.path.exists(self.path):
+            return
+        
+        try:
+            with open(self.path, 'r') as f:
+                data = json.load(f)
+        except Exception as e:
+            print(f"Warning: Error reading activity store {self.path}: {e}")
+            return
+        
+        self.activities = data.get('activities', {})
+        self.high_water_mark = _parse_timestamp(data.get('high_water_mark'))
+        self.synced_since = _parse_timestamp(data.get('synced_since'))
+    
+    def save(self) -> None:
+        """Atomically write the store to disk"""
+        os.makedirs(self.store_dir, exist_ok=True)
+        data = {
+            'athlete_id': self.athlete_id,
+            'high_water_mark': self.high_water_mark.isoformat() if self.high_water_mark else None,
+            'synced_since': self.synced_since.isoformat() if self.synced_since else None,
+            'activities': self.activities
+        }
+        
+        tmp_path = f"{self.path}.tmp"
+        try:
+            with open(tmp_path, 'w') as f:
+                json.dump(data, f)
+            os.replace(tmp_path, self.path)
+        except Exception as e:
+            print(f"Warning: Error writing activity store {self.path}: {e}")
+    
+    def advance_high_water_mark(self, listed_activities: List[Dict]) -> None:
+        """Move the high-water mark past every activity in a listing page"""
+        for activity in listed_activities:
+            start = _parse_timestamp(activity.get('start_date'))
+            if start and (self.high_water_mark is None or start > self.high_water_mark):
+                self.high_water_mark = start
+    
+    def merge(self, activities: List[Dict]) -> int:
+        """Insert or update activities by id; returns the number of new activities"""
+        added = 0
+        for activity in activities:
+            key = str(activity['id'])
+            if key not in self.activities:
+                added += 1
+            self.activities[key] = activity
+        return added
+    
+    def replace_window(self, after: datetime, activities: List[Dict]) -> Tuple[int, int]:
+        """Make a complete listing of everything after a point in time authoritative
+        
+        Stored activities in the window that the listing no longer contains (deleted, made
+        private or no longer cycling) are dropped. Returns (added, removed).
+        """
+        after = _as_utc(after)
+        listed = {str(activity['id']) for activity in activities}
+        stale = [key for key, activity in self.activities.items()
+                 for start in [_parse_timestamp(activity.get('start_date'))]
+                 if start and start > after and key not in listed]
+        for key in stale:
+            del self.activities[key]
+        return self.merge(activities), len(stale)
+    
+    def activities_since(self, after: datetime) -> List[Dict]:
+        """Stored activities that started after a point in time, oldest first"""
+        after = _as_utc(after)
+        selected = [
+            (start, activity) for activity in self.activities.values()
+            for start in [_parse_timestamp(activity.get('start_date'))]
+            if start and start > after
+        ]
+        selected.sort(key=lambda item: item[0])
+        return [activity for _, activity in selected]
+
+
+def load_start_times(store_dir: str) -> Dict[int, float]:
+    """Start time (epoch seconds) of every activity in the activity stores under store_dir"""
+    start_times = {}
+    if not os.path.isdir(store_dir):
+        return start_times
+    for name in sorted(os.listdir(store_dir)):
+        if not (name.startswith('activities_') and name.endswith('.json')):
+            continue
+        try:
+            with open(os.path.join(store_dir, name), 'r') as f:
+                activities = json.load(f).get('activities', {})
+        except Exception as e:
+            print(f"Warning: Error reading activity store {name}: {e}")
+            continue
+        for activity in activities.values():
+            start = _parse_timestamp(activity.get('start_date'))
+            if start is not None:
+                start_times[int(activity['id'])] = start.timestamp()
+    return start_times
+
+
+def clear_activity_stores(store_dir: str) -> int:
+    """Delete every activity store under store_dir, so the next sync lists from scratch"""
+    removed = 0
+    if not os.path.isdir(store_dir):
+        return removed
+    for name in os.listdir(store_dir):
+        if name.startswith('activities_') and (name.endswith('.json') or name.endswith('.json.tmp')):
+            os.remove(os.path.join(store_dir, name))
+            removed += 1
+    return removed
+
+
+def _as_utc(value: datetime) -> datetime:
+    """Treat naive datetimes as local time and convert to aware UTC"""
+    if value.tzinfo is None:
+        value = value.astimezone()
+    return value.astimezone(timezone.utc)
+
+
+def _parse_timestamp(value: Optional[str]) -> Optional[datetime]:
+    """Parse an ISO-8601 timestamp (Strava uses a trailing Z) into an aware UTC datetime"""
+    if not value:
+        return None
+    try:
+        return _as_utc(datetime.fromisoformat(value.replace('Z', '+00:00')))
+    except (TypeError, ValueError):
+        return None
@@ -5,43 +5,58 @@ import folium
 from folium.plugins import HeatMap, HeatMapWithTime, MarkerCluster, MiniMap, Draw
 import numpy as np
 import pandas as pd
-from typing import List, Dict, Tuple, Optional
+from typing import List, Dict, Tuple, Optional, Union
 from datetime import datetime, timedelta
 import json
 from collections import defaultdict
+from .colormaps import normalize
+from .tracks import TrackCollection
+from .config import Config
+from .instrumentation import span
+from .simplify import meters_per_pixel, resample_collection
+from .spatial_index import filter_collection
+
+# Spacing of the animated heatmap's points along each route, in pixels at the initial zoom
+HEAT_POINT_SPACING_PIXELS = 5
 
 
 class AdvancedVisualizationMixin:
     """Mixin class containing advanced visualization methods"""
     
-    def create_time_animated_heatmap(self, activities_data: List[Dict], output_file: str, time_period: str = 'month') -> None:
+    def create_time_animated_heatmap(self, activities_data: Union[TrackCollection, List[Dict]], output_file: str, time_period: str = 'month') -> None:
         """Create animated heatmap showing activity over time"""
         print("Creating time-animated heatmap...")
+        activities_data = TrackCollection.coerce(activities_data)
         
         if not activities_data:
             print("No activity data available for time animation")
             return
         
+        summary = self._get_dataset_summary(activities_data)
+        center = summary.density_center or self.default_center
+        zoom = summary.zoom or self.default_zoom
+        
+        # Simplify each route, then space its points a fraction of the heat radius apart
+        # along the simplified line, so every frame keeps its shape with few points
+        spacing = meters_per_pixel(zoom, center[0]) * HEAT_POINT_SPACING_PIXELS
+        routes = resample_collection(self._simplify_for_zoom(activities_data, zoom), spacing)
+        
         # Group activities by time period
         time_groups = defaultdict(list)
         
-        for activity in activities_data:
-            coords = activity.get('coordinates', [])
-            activity_id = activity.get('id')
-            
+        for track in routes:
             # For now, we'll group by activity (since we don't have timestamps in the data)
             # In a real implementation, you'd group by actual time periods
-            if coords:
-                time_groups[f"Activity {activity_id}"].extend([[coord[0], coord[1], 1] for coord in coords])
+            if len(track):
+                time_groups[f"Activity {track.id}"].append(
+                    np.column_stack([track.lat, track.lon, np.ones(len(track))])
+                )
         
         if not time_groups:
             print("No coordinate data found for time animation")
             return
         
         # Create map
-        center = self._calculate_activity_density_center(activities_data)
-        zoom = self._calculate_optimal_zoom(activities_data)
-        
         m = folium.Map(
             location=center,
             zoom_start=zoom,
@@ -52,11 +67,10 @@ class AdvancedVisualizationMixin:
         heat_data = []
         time_index = []
         
-        for time_period, coords in time_groups.items():
-            if coords:
-                # Sample coordinates for performance
-                sampled_coords = self._sample_coordinates(coords, max_points=500)
-                heat_data.append(sampled_coords)
+        for time_period, chunks in time_groups.items():
+            coords = np.concatenate(chunks)
+            if len(coords):
+                heat_data.append(coords.tolist())
                 time_index.append(time_period)
         
         if heat_data:
@@ -76,19 +90,22 @@ class AdvancedVisualizationMixin:
         m.add_child(minimap)
         
         # Save map
-        m.save(output_file)
+        with span('write_file', format='html'):
+            m.save(output_file)
         print(f"Time-animated heatmap saved to: {output_file}")
     
-    def create_clustered_activity_map(self, activities_data: List[Dict], output_file: str) -> None:
+    def create_clustered_activity_map(self, activities_data: Union[TrackCollection, List[Dict]], output_file: str) -> None:
         """Create a map with clustered activity start/end points"""
         print("Creating clustered activity map...")
+        activities_data = TrackCollection.coerce(activities_data)
         
         if not activities_data:
             print("No activity data available for clustering")
             return
         
-        center = self._calculate_activity_density_center(activities_data)
-        zoom = self._calculate_optimal_zoom(activities_data)
+        summary = self._get_dataset_summary(activities_data)
+        center = summary.density_center or self.default_center
+        zoom = summary.zoom or self.default_zoom
         
         m = folium.Map(
             location=center,
@@ -100,26 +117,29 @@ class AdvancedVisualizationMixin:
         start_cluster = MarkerCluster(name="Activity Start Points").add_to(m)
         end_cluster = MarkerCluster(name="Activity End Points").add_to(m)
         
-        for activity in activities_data:
-            coords = activity.get('coordinates', [])
-            activity_id = activity.get('id', 'Unknown')
+        # First and last point of every track with at least two points
+        lengths = activities_data.lengths
+        has_route = np.flatnonzero(lengths >= 2)
+        starts = activities_data.offsets[:-1][has_route]
+        ends = activities_data.offsets[1:][has_route] - 1
+        
+        for activity_id, start_lat, start_lon, end_lat, end_lon in zip(
+                activities_data.ids[has_route].tolist(),
+                activities_data.lat[starts].tolist(), activities_data.lon[starts].tolist(),
+                activities_data.lat[ends].tolist(), activities_data.lon[ends].tolist()):
+            # Start point
+            folium.Marker(
+                location=[start_lat, start_lon],
+                popup=f"Activity {activity_id} - Start",
+                icon=folium.Icon(color='green', icon='play')
+            ).add_to(start_cluster)
             
-            if len(coords) >= 2:
-                # Start point
-                start_coord = coords[0]
-                folium.Marker(
-                    location=[start_coord[0], start_coord[1]],
-                    popup=f"Activity {activity_id} - Start",
-                    icon=folium.Icon(color='green', icon='play')
-                ).add_to(start_cluster)
-                
-                # End point
-                end_coord = coords[-1]
-                folium.Marker(
-                    location=[end_coord[0], end_coord[1]],
-                    popup=f"Activity {activity_id} - End",
-                    icon=folium.Icon(color='red', icon='stop')
-                ).add_to(end_cluster)
+            # End point
+            folium.Marker(
+                location=[end_lat, end_lon],
+                popup=f"Activity {activity_id} - End",
+                icon=folium.Icon(color='red', icon='stop')
+            ).add_to(end_cluster)
         
         # Add layer control
         folium.LayerControl().add_to(m)
@@ -129,19 +149,28 @@ class AdvancedVisualizationMixin:
         m.add_child(minimap)
         
         # Save map
-        m.save(output_file)
+        with span('write_file', format='html'):
+            m.save(output_file)
         print(f"Clustered activity map saved to: {output_file}")
     
-    def create_interactive_route_explorer(self, activities_data: List[Dict], output_file: str) -> None:
-        """Create an interactive map where users can draw and explore routes"""
+    def create_interactive_route_explorer(self, activities_data: Union[TrackCollection, List[Dict]], output_file: str,
+                                          region: Optional[Dict] = None) -> None:
+        """Create an interactive map where users can draw and explore routes
+        
+        region optionally limits the map to activities passing through it (see SpatialIndex.query).
+        """
         print("Creating interactive route explorer...")
+        activities_data = TrackCollection.coerce(activities_data)
+        if region:
+            activities_data = filter_collection(activities_data, region)
         
         if not activities_data:
             print("No activity data available for route explorer")
             return
         
-        center = self._calculate_activity_density_center(activities_data)
-        zoom = self._calculate_optimal_zoom(activities_data)
+        summary = self._get_dataset_summary(activities_data)
+        center = summary.density_center or self.default_center
+        zoom = summary.zoom or self.default_zoom
         
         m = folium.Map(
             location=center,
@@ -160,16 +189,19 @@ class AdvancedVisualizationMixin:
                        'darkpurple', 'white', 'pink', 'lightblue', 'lightgreen', 
                        'gray', 'black', 'lightgray']
         
-        for i, activity in enumerate(activities_data[:20]):  # Limit to first 20 for performance
-            coords = activity.get('coordinates', [])
-            activity_id = activity.get('id', f'Activity_{i}')
+        routes = activities_data.head(20)  # Limit to first 20 for performance
+        route_stats = self._calculate_collection_statistics(routes)
+        # Simplify to what is visible a few zoom levels past the initial view
+        simplified_routes = self._simplify_for_zoom(routes, zoom + Config.SIMPLIFY_ZOOM_OFFSET)
+        
+        for i, track in enumerate(simplified_routes):
+            activity_id = track.id if track.id is not None else f'Activity_{i}'
             
-            if len(coords) >= 2:
-                # Sample coordinates for performance
-                sampled_coords = self._sample_coordinates(coords, max_points=200)
+            if len(track) >= 2:
+                route_coords = track.coords.tolist()
                 
-                # Calculate route statistics
-                stats = self._calculate_route_statistics(activity)
+                # Route statistics, computed for all routes at once above
+                stats = {name: values[i] for name, values in route_stats.items()}
                 
                 # Create popup with route information
                 popup_text = f"""
@@ -183,7 +215,7 @@ class AdvancedVisualizationMixin:
                 
                 # Add route as polyline
                 folium.PolyLine(
-                    locations=sampled_coords,
+                    locations=route_coords,
                     color=route_colors[i % len(route_colors)],
                     weight=3,
                     opacity=0.8,
@@ -211,20 +243,23 @@ class AdvancedVisualizationMixin:
         folium.LayerControl().add_to(m)
         
         # Save map
-        m.save(output_file)
+        with span('write_file', format='html'):
+            m.save(output_file)
         print(f"Interactive route explorer saved to: {output_file}")
     
-    def create_comparison_heatmap(self, activities_data: List[Dict], output_file: str, 
+    def create_comparison_heatmap(self, activities_data: Union[TrackCollection, List[Dict]], output_file: str, 
                                  comparison_metric: str = 'speed') -> None:
         """Create a heatmap comparing different metrics across routes"""
         print(f"Creating comparison heatmap for {comparison_metric}...")
+        activities_data = TrackCollection.coerce(activities_data)
         
         if not activities_data:
             print("No activity data available for comparison")
             return
         
-        center = self._calculate_activity_density_center(activities_data)
-        zoom = self._calculate_optimal_zoom(activities_data)
+        summary = self._get_dataset_summary(activities_data)
+        center = summary.density_center or self.default_center
+        zoom = summary.zoom or self.default_zoom
         
         m = folium.Map(
             location=center,
@@ -233,43 +268,25 @@ class AdvancedVisualizationMixin:
         )
         
         # Collect all data points with comparison values
-        comparison_data = []
+        if comparison_metric == 'speed':
+            values = activities_data.velocity * 3.6  # Convert m/s to km/h
+        elif comparison_metric == 'elevation':
+            values = activities_data.altitude
+        else:
+            values = np.ones(activities_data.point_count)  # Default weight
         
-        for activity in activities_data:
-            coords = activity.get('coordinates', [])
-            
-            if comparison_metric == 'speed':
-                values = activity.get('velocity', [])
-                # Convert m/s to km/h
-                values = [v * 3.6 if v else 0 for v in values]
-            elif comparison_metric == 'elevation':
-                values = activity.get('altitude', [])
-                values = [v if v is not None else 0 for v in values]
-            else:
-                values = [1] * len(coords)  # Default weight
+        comparison_data = []
+        if len(values):
+            # Normalize weights for better visualization; missing samples get the lowest weight
+            weights = np.nan_to_num(normalize(values), nan=0.0) * 2 + 0.5  # Scale to 0.5-2.5
             
-            # Create weighted points
-            for i, coord in enumerate(coords):
-                if i < len(values) and len(coord) == 2:
-                    weight = values[i] if values else 1
-                    comparison_data.append([coord[0], coord[1], weight])
+            # Sample data for performance
+            step = max(1, len(weights) // 2000)
+            comparison_data = np.column_stack([
+                activities_data.lat[::step], activities_data.lon[::step], weights[::step]
+            ]).tolist()
         
         if comparison_data:
-            # Normalize weights for better visualization
-            weights = [point[2] for point in comparison_data]
-            if weights:
-                max_weight = max(weights)
-                min_weight = min(weights)
-                weight_range = max_weight - min_weight if max_weight != min_weight else 1
-                
-                for point in comparison_data:
-                    point[2] = ((point[2] - min_weight) / weight_range) * 2 + 0.5  # Scale to 0.5-2.5
-            
-            # Sample data for performance
-            if len(comparison_data) > 2000:
-                step = len(comparison_data) // 2000
-                comparison_data = comparison_data[::step]
-            
             # Add heatmap
             HeatMap(
                 comparison_data,
@@ -301,5 +318,6 @@ class AdvancedVisualizationMixin:
         m.get_root().html.add_child(folium.Element(legend_html))
         
         # Save map
-        m.save(output_file)
+        with span('write_file', format='html'):
+            m.save(output_file)
         print(f"Comparison heatmap ({comparison_metric}) saved to: {output_file}")
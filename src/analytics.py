@@ -9,6 +9,8 @@ from datetime import datetime, timedelta
 from typing import Dict, List, Tuple, Optional
 import json
 
+from .instrumentation import span
+
 
 class StravaAnalytics:
     """Advanced analytics for Strava cycling data"""
@@ -269,7 +271,8 @@ class StravaAnalytics:
         plt.suptitle('Strava Cycling Analytics Dashboard', fontsize=24, fontweight='bold', y=0.98)
         
         # Save the dashboard
-        plt.savefig(output_file, dpi=300, bbox_inches='tight', facecolor='white')
+        with span('write_file', format='png'):
+            plt.savefig(output_file, dpi=300, bbox_inches='tight', facecolor='white')
         plt.close()
         
         print(f"Analytics dashboard saved to: {output_file}")
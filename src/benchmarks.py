@@ -0,0 +1,276 @@
+"""
+Benchmarks of the map builders and analytics on synthetic datasets, with stored baselines
+"""
+import argparse
+import json
+import math
+import multiprocessing
+import os
+import platform
+import shutil
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timezone
+from typing import Dict, List, Optional, Sequence
+
+import pandas as pd
+
+from .render_scheduler import RenderJob
+from .strava_api import StravaAPI
+from .synthetic_data import SyntheticDataset
+from .tracks import TrackCollection
+
+try:
+    import resource
+except ImportError:  # Windows: peak memory is not reported
+    resource = None
+
+# Every map builder and analytics routine, as the jobs the app renders
+BENCHMARKS = {job.name: job for job in [
+    RenderJob('basic', 'create_basic_heatmap', 'basic_heatmap.html'),
+    RenderJob('speed', 'create_speed_heatmap', 'speed_heatmap.html'),
+    RenderJob('elevation', 'create_elevation_heatmap', 'elevation_heatmap.html'),
+    RenderJob('routes', 'create_route_map', 'routes_map.html'),
+    RenderJob('stats', 'create_activity_stats_chart', 'activity_stats.png', data='dataframe'),
+    RenderJob('animated', 'create_time_animated_heatmap', 'animated_heatmap.html'),
+    RenderJob('clustered', 'create_clustered_activity_map', 'clustered_map.html'),
+    RenderJob('explorer', 'create_interactive_route_explorer', 'route_explorer.html'),
+    RenderJob('comparison', 'create_comparison_heatmap', 'comparison_heatmap.html', args=('speed',)),
+    RenderJob('patterns', 'analyze_activity_patterns', None, data='dataframe', target='analytics'),
+    RenderJob('dashboard', 'create_comprehensive_dashboard', 'analytics_dashboard.png',
+              data='dataframe', target='analytics')
+]}
+
+DEFAULT_SIZES = (100, 1000, 10000)  # activities; add 50000 for the large-history case
+DEFAULT_POINTS_PER_RIDE = 200
+RIDES_PER_ATHLETE = 500  # larger datasets are split over more athletes around the same area
+DATASET_END = datetime(2025, 1, 1, tzinfo=timezone.utc)  # pinned so datasets match across days
+
+DEFAULT_BASELINE_FILE = os.path.join('benchmarks', 'baselines.json')
+DEFAULT_WORK_DIR = os.path.join('cache', 'benchmarks')
+DEFAULT_TOLERANCE = 0.25  # allowed slowdown or memory growth over the baseline, as a fraction
+MIN_REGRESSION_SECONDS = 0.05  # slowdowns smaller than this are timer noise
+
+
+def benchmark_key(name: str, size: int, points_per_ride: int) -> str:
+    """Baseline key of one benchmark case"""
+    return f"{name}/{size}x{points_per_ride}"
+
+
+def prepare_dataset(size: int, points_per_ride: int, work_dir: str = DEFAULT_WORK_DIR, seed: int = 0) -> str:
+    """Generate (once) and store the synthetic dataset of a size; returns its directory
+    
+    The tracks are saved with TrackCollection.save and the activities DataFrame as a pickle,
+    so every benchmark process loads the same data quickly.
+    """
+    data_dir = os.path.join(work_dir, 'data', f"{size}x{points_per_ride}_seed{seed}")
+    if os.path.exists(os.path.join(data_dir, 'activities.pkl')):
+        return data_dir
+    
+    start = time.perf_counter()
+    n_athletes = max(1, math.ceil(size / RIDES_PER_ATHLETE))
+    dataset = SyntheticDataset(n_athletes, math.ceil(size / n_athletes), points_per_ride, seed=seed,
+                               end=DATASET_END)
+    # Newest first, like get_track_collection; generating the tracks also caches the summaries
+    activity_ids = sorted(dataset.activity_ids()[:size], key=dataset.start_time, reverse=True)
+    tracks = dataset.track_collection(activity_ids)
+    dataframe = StravaAPI._activities_to_dataframe([dataset.summary(activity_id) for activity_id in activity_ids])
+    
+    tmp_dir = f"{data_dir}.tmp"
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    tracks.save(tmp_dir)
+    dataframe.to_pickle(os.path.join(tmp_dir, 'activities.pkl'))
+    shutil.rmtree(data_dir, ignore_errors=True)
+    os.replace(tmp_dir, data_dir)
+    print(f"Generated {size} activities ({tracks.point_count} points) in {time.perf_counter() - start:.1f}s")
+    return data_dir
+
+
+def _peak_rss_mb() -> Optional[float]:
+    """Peak resident set size of this process so far"""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+
+def _output_bytes(output_dir: str) -> int:
+    """Total size of everything written under a directory (pages, images and tile pyramids)"""
+    return sum(os.path.getsize(os.path.join(root, name))
+               for root, _, names in os.walk(output_dir) for name in names)
+
+
+def _run_case(job: RenderJob, data_dir: str, output_dir: str) -> Dict:
+    """Run one benchmark in the current (fresh) process and measure it"""
+    if job.target == 'heatmap':
+        from .heatmap_generator import StravaHeatmapGenerator
+        renderer = StravaHeatmapGenerator()
+    else:
+        from .analytics import StravaAnalytics
+        renderer = StravaAnalytics()
+    
+    if job.data == 'tracks':
+        data = TrackCollection.load(data_dir, mmap_mode=None)
+        items, unit = data.point_count, 'points/s'
+    else:
+        data = pd.read_pickle(os.path.join(data_dir, 'activities.pkl'))
+        items, unit = len(data), 'activities/s'
+    
+    shutil.rmtree(output_dir, ignore_errors=True)
+    os.makedirs(output_dir)
+    args = (data,) if job.output_file is None else (data, os.path.join(output_dir, job.output_file))
+    rss_before = _peak_rss_mb()
+    start = time.perf_counter()
+    getattr(renderer, job.method)(*args, *job.args, **job.kwargs)
+    seconds = time.perf_counter() - start
+    peak_rss = _peak_rss_mb()
+    
+    return {
+        'seconds': seconds,
+        'throughput': items / seconds if seconds > 0 else None,
+        'throughput_unit': unit,
+        'peak_rss_mb': peak_rss,
+        'rss_growth_mb': None if peak_rss is None else peak_rss - rss_before,
+        'output_bytes': _output_bytes(output_dir)
+    }
+
+
+def run_case(job: RenderJob, data_dir: str, output_dir: str) -> Dict:
+    """Run one benchmark in its own process, so peak memory belongs to that case alone"""
+    # spawn: a fresh interpreter, not a copy of this process's memory
+    with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context('spawn')) as executor:
+        return executor.submit(_run_case, job, data_dir, output_dir).result()
+
+
+def run_benchmarks(names: Sequence[str], sizes: Sequence[int], points_per_ride: int = DEFAULT_POINTS_PER_RIDE,
+                   repeat: int = 1, work_dir: str = DEFAULT_WORK_DIR) -> Dict[str, Dict]:
+    """Run every (benchmark, size) case and return {benchmark_key: measurements}
+    
+    With repeat > 1 each case runs that many times: the fastest time and the largest peak
+    memory are kept. Failed cases are reported with an 'error' instead of measurements.
+    """
+    results = {}
+    for size in sizes:
+        data_dir = prepare_dataset(size, points_per_ride, work_dir)
+        for name in names:
+            key = benchmark_key(name, size, points_per_ride)
+            output_dir = os.path.join(work_dir, 'output', key.replace('/', '_'))
+            runs = []
+            try:
+                for _ in range(repeat):
+                    runs.append(run_case(BENCHMARKS[name], data_dir, output_dir))
+            except Exception as e:
+                print(f"{key}: failed: {e}")
+                results[key] = {'error': str(e)}
+                continue
+            
+            best = min(runs, key=lambda run: run['seconds'])
+            peaks = [run['peak_rss_mb'] for run in runs if run['peak_rss_mb'] is not None]
+            best['peak_rss_mb'] = max(peaks) if peaks else None
+            results[key] = best
+            print(f"{key}: {best['seconds']:.2f}s")
+    return results
+
+
+def load_baselines(path: str = DEFAULT_BASELINE_FILE) -> Dict[str, Dict]:
+    """Stored results by benchmark key, empty when no baseline has been saved"""
+    if not os.path.exists(path):
+        return {}
+    with open(path, 'r') as f:
+        return json.load(f).get('results', {})
+
+
+def save_baselines(results: Dict[str, Dict], path: str = DEFAULT_BASELINE_FILE) -> None:
+    """Merge successful results into the baseline file, with the machine they were measured on"""
+    baselines = load_baselines(path)
+    baselines.update({key: result for key, result in results.items() if 'error' not in result})
+    data = {
+        'updated': datetime.now(timezone.utc).isoformat(),
+        'machine': {'python': platform.python_version(), 'platform': platform.platform(),
+                    'cpu_count': os.cpu_count()},
+        'results': dict(sorted(baselines.items()))
+    }
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    with open(path, 'w') as f:
+        json.dump(data, f, indent=2)
+    print(f"Saved {len(results)} baseline results to {path}")
+
+
+def find_regressions(results: Dict[str, Dict], baselines: Dict[str, Dict],
+                     tolerance: float = DEFAULT_TOLERANCE) -> List[str]:
+    """Descriptions of cases slower or more memory-hungry than their baseline beyond the tolerance"""
+    regressions = []
+    for key, result in results.items():
+        baseline = baselines.get(key)
+        if baseline is None or 'error' in result:
+            continue
+        slowdown = result['seconds'] - baseline['seconds']
+        if slowdown > max(tolerance * baseline['seconds'], MIN_REGRESSION_SECONDS):
+            regressions.append(f"{key}: {result['seconds']:.2f}s vs {baseline['seconds']:.2f}s baseline "
+                               f"({slowdown / baseline['seconds']:+.0%})")
+        if result.get('peak_rss_mb') and baseline.get('peak_rss_mb') and \
+                result['peak_rss_mb'] > baseline['peak_rss_mb'] * (1 + tolerance):
+            regressions.append(f"{key}: peak RSS {result['peak_rss_mb']:.0f} MB vs "
+                               f"{baseline['peak_rss_mb']:.0f} MB baseline")
+    return regressions
+
+
+def print_report(results: Dict[str, Dict], baselines: Dict[str, Dict]) -> None:
+    """Table of the results, with the time change against the baseline where there is one"""
+    print(f"\n{'case':<28} {'seconds':>9} {'throughput':>22} {'peak MB':>9} {'+MB':>7} {'output KB':>10} {'vs baseline':>12}")
+    for key, result in results.items():
+        if 'error' in result:
+            print(f"{key:<28} error: {result['error']}")
+            continue
+        throughput = f"{result['throughput']:,.0f} {result['throughput_unit']}" if result['throughput'] else '-'
+        peak = f"{result['peak_rss_mb']:.0f}" if result['peak_rss_mb'] is not None else '-'
+        growth = f"{result['rss_growth_mb']:.0f}" if result['rss_growth_mb'] is not None else '-'
+        baseline = baselines.get(key)
+        change = f"{result['seconds'] / baseline['seconds'] - 1:+.0%}" if baseline and baseline['seconds'] else '-'
+        print(f"{key:<28} {result['seconds']:>9.2f} {throughput:>22} {peak:>9} {growth:>7} "
+              f"{result['output_bytes'] / 1024:>10.0f} {change:>12}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Benchmark the map builders and analytics on synthetic data')
+    parser.add_argument('--benchmarks', nargs='+', choices=list(BENCHMARKS), default=list(BENCHMARKS),
+                        help='Benchmarks to run (default: all)')
+    parser.add_argument('--sizes', nargs='+', type=int, default=list(DEFAULT_SIZES),
+                        help=f"Dataset sizes in activities (default: {' '.join(map(str, DEFAULT_SIZES))})")
+    parser.add_argument('--points', type=int, default=DEFAULT_POINTS_PER_RIDE,
+                        help=f'GPS points per ride (default: {DEFAULT_POINTS_PER_RIDE})')
+    parser.add_argument('--repeat', type=int, default=1, help='Runs per case; the fastest is kept (default: 1)')
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE_FILE, help=f'Baseline file (default: {DEFAULT_BASELINE_FILE})')
+    parser.add_argument('--save-baseline', action='store_true', help='Store these results as the new baseline')
+    parser.add_argument('--tolerance', type=float, default=DEFAULT_TOLERANCE,
+                        help=f'Allowed slowdown or memory growth before a regression is reported (default: {DEFAULT_TOLERANCE})')
+    parser.add_argument('--work-dir', default=DEFAULT_WORK_DIR, help=f'Datasets and outputs (default: {DEFAULT_WORK_DIR})')
+    parser.add_argument('--json', metavar='FILE', help='Also write the results to a JSON file')
+    args = parser.parse_args()
+    
+    results = run_benchmarks(args.benchmarks, args.sizes, args.points, max(1, args.repeat), args.work_dir)
+    baselines = load_baselines(args.baseline)
+    print_report(results, baselines)
+    
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+    
+    if args.save_baseline:
+        save_baselines(results, args.baseline)
+        return
+    
+    regressions = find_regressions(results, baselines, args.tolerance)
+    if regressions:
+        print(f"\n{len(regressions)} regression(s) against {args.baseline}:")
+        for regression in regressions:
+            print(f"  {regression}")
+        sys.exit(1)
+    if baselines:
+        print("\nNo regressions against the baseline")
+
+
+if __name__ == '__main__':
+    main()
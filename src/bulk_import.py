@@ -0,0 +1,400 @@
+"""
+Offline import of Strava bulk-export archives: GPX, TCX and FIT files (optionally gzipped)
+"""
+import csv
+import gzip
+import io
+import multiprocessing
+import os
+import re
+import struct
+import zipfile
+import xml.etree.ElementTree as ET
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timezone
+from typing import Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from .activity_store import ActivityStore
+from .config import Config
+from .route_stats import haversine_distances
+from .tracks import MIN_TRACK_POINTS, ActivityTrack, TrackCollection
+
+FORMATS = ('gpx', 'tcx', 'fit')
+
+# Activity types of activities.csv counted as rides, compared without spaces, dashes or case
+CYCLING_ACTIVITY_TYPES = ('ride', 'virtualride', 'ebikeride', 'mountainbikeride', 'gravelride',
+                          'emountainbikeride', 'velomobile', 'handcycle')
+
+# FIT timestamps count seconds from 1989-12-31T00:00:00Z
+FIT_EPOCH = 631065600
+SEMICIRCLES_TO_DEGREES = 180.0 / 2 ** 31
+FIT_RECORD_MESSAGE = 20
+FIT_TIMESTAMP_FIELD = 253
+# record message field number -> column
+FIT_RECORD_FIELDS = {0: 'lat', 1: 'lon', 2: 'altitude', 5: 'distance', 6: 'velocity', 73: 'enhanced_velocity',
+                     78: 'enhanced_altitude', FIT_TIMESTAMP_FIELD: 'timestamp'}
+# FIT base type number -> (struct format, invalid value)
+FIT_BASE_TYPES = {
+    0x00: ('B', 0xFF), 0x01: ('b', 0x7F), 0x02: ('B', 0xFF), 0x83: ('h', 0x7FFF), 0x84: ('H', 0xFFFF),
+    0x85: ('i', 0x7FFFFFFF), 0x86: ('I', 0xFFFFFFFF), 0x88: ('f', None), 0x89: ('d', None),
+    0x0A: ('B', 0x00), 0x8B: ('H', 0x0000), 0x8C: ('I', 0x00000000)
+}
+
+
+def _local_name(tag: str) -> str:
+    """XML tag without its namespace"""
+    return tag.rsplit('}', 1)[-1]
+
+
+def _parse_iso_time(value: Optional[str]) -> float:
+    if not value:
+        return np.nan
+    try:
+        parsed = datetime.fromisoformat(value.strip().replace('Z', '+00:00'))
+    except ValueError:
+        return np.nan
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed.timestamp()
+
+
+def _to_columns(points: Dict[str, list]) -> Dict:
+    """Point lists to track columns: time relative to the first timestamp, plus start_time
+    
+    Distance and speed are derived from the coordinates and timestamps when the file
+    does not record them, since the speed and route maps need both.
+    """
+    columns = {name: np.asarray(values, dtype=np.float64) for name, values in points.items()}
+    n_points = len(columns['lat'])
+    for name in ('altitude', 'velocity', 'distance', 'timestamp'):
+        if name not in columns or len(columns[name]) != n_points:
+            columns[name] = np.full(n_points, np.nan)
+    
+    timestamps = columns.pop('timestamp')
+    has_time = ~np.isnan(timestamps)
+    start_time = float(timestamps[has_time][0]) if has_time.any() else None
+    columns['time'] = timestamps - start_time if start_time is not None else timestamps
+    
+    if n_points > 1 and np.isnan(columns['distance']).all():
+        steps = haversine_distances(columns['lat'][:-1], columns['lon'][:-1], columns['lat'][1:], columns['lon'][1:])
+        columns['distance'] = np.concatenate([[0.0], np.cumsum(steps)])
+    if n_points > 1 and np.isnan(columns['velocity']).all() and has_time.all():
+        with np.errstate(invalid='ignore', divide='ignore'):
+            velocity = np.gradient(columns['distance'], columns['time'])
+        columns['velocity'] = np.where(np.isfinite(velocity), velocity, np.nan)
+    
+    columns['start_time'] = start_time
+    return columns
+
+
+def parse_gpx(data: bytes) -> Dict:
+    """Track points of a GPX file"""
+    points = {'lat': [], 'lon': [], 'altitude': [], 'timestamp': []}
+    for _, element in ET.iterparse(io.BytesIO(data)):
+        if _local_name(element.tag) != 'trkpt':
+            continue
+        children = {_local_name(child.tag): child.text for child in element}
+        points['lat'].append(float(element.get('lat')))
+        points['lon'].append(float(element.get('lon')))
+        points['altitude'].append(float(children['ele']) if children.get('ele') else np.nan)
+        points['timestamp'].append(_parse_iso_time(children.get('time')))
+        element.clear()
+    return _to_columns(points)
+
+
+def parse_tcx(data: bytes) -> Dict:
+    """Trackpoints of a TCX file that have a position"""
+    points = {'lat': [], 'lon': [], 'altitude': [], 'distance': [], 'velocity': [], 'timestamp': []}
+    # Strava's TCX files often start with whitespace, which the XML parser rejects
+    for _, element in ET.iterparse(io.BytesIO(data.lstrip())):
+        if _local_name(element.tag) != 'Trackpoint':
+            continue
+        values = {_local_name(child.tag): child.text for child in element.iter()}
+        if values.get('LatitudeDegrees') and values.get('LongitudeDegrees'):
+            points['lat'].append(float(values['LatitudeDegrees']))
+            points['lon'].append(float(values['LongitudeDegrees']))
+            for column, name in (('altitude', 'AltitudeMeters'), ('distance', 'DistanceMeters'), ('velocity', 'Speed')):
+                points[column].append(float(values[name]) if values.get(name) else np.nan)
+            points['timestamp'].append(_parse_iso_time(values.get('Time')))
+        element.clear()
+    return _to_columns(points)
+
+
+def parse_fit(data: bytes) -> Dict:
+    """Record messages of a FIT file that have a position
+    
+    A minimal reader for the parts of the FIT protocol activity files use: definition and
+    data messages, compressed timestamp headers and developer fields (skipped). Only the
+    position, altitude, distance, speed and timestamp fields of record messages are decoded.
+    """
+    if len(data) < 12 or data[8:12] != b'.FIT':
+        raise ValueError("Not a FIT file")
+    header_size = data[0]
+    end = min(header_size + struct.unpack_from('<I', data, 4)[0], len(data))
+    
+    points = {'lat': [], 'lon': [], 'altitude': [], 'distance': [], 'velocity': [], 'timestamp': []}
+    # local message type -> (global message number, message size, {column: (offset, struct, invalid)})
+    definitions: Dict[int, Tuple[int, int, Dict]] = {}
+    last_timestamp = None
+    pos = header_size
+    while pos < end:
+        header = data[pos]
+        pos += 1
+        if header & 0x80:
+            # Compressed timestamp header: a data message with a 5-bit time offset
+            local_type = (header >> 5) & 0x03
+            offset = header & 0x1F
+            if last_timestamp is not None:
+                last_timestamp += (offset - last_timestamp) & 0x1F
+            compressed_timestamp = last_timestamp
+        elif header & 0x40:
+            local_type = header & 0x0F
+            endian = '>' if data[pos + 1] else '<'
+            global_number = struct.unpack_from(endian + 'H', data, pos + 2)[0]
+            n_fields = data[pos + 4]
+            pos += 5
+            fields = {}
+            size = 0
+            for i in range(n_fields):
+                number, field_size, base_type = data[pos + 3 * i:pos + 3 * i + 3]
+                fmt, invalid = FIT_BASE_TYPES.get(base_type, (None, None))
+                wanted = (number == FIT_TIMESTAMP_FIELD or
+                          (global_number == FIT_RECORD_MESSAGE and number in FIT_RECORD_FIELDS))
+                if wanted and fmt and struct.calcsize(fmt) == field_size:
+                    fields[FIT_RECORD_FIELDS[number]] = (size, struct.Struct(endian + fmt), invalid)
+                size += field_size
+            pos += 3 * n_fields
+            if header & 0x20:
+                n_developer_fields = data[pos]
+                size += sum(data[pos + 2 + 3 * i] for i in range(n_developer_fields))
+                pos += 1 + 3 * n_developer_fields
+            definitions[local_type] = (global_number, size, fields)
+            continue
+        else:
+            local_type = header & 0x0F
+            compressed_timestamp = None
+        
+        if local_type not in definitions:
+            raise ValueError(f"FIT data message without a definition at byte {pos - 1}")
+        global_number, size, fields = definitions[local_type]
+        values = {}
+        for column, (offset, decoder, invalid) in fields.items():
+            value = decoder.unpack_from(data, pos + offset)[0]
+            values[column] = np.nan if value == invalid else value
+        pos += size
+        
+        if 'timestamp' in values and not np.isnan(values['timestamp']):
+            last_timestamp = int(values['timestamp'])
+        elif compressed_timestamp is not None:
+            values['timestamp'] = compressed_timestamp
+        if global_number != FIT_RECORD_MESSAGE or np.isnan(values.get('lat', np.nan)) or np.isnan(values.get('lon', np.nan)):
+            continue
+        
+        altitude = values.get('enhanced_altitude', values.get('altitude', np.nan))
+        velocity = values.get('enhanced_velocity', values.get('velocity', np.nan))
+        points['lat'].append(values['lat'] * SEMICIRCLES_TO_DEGREES)
+        points['lon'].append(values['lon'] * SEMICIRCLES_TO_DEGREES)
+        points['altitude'].append(altitude / 5.0 - 500.0)
+        points['distance'].append(values.get('distance', np.nan) / 100.0)
+        points['velocity'].append(velocity / 1000.0)
+        points['timestamp'].append(values.get('timestamp', np.nan) + FIT_EPOCH)
+    return _to_columns(points)
+
+
+PARSERS = {'gpx': parse_gpx, 'tcx': parse_tcx, 'fit': parse_fit}
+
+
+def file_format(name: str) -> Optional[str]:
+    """'gpx', 'tcx' or 'fit' for an activity file name (optionally ending in .gz), else None"""
+    base = name[:-3] if name.lower().endswith('.gz') else name
+    extension = os.path.splitext(base)[1].lower().lstrip('.')
+    return extension if extension in FORMATS else None
+
+
+def parse_activity_file(name: str, data: bytes) -> Dict:
+    """Columns of an activity file's raw bytes, decompressing .gz files in memory"""
+    if name.lower().endswith('.gz'):
+        data = gzip.decompress(data)
+    fmt = file_format(name)
+    if fmt is None:
+        raise ValueError(f"Unsupported activity file {name}")
+    return PARSERS[fmt](data)
+
+
+def _parse_members(zip_path: str, members: List[Tuple[int, str]]) -> List[Tuple[int, Optional[Dict], Optional[str]]]:
+    """Parse archive members in a worker: [(activity id, columns or None, error or None)]"""
+    results = []
+    with zipfile.ZipFile(zip_path) as archive:
+        for activity_id, name in members:
+            try:
+                results.append((activity_id, parse_activity_file(name, archive.read(name)), None))
+            except Exception as e:
+                results.append((activity_id, None, f"{name}: {e}"))
+    return results
+
+
+def _parse_csv_date(value: str) -> Optional[str]:
+    """activities.csv dates (e.g. 'Mar 1, 2015, 10:11:12 AM', UTC) as ISO-8601"""
+    try:
+        return datetime.strptime(value.strip(), '%b %d, %Y, %I:%M:%S %p').replace(tzinfo=timezone.utc).isoformat()
+    except (AttributeError, ValueError):
+        return None
+
+
+class BulkExportImporter:
+    """Reads the activities of a Strava bulk-export ZIP without extracting it
+    
+    Activity files are read straight out of the archive and parsed on a process pool, each
+    worker opening the archive itself so only file names and parsed columns cross process
+    boundaries. activities.csv supplies ids, types and dates; without it every supported
+    file under activities/ is imported, its id taken from the file name.
+    """
+    
+    def __init__(self, zip_path: str, max_workers: int = Config.IMPORT_WORKERS,
+                 activity_types: Optional[Sequence[str]] = CYCLING_ACTIVITY_TYPES,
+                 chunk_size: int = Config.IMPORT_CHUNK_SIZE):
+        self.zip_path = zip_path
+        self.max_workers = max(1, max_workers)
+        self.activity_types = activity_types
+        self.chunk_size = max(1, chunk_size)
+    
+    def list_activities(self) -> List[Dict]:
+        """Importable activities as {'id', 'name', 'type', 'start_date', 'file'} dicts"""
+        with zipfile.ZipFile(self.zip_path) as archive:
+            names = archive.namelist()
+            csv_name = next((name for name in names if os.path.basename(name) == 'activities.csv'), None)
+            if csv_name is None:
+                return self._activities_from_files(names)
+            with archive.open(csv_name) as f:
+                rows = list(csv.reader(io.TextIOWrapper(f, encoding='utf-8-sig')))
+        
+        if not rows:
+            return []
+        # activities.csv repeats some column names; the first occurrence is the one wanted
+        header = {}
+        for i, column in enumerate(rows[0]):
+            header.setdefault(column.strip(), i)
+        prefix = os.path.dirname(csv_name)
+        existing = set(names)
+        
+        activities = []
+        for row in rows[1:]:
+            def column(name):
+                return row[header[name]] if name in header and header[name] < len(row) else ''
+            
+            filename = column('Filename')
+            path = f"{prefix}/{filename}" if prefix else filename
+            if not filename or file_format(filename) is None or path not in existing:
+                continue
+            if not self._wanted_type(column('Activity Type')):
+                continue
+            try:
+                activity_id = int(column('Activity ID'))
+            except ValueError:
+                continue
+            activities.append({
+                'id': activity_id,
+                'name': column('Activity Name'),
+                'type': column('Activity Type'),
+                'start_date': _parse_csv_date(column('Activity Date')),
+                'file': path
+            })
+        return activities
+    
+    def _wanted_type(self, activity_type: str) -> bool:
+        if self.activity_types is None or not activity_type:
+            return True
+        return re.sub(r'[\s\-]', '', activity_type).lower() in self.activity_types
+    
+    @staticmethod
+    def _activities_from_files(names: List[str]) -> List[Dict]:
+        activities = []
+        for name in names:
+            match = re.match(r'(\d+)', os.path.basename(name))
+            if match and file_format(name) and '/activities/' in f"/{name}":
+                activities.append({'id': int(match.group(1)), 'name': '', 'type': '', 'start_date': None,
+                                   'file': name})
+        return activities
+    
+    def iter_columns(self, activities: List[Dict]) -> Iterator[Tuple[Dict, Optional[Dict], Optional[str]]]:
+        """Parse the activities' files; yields (activity, columns or None, error or None) as they finish"""
+        by_id = {activity['id']: activity for activity in activities}
+        members = [(activity['id'], activity['file']) for activity in activities]
+        chunks = [members[i:i + self.chunk_size] for i in range(0, len(members), self.chunk_size)]
+        
+        if self.max_workers == 1 or len(chunks) <= 1:
+            for chunk in chunks:
+                for activity_id, columns, error in _parse_members(self.zip_path, chunk):
+                    yield by_id[activity_id], columns, error
+            return
+        
+        # spawn: forking a multi-threaded process (e.g. the Flask server) is unsafe
+        with ProcessPoolExecutor(max_workers=self.max_workers,
+                                 mp_context=multiprocessing.get_context('spawn')) as executor:
+            for chunk_results in executor.map(_parse_members, [self.zip_path] * len(chunks), chunks):
+                for activity_id, columns, error in chunk_results:
+                    yield by_id[activity_id], columns, error
+    
+    def load_tracks(self, track_store=None, cache_dir: Optional[str] = None,
+                    progress: Optional[Callable[[int, int], None]] = None) -> TrackCollection:
+        """Import every ride of the archive and return them as a TrackCollection
+        
+        With a track_store, activities it already holds are not parsed again and new ones
+        are written to it, so tiles and the spatial index include them. With a cache_dir the
+        activities' dates are saved as an activity store there (see load_start_times).
+        progress(done, total) is called as files are parsed.
+        """
+        activities = self.list_activities()
+        print(f"Found {len(activities)} activities in {os.path.basename(self.zip_path)}")
+        stored = set(track_store.ids()) if track_store is not None else set()
+        to_parse = [activity for activity in activities if activity['id'] not in stored]
+        
+        tracks: Dict[int, ActivityTrack] = {}
+        start_times: Dict[int, Optional[float]] = {}
+        failed = []
+        for done, (activity, columns, error) in enumerate(self.iter_columns(to_parse), start=1):
+            if progress:
+                progress(done, len(to_parse))
+            if columns is None:
+                failed.append(error)
+                continue
+            start_time = columns.pop('start_time')
+            start_times[activity['id']] = start_time
+            if start_time is not None:
+                activity['start_date'] = datetime.fromtimestamp(start_time, timezone.utc).isoformat()
+            if track_store is not None:
+                track_store.put_columns(activity['id'], columns)
+            else:
+                tracks[activity['id']] = ActivityTrack.from_columns(activity['id'], columns, start_time)
+        
+        if failed:
+            print(f"Warning: Failed to parse {len(failed)} activity files: {failed[:5]}{'...' if len(failed) > 5 else ''}")
+        
+        if track_store is not None:
+            track_store.flush()
+            for activity in activities:
+                columns = track_store.get_columns(activity['id'])
+                if columns is not None:
+                    start_time = start_times.get(activity['id'], _parse_iso_time(activity['start_date']))
+                    tracks[activity['id']] = ActivityTrack.from_columns(
+                        activity['id'], columns, None if start_time != start_time else start_time)
+        
+        if cache_dir:
+            self._save_activity_store(activities, cache_dir)
+        
+        ordered = [tracks[activity['id']] for activity in activities
+                   if activity['id'] in tracks and len(tracks[activity['id']]) >= MIN_TRACK_POINTS]
+        print(f"Imported {len(ordered)} activities with GPS data ({len(to_parse)} files parsed)")
+        return TrackCollection.from_tracks(ordered)
+    
+    def _save_activity_store(self, activities: List[Dict], cache_dir: str) -> None:
+        """Record the imported activities' dates next to the synced ones"""
+        store = ActivityStore(cache_dir, 'export')
+        store.merge([
+            {'id': activity['id'], 'name': activity['name'], 'type': activity['type'],
+             'start_date': activity['start_date']}
+            for activity in activities if activity['start_date']
+        ])
+        store.save()
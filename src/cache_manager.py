@@ -4,39 +4,76 @@ Cache manager for Strava API responses to improve performance
 import json
 import os
 import pickle
+import re
+import tempfile
 from datetime import datetime, timedelta
-from typing import Any, Optional
+from typing import Any, Dict, List, Optional
 import hashlib
 
+from .instrumentation import increment
+
 
 class CacheManager:
-    def __init__(self, cache_dir: str = "cache", cache_duration_hours: int = 24):
+    DEFAULT_NAMESPACE = 'default'
+    
+    def __init__(self, cache_dir: str = "cache", cache_duration_hours: int = 24,
+                 namespace_policies: Optional[Dict[str, Optional[timedelta]]] = None):
         self.cache_dir = cache_dir
         self.cache_duration = timedelta(hours=cache_duration_hours)
+        
+        # Time-to-live per namespace; None means entries never expire.
+        # Streams of a finished activity and the athlete behind a token never change,
+        # so only the activity listing needs to expire.
+        self.namespace_policies = {
+            self.DEFAULT_NAMESPACE: self.cache_duration,
+            'activities': self.cache_duration,
+            'streams': None,
+            'athlete': None
+        }
+        if namespace_policies:
+            self.namespace_policies.update(namespace_policies)
+        
         os.makedirs(cache_dir, exist_ok=True)
     
-    def _get_cache_path(self, cache_key: str) -> str:
+    def _get_namespace_dir(self, namespace: str) -> str:
+        """Directory holding a namespace's entries (the default namespace lives at the top level)"""
+        if namespace == self.DEFAULT_NAMESPACE:
+            return self.cache_dir
+        return os.path.join(self.cache_dir, namespace)
+    
+    def _get_cache_path(self, cache_key: str, namespace: str = DEFAULT_NAMESPACE) -> str:
         """Generate cache file path from key"""
-        # Create a safe filename from the cache key
-        safe_key = hashlib.md5(cache_key.encode()).hexdigest()
-        return os.path.join(self.cache_dir, f"{safe_key}.cache")
+        # Keys of non-default namespaces are used directly when they are filename-safe,
+        # so e.g. streams are content-addressed by activity id
+        if namespace != self.DEFAULT_NAMESPACE and re.fullmatch(r'[A-Za-z0-9_.-]+', cache_key):
+            safe_key = cache_key
+        else:
+            # Create a safe filename from the cache key
+            safe_key = hashlib.md5(cache_key.encode()).hexdigest()
+        return os.path.join(self._get_namespace_dir(namespace), f"{safe_key}.cache")
     
-    def _is_cache_valid(self, cache_path: str) -> bool:
-        """Check if cache file exists and is still valid"""
+    def _is_cache_valid(self, cache_path: str, namespace: str = DEFAULT_NAMESPACE) -> bool:
+        """Check if cache file exists and is still valid under the namespace's policy"""
         if not os.path.exists(cache_path):
             return False
         
+        ttl = self.namespace_policies.get(namespace, self.cache_duration)
+        if ttl is None:
+            return True
+        
         file_time = datetime.fromtimestamp(os.path.getmtime(cache_path))
-        return datetime.now() - file_time < self.cache_duration
+        return datetime.now() - file_time < ttl
     
-    def get(self, cache_key: str) -> Optional[Any]:
+    def get(self, cache_key: str, namespace: str = DEFAULT_NAMESPACE) -> Optional[Any]:
         """Get cached data if available and valid"""
-        cache_path = self._get_cache_path(cache_key)
+        cache_path = self._get_cache_path(cache_key, namespace)
         
-        if self._is_cache_valid(cache_path):
+        if self._is_cache_valid(cache_path, namespace):
             try:
                 with open(cache_path, 'rb') as f:
-                    return pickle.load(f)
+                    data = pickle.load(f)
+                increment('cache_lookups', namespace=namespace, result='hit')
+                return data
             except Exception as e:
                 print(f"Warning: Error reading cache file {cache_path}: {e}")
                 # Remove corrupted cache file
@@ -45,24 +82,40 @@ class CacheManager:
                 except:
                     pass
         
+        increment('cache_lookups', namespace=namespace, result='miss')
         return None
     
-    def set(self, cache_key: str, data: Any) -> None:
+    def set(self, cache_key: str, data: Any, namespace: str = DEFAULT_NAMESPACE) -> None:
         """Store data in cache"""
-        cache_path = self._get_cache_path(cache_key)
+        cache_path = self._get_cache_path(cache_key, namespace)
         
+        tmp_path = None
         try:
-            with open(cache_path, 'wb') as f:
+            cache_dir = os.path.dirname(cache_path)
+            os.makedirs(cache_dir, exist_ok=True)
+            # Write to a temporary file of our own first, so concurrent readers never see a
+            # partial entry and concurrent writers (threads or processes) never share one
+            with tempfile.NamedTemporaryFile(dir=cache_dir, prefix=f"{os.path.basename(cache_path)}.",
+                                             suffix='.tmp', delete=False) as f:
+                tmp_path = f.name
                 pickle.dump(data, f)
+            os.replace(tmp_path, cache_path)
         except Exception as e:
             print(f"Warning: Error writing to cache file {cache_path}: {e}")
+            if tmp_path and os.path.exists(tmp_path):
+                os.remove(tmp_path)
     
-    def clear(self) -> None:
-        """Clear all cached data"""
+    def clear(self, namespace: Optional[str] = None) -> None:
+        """Clear cached data for one namespace, or for all namespaces"""
+        namespaces = [namespace] if namespace else list(self.namespace_policies)
         try:
-            for filename in os.listdir(self.cache_dir):
-                if filename.endswith('.cache'):
-                    os.remove(os.path.join(self.cache_dir, filename))
+            for name in namespaces:
+                namespace_dir = self._get_namespace_dir(name)
+                if not os.path.isdir(namespace_dir):
+                    continue
+                for filename in os.listdir(namespace_dir):
+                    if filename.endswith('.cache'):
+                        os.remove(os.path.join(namespace_dir, filename))
         except Exception as e:
             print(f"Warning: Error clearing cache: {e}")
     
@@ -72,7 +125,17 @@ class CacheManager:
         token_hash = hashlib.md5(access_token.encode()).hexdigest()[:8]
         return f"activities_{days_back}_{token_hash}"
     
-    def get_streams_cache_key(self, activity_id: int, access_token: str) -> str:
-        """Generate cache key for activity streams data"""
+    def get_streams_cache_key(self, activity_id: int, stream_types: Optional[List[str]] = None) -> str:
+        """Generate cache key for activity streams data
+        
+        Streams are immutable and belong to the activity, not the token that fetched them,
+        so the key is the activity id (plus the stream types when not the standard set).
+        """
+        if stream_types:
+            return f"{activity_id}_{'-'.join(sorted(stream_types))}"
+        return str(activity_id)
+    
+    def get_athlete_cache_key(self, access_token: str) -> str:
+        """Generate cache key for the athlete id behind an access token"""
         token_hash = hashlib.md5(access_token.encode()).hexdigest()[:8]
-        return f"streams_{activity_id}_{token_hash}"
+        return f"athlete_{token_hash}"
@@ -0,0 +1,110 @@
+"""
+Batch color mapping: whole value arrays to palette indices and hex colors with NumPy
+"""
+from functools import lru_cache
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+import matplotlib
+import matplotlib.colors as mcolors
+
+LUT_SIZE = 256
+
+
+@lru_cache(maxsize=None)
+def _colormap_lut(name: str) -> np.ndarray:
+    """Read-only LUT_SIZE x 4 RGBA (0-1) table for a matplotlib colormap, built once per name"""
+    lut = matplotlib.colormaps[name](np.linspace(0.0, 1.0, LUT_SIZE))
+    lut.setflags(write=False)
+    return lut
+
+
+@lru_cache(maxsize=None)
+def _hex_palette(name: str, levels: int) -> Tuple[str, ...]:
+    lut = _colormap_lut(name)
+    rows = np.round(np.linspace(0, LUT_SIZE - 1, levels)).astype(int)
+    rgb = np.round(lut[rows, :3] * 255).astype(int)
+    return tuple(f'#{r:02x}{g:02x}{b:02x}' for r, g, b in rgb.tolist())
+
+
+def colormap_lut(name: str) -> np.ndarray:
+    """Cached RGBA lookup table (256 x 4, floats in 0-1) for a matplotlib colormap"""
+    return _colormap_lut(name)
+
+
+def hex_palette(name: str, levels: int = LUT_SIZE) -> List[str]:
+    """levels evenly spaced colors of a colormap as hex strings"""
+    return list(_hex_palette(name, levels))
+
+
+def value_range(values: np.ndarray) -> Optional[Tuple[float, float]]:
+    """(min, max) of the finite values, or None if there are none"""
+    values = np.asarray(values, dtype=np.float64)
+    finite = values[np.isfinite(values)]
+    if not len(finite):
+        return None
+    return float(finite.min()), float(finite.max())
+
+
+def normalize(values: np.ndarray, vmin: Optional[float] = None, vmax: Optional[float] = None) -> np.ndarray:
+    """Scale values to [0, 1] (NaN stays NaN); a zero range maps everything to 0.5"""
+    values = np.asarray(values, dtype=np.float64)
+    if vmin is None or vmax is None:
+        bounds = value_range(values) or (0.0, 0.0)
+        vmin = bounds[0] if vmin is None else vmin
+        vmax = bounds[1] if vmax is None else vmax
+    if vmax <= vmin:
+        return np.where(np.isnan(values), np.nan, 0.5)
+    return np.clip((values - vmin) / (vmax - vmin), 0.0, 1.0)
+
+
+def quantize(values: np.ndarray, levels: int, vmin: Optional[float] = None,
+             vmax: Optional[float] = None) -> np.ndarray:
+    """Palette index (0..levels-1) for each value, -1 where the value is NaN"""
+    normalized = normalize(values, vmin, vmax)
+    indices = np.minimum((np.nan_to_num(normalized) * levels).astype(np.int64), levels - 1)
+    return np.where(np.isnan(normalized), -1, indices)
+
+
+def map_values(values: np.ndarray, name: str, levels: int = LUT_SIZE, vmin: Optional[float] = None,
+               vmax: Optional[float] = None) -> Tuple[np.ndarray, List[str]]:
+    """Quantized palette indices for a whole array plus the hex palette they index into"""
+    return quantize(values, levels, vmin, vmax), hex_palette(name, levels)
+
+
+def values_to_hex(values: np.ndarray, name: str, levels: int = LUT_SIZE, vmin: Optional[float] = None,
+                  vmax: Optional[float] = None, missing: str = '#000000') -> np.ndarray:
+    """Hex color string for every value, via one palette lookup instead of a per-value colormap call"""
+    indices, palette = map_values(values, name, levels, vmin, vmax)
+    colors = np.asarray(palette + [missing])
+    return colors[indices]  # index -1 picks the trailing 'missing' color
+
+
+def threshold_classes(values: np.ndarray, thresholds: Sequence[float]) -> np.ndarray:
+    """Class index by ascending upper thresholds (a value below thresholds[0] is class 0)
+    
+    Values that are NaN or not positive get -1.
+    """
+    values = np.asarray(values, dtype=np.float64)
+    classes = np.searchsorted(np.asarray(thresholds, dtype=np.float64), values, side='right')
+    with np.errstate(invalid='ignore'):
+        return np.where(values > 0, classes, -1)
+
+
+def gradient_lut(gradient: Dict[float, str], size: int = LUT_SIZE) -> np.ndarray:
+    """RGBA lookup table (size x 4, uint8) interpolated between gradient stops
+    
+    Below the first stop the first color fades in from transparent, the way
+    Leaflet.heat treats the low end of its gradient.
+    """
+    stops = sorted((float(position), mcolors.to_rgba(color)) for position, color in gradient.items())
+    positions = np.array([position for position, _ in stops])
+    colors = np.array([color for _, color in stops])
+    
+    t = np.linspace(0.0, 1.0, size)
+    lut = np.empty((size, 4))
+    for channel in range(4):
+        lut[:, channel] = np.interp(t, positions, colors[:, channel])
+    if positions[0] > 0:
+        lut[:, 3] *= np.clip(t / positions[0], 0.0, 1.0)
+    return np.round(lut * 255).astype(np.uint8)
@@ -11,11 +11,30 @@ class Config:
     # Strava API settings
     STRAVA_BASE_URL = "https://www.strava.com/api/v3"
     STRAVA_RATE_LIMIT = 600  # requests per 15 minutes
+    STRAVA_DAILY_RATE_LIMIT = 30000  # requests per day
+    RATE_LIMIT_BURST = 50  # requests sent back-to-back once a window's budget is paced
+    RATE_LIMIT_RESERVE = 0.1  # share of each window's budget paced evenly until the window resets
+    MAX_CONCURRENT_REQUESTS = 8  # stream requests kept in flight during bulk fetches
+    SYNC_RELIST_DAYS = 14  # incremental syncs re-list this trailing window for late uploads and deletions
     
     # Map settings
     DEFAULT_MAP_CENTER = [40.7128, -74.0060]  # NYC
     DEFAULT_ZOOM = 12
     MAX_ACTIVITIES_PER_REQUEST = 200
+    ROUTE_DISTANCE_METHOD = 'ellipsoidal'  # 'ellipsoidal' (WGS-84, matches geopy) or 'haversine' (faster)
+    RENDER_WORKERS = min(8, os.cpu_count() or 1)  # processes used to render maps in parallel
+    SIMPLIFY_METHOD = 'douglas-peucker'  # route line simplification: 'douglas-peucker' or 'visvalingam'
+    SIMPLIFY_TOLERANCE_PIXELS = 1.0  # maximum shape error, in screen pixels at the simplification zoom
+    SIMPLIFY_ZOOM_OFFSET = 2  # route lines keep full detail this many zoom levels past the initial view
+    ROUTE_LOD_ZOOMS = (5, 7, 9, 11, 13, 15)  # route pyramid levels, each simplified to 1 px at that zoom
+    ROUTE_VERTEX_BUDGET = 50000  # vertices drawn per route map view
+    SPATIAL_INDEX_CELL_DEGREES = 0.01  # grid cell size of the activity spatial index (about 1 km)
+    SPATIAL_CORRIDOR_WIDTH_M = 100  # default half-width of polyline corridor searches
+    SUMMARY_POLYLINE_MAPS = ('basic', 'routes', 'clustered', 'explorer')  # maps quick mode draws without streams
+    IMPORT_WORKERS = min(8, os.cpu_count() or 1)  # processes parsing bulk-export activity files
+    IMPORT_CHUNK_SIZE = 16  # activity files parsed per worker task
+    JOB_WORKERS = 2  # background map generation jobs run at the same time in the web app
+    JOB_HISTORY_SIZE = 100  # finished jobs kept for status queries
     
     # File settings
     OUTPUT_DIR = "maps"
@@ -24,6 +43,23 @@ class Config:
     # Color schemes for different map types
     HEATMAP_GRADIENT = {0.4: 'blue', 0.65: 'lime', 1: 'red'}
     
+    # Basic heatmap rendering: 'tiles' renders a PNG tile pyramid next to the page,
+    # 'server' points the page at the web app's on-demand /tiles endpoint and
+    # 'client' embeds every point in the page for Leaflet.heat
+    HEATMAP_RENDERING = 'tiles'
+    HEATMAP_TILE_MAX_ZOOM = 15  # deepest rendered zoom; the browser upscales beyond it
+    HEATMAP_TILE_ZOOM_OUT = 3  # zoom levels rendered below the dataset's optimal zoom
+    HEATMAP_TILE_BLUR_RADIUS = 4  # pixels
+    HEATMAP_TILE_PERCENTILE = 99.5  # per-pixel count percentile mapped to the top of the gradient
+    
+    # On-demand tile server (/tiles/<layer>/<z>/<x>/<y>.png in the web app)
+    TILE_SERVER_MAX_ZOOM = 16
+    TILE_MEMORY_CACHE_SIZE = 512  # rendered tiles kept in memory
+    
+    # Viewport heatmap API (/api/heatmap): points binned into cells of the requested zoom
+    VIEWPORT_CELL_PIXELS = 4  # smallest cell edge in screen pixels
+    VIEWPORT_MAX_CELLS = 5000  # cells are coarsened until at most this many are non-empty
+    
     SPEED_COLORS = {
         'very_slow': {'color': 'blue', 'threshold': 15},
         'slow': {'color': 'green', 'threshold': 25},
@@ -45,6 +81,8 @@ class Config:
             'STRAVA_CLIENT_ID': os.getenv('STRAVA_CLIENT_ID'),
             'STRAVA_CLIENT_SECRET': os.getenv('STRAVA_CLIENT_SECRET'),
             'STRAVA_ACCESS_TOKEN': os.getenv('STRAVA_ACCESS_TOKEN'),
+            'STRAVA_API_BASE_URL': os.getenv('STRAVA_API_BASE_URL', cls.STRAVA_BASE_URL),
+            'STRAVA_METRICS_LOG': os.getenv('STRAVA_METRICS_LOG'),
             'FLASK_SECRET_KEY': os.getenv('FLASK_SECRET_KEY', 'dev-key'),
             'FLASK_DEBUG': os.getenv('FLASK_DEBUG', 'False').lower() == 'true',
             'DEFAULT_MAP_CENTER_LAT': float(os.getenv('DEFAULT_MAP_CENTER_LAT', '40.7128')),
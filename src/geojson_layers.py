@@ -0,0 +1,99 @@
+"""
+Canvas-rendered GeoJSON line layers for maps colored by a per-point value
+"""
+import json
+from collections import defaultdict
+from typing import Dict, List, Sequence
+
+import numpy as np
+from branca.element import MacroElement
+from jinja2 import Template
+
+from .tracks import TrackCollection
+
+# Coordinate decimals written to the page (5 decimals is about 1 m)
+COORDINATE_PRECISION = 5
+
+
+def colored_line_features(collection: TrackCollection, selected: np.ndarray, classes: np.ndarray) -> List[Dict]:
+    """One GeoJSON MultiLineString feature per color class, made of runs of consecutive points
+    
+    selected are point indices into the collection in track order and classes is aligned
+    with them (-1 marks a point with no usable value). Segment j joins selected points j
+    and j + 1 of the same track and takes point j's class; consecutive segments with the
+    same class are merged into one line, so the page holds a few features, not one per point.
+    """
+    if len(selected) < 2:
+        return []
+    
+    owners = collection.activity_index[selected]
+    valid = (owners[1:] == owners[:-1]) & (classes[:-1] >= 0)
+    segment_classes = classes[:-1]
+    if not valid.any():
+        return []
+    
+    # A run starts at every valid segment whose predecessor is invalid or differently colored
+    run_starts = valid.copy()
+    run_starts[1:] &= ~(valid[:-1] & (segment_classes[1:] == segment_classes[:-1]))
+    
+    first = np.flatnonzero(run_starts)
+    last = np.append(first[1:], len(valid))
+    # Trim each run to its final valid segment
+    valid_segments = np.flatnonzero(valid)
+    last = valid_segments[np.searchsorted(valid_segments, last) - 1] + 1
+    
+    coords = np.round(np.column_stack([collection.lon[selected], collection.lat[selected]]),
+                      COORDINATE_PRECISION).tolist()
+    lines_by_class = defaultdict(list)
+    for start, end, color_class in zip(first.tolist(), last.tolist(), segment_classes[first].tolist()):
+        lines_by_class[color_class].append(coords[start:end + 1])
+    
+    return [
+        {
+            'type': 'Feature',
+            'geometry': {'type': 'MultiLineString', 'coordinates': lines},
+            'properties': {'c': color_class}
+        }
+        for color_class, lines in sorted(lines_by_class.items())
+    ]
+
+
+class ColoredLineLayer(MacroElement):
+    """A single canvas-rendered GeoJSON layer of colored lines with popups built on click
+    
+    Features carry a class index into the shared palette and labels, so the page holds
+    each color and label once; popup content is only generated when a line is clicked.
+    """
+    
+    _template = Template("""
+        {% macro script(this, kwargs) %}
+        var {{ this.get_name() }}_palette = {{ this.palette }};
+        var {{ this.get_name() }}_labels = {{ this.labels }};
+        var {{ this.get_name() }} = L.geoJson({{ this.data }}, {
+            renderer: L.canvas({padding: 0.5}),
+            style: function(feature) {
+                return {
+                    color: {{ this.get_name() }}_palette[feature.properties.c],
+                    weight: {{ this.weight }},
+                    opacity: {{ this.opacity }}
+                };
+            },
+            onEachFeature: function(feature, layer) {
+                layer.bindPopup(function() {
+                    return {{ this.title }} + {{ this.get_name() }}_labels[feature.properties.c];
+                });
+            }
+        }).addTo({{ this._parent.get_name() }});
+        {% endmacro %}
+    """)
+    
+    def __init__(self, features: List[Dict], palette: Sequence[str], labels: Sequence[str], title: str,
+                 weight: int = 3, opacity: float = 0.8):
+        super().__init__()
+        self._name = 'ColoredLineLayer'
+        self.data = json.dumps({'type': 'FeatureCollection', 'features': features}, separators=(',', ':'))
+        self.palette = json.dumps(list(palette))
+        self.labels = json.dumps(list(labels))
+        self.title = json.dumps(title)
+        self.weight = weight
+        self.opacity = opacity
@@ -6,21 +6,30 @@ import folium
 from folium.plugins import HeatMap, HeatMapWithTime, MarkerCluster, MiniMap
 import numpy as np
 import pandas as pd
-from typing import List, Dict, Tuple, Optional
+from typing import Callable, List, Dict, Tuple, Optional, Union
 import matplotlib.pyplot as plt
-import matplotlib.cm as cm
 from datetime import datetime, timedelta
 import json
 import seaborn as sns
-from geopy.distance import geodesic
 from collections import defaultdict
 from .advanced_visualizations import AdvancedVisualizationMixin
+from .tracks import ActivityTrack, DatasetSummary, TrackCollection
+from .route_stats import route_statistics, collection_statistics
+from .config import Config
+from .instrumentation import span
+from .tile_renderer import TileRenderer
+from .render_scheduler import RenderJob, RenderScheduler
+from .geojson_layers import ColoredLineLayer, colored_line_features
+from .colormaps import map_values, threshold_classes, value_range
+from .simplify import simplify_collection, tolerance_for_zoom
+from .route_pyramid import RoutePyramid
 
 
 class StravaHeatmapGenerator(AdvancedVisualizationMixin):
     def __init__(self):
         self.default_center = [40.7128, -74.0060]  # Default to NYC
         self.default_zoom = 12
+        self.render_scheduler = None
         
         # Set style for matplotlib plots
         plt.style.use('seaborn-v0_8' if 'seaborn-v0_8' in plt.style.available else 'default')
@@ -41,187 +50,59 @@ class StravaHeatmapGenerator(AdvancedVisualizationMixin):
             }
         }
     
-    def _calculate_map_center(self, activities_data: List[Dict]) -> Tuple[float, float]:
+    def _get_dataset_summary(self, activities_data: Union[TrackCollection, List[Dict]]) -> DatasetSummary:
+        """Bounds, centers, zoom and counts for the data, cached on the collection after the first call"""
+        return TrackCollection.coerce(activities_data).summary()
+    
+    def _calculate_map_center(self, activities_data: Union[TrackCollection, List[Dict]]) -> Tuple[float, float]:
         """Calculate the center point of all activities"""
-        all_lats = []
-        all_lons = []
-        
-        for activity in activities_data:
-            coords = activity.get('coordinates', [])
-            for coord in coords:
-                if len(coord) == 2:
-                    all_lats.append(coord[0])
-                    all_lons.append(coord[1])
-        
-        if all_lats and all_lons:
-            return [np.mean(all_lats), np.mean(all_lons)]
-        else:
-            return self.default_center
+        return self._get_dataset_summary(activities_data).mean_center or self.default_center
     
-    def _calculate_activity_density_center(self, activities_data: List[Dict], grid_size: int = 50) -> Tuple[float, float]:
+    def _calculate_activity_density_center(self, activities_data: Union[TrackCollection, List[Dict]], grid_size: int = 50) -> Tuple[float, float]:
         """Calculate the center point based on activity density using a grid-based approach"""
-        all_coords = []
-        
-        # Collect all coordinates
-        for activity in activities_data:
-            coords = activity.get('coordinates', [])
-            for coord in coords:
-                if len(coord) == 2:
-                    all_coords.append([coord[0], coord[1]])
-        
-        if not all_coords:
-            return self.default_center
-        
-        # Convert to numpy array for easier manipulation
-        coords_array = np.array(all_coords)
-        
-        # Get bounds
-        min_lat, max_lat = coords_array[:, 0].min(), coords_array[:, 0].max()
-        min_lon, max_lon = coords_array[:, 1].min(), coords_array[:, 1].max()
-        
-        # Create grid
-        lat_bins = np.linspace(min_lat, max_lat, grid_size)
-        lon_bins = np.linspace(min_lon, max_lon, grid_size)
-        
-        # Calculate 2D histogram (density grid)
-        density_grid, _, _ = np.histogram2d(coords_array[:, 0], coords_array[:, 1], 
-                                          bins=[lat_bins, lon_bins])
-        
-        # Find the grid cell with maximum density
-        max_density_idx = np.unravel_index(np.argmax(density_grid), density_grid.shape)
-        
-        # Get the center of the highest density grid cell
-        center_lat = (lat_bins[max_density_idx[0]] + lat_bins[max_density_idx[0] + 1]) / 2
-        center_lon = (lon_bins[max_density_idx[1]] + lon_bins[max_density_idx[1] + 1]) / 2
-        
-        return [center_lat, center_lon]
+        summary = TrackCollection.coerce(activities_data).summary(grid_size)
+        return summary.density_center or self.default_center
     
-    def _sample_coordinates(self, coordinates: List[List[float]], max_points: int = 1000) -> List[List[float]]:
-        """Sample coordinates to reduce density for better performance"""
-        if len(coordinates) <= max_points:
-            return coordinates
-        
-        # Use uniform sampling to maintain route shape
-        step = len(coordinates) // max_points
-        return coordinates[::step]
+    def _simplify_for_zoom(self, activities_data: TrackCollection, zoom: float,
+                           method: Optional[str] = None) -> TrackCollection:
+        """Simplify every track so the error stays under Config.SIMPLIFY_TOLERANCE_PIXELS at a zoom level"""
+        center = activities_data.summary().mean_center
+        tolerance = tolerance_for_zoom(zoom, center[0] if center else 0.0)
+        return simplify_collection(activities_data, tolerance, method)
     
-    def _calculate_route_statistics(self, activity_data: Dict) -> Dict:
+    def _calculate_route_statistics(self, activity_data: Union[ActivityTrack, Dict], method: Optional[str] = None) -> Dict:
         """Calculate statistics for a route"""
-        coords = activity_data.get('coordinates', [])
-        velocity = activity_data.get('velocity', [])
-        altitude = activity_data.get('altitude', [])
-        
-        stats = {
-            'total_points': len(coords),
-            'distance_km': 0.0,
-            'avg_speed_kmh': 0.0,
-            'max_speed_kmh': 0.0,
-            'elevation_gain_m': 0.0,
-            'max_elevation_m': 0.0
-        }
-        
-        if len(coords) < 2:
-            return stats
-        
-        # Calculate total distance
-        total_distance = 0
-        for i in range(1, len(coords)):
-            dist = geodesic(coords[i-1], coords[i]).meters
-            total_distance += dist
-        stats['distance_km'] = total_distance / 1000
-        
-        # Speed statistics
-        if velocity:
-            speeds_kmh = [v * 3.6 for v in velocity if v > 0]  # Convert m/s to km/h
-            if speeds_kmh:
-                stats['avg_speed_kmh'] = np.mean(speeds_kmh)
-                stats['max_speed_kmh'] = max(speeds_kmh)
-        
-        # Elevation statistics
-        if altitude:
-            valid_altitudes = [alt for alt in altitude if alt is not None]
-            if valid_altitudes:
-                stats['max_elevation_m'] = max(valid_altitudes)
-                # Calculate elevation gain
-                elevation_gain = 0
-                for i in range(1, len(valid_altitudes)):
-                    diff = valid_altitudes[i] - valid_altitudes[i-1]
-                    if diff > 0:
-                        elevation_gain += diff
-                stats['elevation_gain_m'] = elevation_gain
-        
-        return stats
+        track = ActivityTrack.from_activity(activity_data) if isinstance(activity_data, dict) else activity_data
+        return route_statistics(track, method or Config.ROUTE_DISTANCE_METHOD)
     
-    def _calculate_optimal_zoom(self, activities_data: List[Dict]) -> int:
+    def _calculate_collection_statistics(self, activities_data: Union[TrackCollection, List[Dict]],
+                                         method: Optional[str] = None) -> Dict[str, np.ndarray]:
+        """Calculate statistics for every route at once, as arrays aligned with the collection"""
+        return collection_statistics(TrackCollection.coerce(activities_data), method or Config.ROUTE_DISTANCE_METHOD)
+    
+    def _calculate_optimal_zoom(self, activities_data: Union[TrackCollection, List[Dict]]) -> int:
         """Calculate optimal zoom level based on activity spread"""
-        all_lats = []
-        all_lons = []
-        
-        for activity in activities_data:
-            coords = activity.get('coordinates', [])
-            for coord in coords:
-                if len(coord) == 2:
-                    all_lats.append(coord[0])
-                    all_lons.append(coord[1])
-        
-        if not all_lats or not all_lons:
-            return self.default_zoom
-        
-        # Calculate the span of coordinates
-        lat_span = max(all_lats) - min(all_lats)
-        lon_span = max(all_lons) - min(all_lons)
-        
-        # Use the larger span to determine zoom
-        max_span = max(lat_span, lon_span)
-        
-        # Zoom level mapping based on coordinate span
-        if max_span > 2.0:      # Very large area (multiple cities)
-            return 8
-        elif max_span > 1.0:    # Large area (city-wide)
-            return 9
-        elif max_span > 0.5:    # Medium area (multiple neighborhoods)
-            return 10
-        elif max_span > 0.2:    # Small area (neighborhood)
-            return 11
-        elif max_span > 0.1:    # Very small area (few blocks)
-            return 12
-        elif max_span > 0.05:   # Tiny area (single area)
-            return 13
-        else:                   # Extremely small area
-            return 14
+        return self._get_dataset_summary(activities_data).zoom or self.default_zoom
     
-    def _get_activity_bounds(self, activities_data: List[Dict]) -> Dict:
+    def _get_activity_bounds(self, activities_data: Union[TrackCollection, List[Dict]]) -> Dict:
         """Get the geographic bounds of all activities"""
-        all_lats = []
-        all_lons = []
-        
-        for activity in activities_data:
-            coords = activity.get('coordinates', [])
-            for coord in coords:
-                if len(coord) == 2:
-                    all_lats.append(coord[0])
-                    all_lons.append(coord[1])
-        
-        if not all_lats or not all_lons:
-            return None
-        
-        return {
-            'min_lat': min(all_lats),
-            'max_lat': max(all_lats),
-            'min_lon': min(all_lons),
-            'max_lon': max(all_lons),
-            'center_lat': np.mean(all_lats),
-            'center_lon': np.mean(all_lons)
-        }
+        return self._get_dataset_summary(activities_data).bounds
     
-    def create_basic_heatmap(self, activities_data: List[Dict], output_file: str = "basic_heatmap.html") -> folium.Map:
-        """Create a basic heatmap from all activity coordinates"""
+    def create_basic_heatmap(self, activities_data: Union[TrackCollection, List[Dict]], output_file: str = "basic_heatmap.html",
+                             rendering: Optional[str] = None) -> folium.Map:
+        """Create a basic heatmap from all activity coordinates
+        
+        With tile rendering (the default, see Config.HEATMAP_RENDERING) the density is rendered
+        server-side into a PNG tile pyramid next to the page, which only references the tiles.
+        """
         print("Creating basic heatmap...")
+        activities_data = TrackCollection.coerce(activities_data)
         
         # Calculate optimal center based on activity density
-        center = self._calculate_activity_density_center(activities_data)
-        zoom = self._calculate_optimal_zoom(activities_data)
-        bounds = self._get_activity_bounds(activities_data)
+        summary = self._get_dataset_summary(activities_data)
+        center = summary.density_center or self.default_center
+        zoom = summary.zoom or self.default_zoom
+        bounds = summary.bounds
         
         print(f"Map center: [{center[0]:.4f}, {center[1]:.4f}]")
         print(f"Optimal zoom level: {zoom}")
@@ -233,22 +114,23 @@ class StravaHeatmapGenerator(AdvancedVisualizationMixin):
             tiles='OpenStreetMap'
         )
         
-        # Collect all coordinates
-        heat_data = []
-        for activity in activities_data:
-            coords = activity.get('coordinates', [])
-            for coord in coords:
-                if len(coord) == 2:
-                    heat_data.append([coord[0], coord[1]])
-        
-        if heat_data:
-            # Add heatmap layer
-            HeatMap(
-                heat_data,
-                radius=8,
-                blur=10,
-                gradient={0.4: 'blue', 0.65: 'lime', 1: 'red'}
-            ).add_to(m)
+        point_count = activities_data.point_count
+        
+        if point_count:
+            rendering = rendering or Config.HEATMAP_RENDERING
+            if rendering == 'tiles':
+                self._add_heatmap_tiles(m, activities_data, output_file, zoom)
+            elif rendering == 'server':
+                # Tiles come from the web app's /tiles endpoint, rendered on demand from every stored track
+                self._add_heatmap_tile_layer(m, "/tiles/heatmap/{z}/{x}/{y}.png", 0, Config.TILE_SERVER_MAX_ZOOM)
+            else:
+                # Add heatmap layer with every point embedded in the page
+                HeatMap(
+                    activities_data.coords.tolist(),
+                    radius=8,
+                    blur=10,
+                    gradient=Config.HEATMAP_GRADIENT
+                ).add_to(m)
             
             # If we have bounds, fit the map to show all activities
             if bounds:
@@ -257,7 +139,7 @@ class StravaHeatmapGenerator(AdvancedVisualizationMixin):
                     [bounds['max_lat'], bounds['max_lon']]
                 ], padding=(20, 20))
             
-            print(f"Added {len(heat_data)} GPS points to heatmap")
+            print(f"Added {point_count} GPS points to heatmap")
         else:
             print("No GPS data found for heatmap")
         
@@ -270,61 +152,75 @@ class StravaHeatmapGenerator(AdvancedVisualizationMixin):
                         font-size:12px; padding: 10px; border-radius: 10px;">
             <h6><b>Activity Area</b></h6>
             <p>Center: {center[0]:.4f}, {center[1]:.4f}</p>
-            <p>GPS Points: {len(heat_data):,}</p>
+            <p>GPS Points: {point_count:,}</p>
             <p>Activities: {len(activities_data)}</p>
             </div>
             '''
             m.get_root().html.add_child(folium.Element(info_html))
         
         # Save map
-        m.save(output_file)
+        with span('write_file', format='html'):
+            m.save(output_file)
         print(f"Basic heatmap saved to {output_file}")
         
         return m
     
-    def create_speed_heatmap(self, activities_data: List[Dict], output_file: str = "speed_heatmap.html") -> folium.Map:
+    def _add_heatmap_tiles(self, m: folium.Map, activities_data: TrackCollection, output_file: str, zoom: int) -> None:
+        """Render the density tile pyramid for a page and add it to the map as a tile layer"""
+        page_dir = os.path.dirname(output_file)
+        layer = os.path.splitext(os.path.basename(output_file))[0]
+        min_zoom = max(0, min(zoom, Config.HEATMAP_TILE_MAX_ZOOM) - Config.HEATMAP_TILE_ZOOM_OUT)
+        max_zoom = Config.HEATMAP_TILE_MAX_ZOOM
+        
+        tiles_per_zoom = TileRenderer().render_pyramid(
+            activities_data.lat, activities_data.lon,
+            os.path.join(page_dir, 'tiles', layer), min_zoom, max_zoom
+        )
+        print(f"Rendered {sum(tiles_per_zoom.values())} heatmap tiles for zoom {min_zoom}-{max_zoom}")
+        
+        # Tile URLs are relative to the page, so the page works from disk and from the Flask /maps route
+        self._add_heatmap_tile_layer(m, f"tiles/{layer}/{{z}}/{{x}}/{{y}}.png", min_zoom, max_zoom)
+    
+    def _add_heatmap_tile_layer(self, m: folium.Map, url_template: str, min_zoom: int, max_zoom: int) -> None:
+        """Add a heatmap tile layer; the browser upscales tiles past max_zoom"""
+        folium.TileLayer(
+            tiles=url_template,
+            attr='Activity heatmap',
+            name='Heatmap',
+            overlay=True,
+            min_zoom=min_zoom,
+            max_native_zoom=max_zoom,
+            max_zoom=19
+        ).add_to(m)
+    
+    def create_speed_heatmap(self, activities_data: Union[TrackCollection, List[Dict]], output_file: str = "speed_heatmap.html") -> folium.Map:
         """Create a heatmap colored by speed"""
         print("Creating speed-based heatmap...")
+        activities_data = TrackCollection.coerce(activities_data)
         
-        center = self._calculate_activity_density_center(activities_data)
-        zoom = self._calculate_optimal_zoom(activities_data)
-        bounds = self._get_activity_bounds(activities_data)
+        summary = self._get_dataset_summary(activities_data)
+        center = summary.density_center or self.default_center
+        zoom = summary.zoom or self.default_zoom
+        bounds = summary.bounds
         
         m = folium.Map(location=center, zoom_start=zoom)
         
-        point_count = 0
-        # Collect coordinates with speed data
-        for activity in activities_data:
-            coords = activity.get('coordinates', [])
-            velocities = activity.get('velocity', [])
-            
-            if coords and velocities and len(coords) == len(velocities):
-                # Convert velocity to km/h and create color-coded points
-                for i, (coord, velocity) in enumerate(zip(coords, velocities)):
-                    if len(coord) == 2 and velocity > 0:
-                        speed_kmh = velocity * 3.6  # Convert m/s to km/h
-                        
-                        # Color based on speed
-                        if speed_kmh < 15:
-                            color = 'blue'
-                        elif speed_kmh < 25:
-                            color = 'green'
-                        elif speed_kmh < 35:
-                            color = 'orange'
-                        else:
-                            color = 'red'
-                        
-                        # Add every 10th point to avoid overcrowding
-                        if i % 10 == 0:
-                            folium.CircleMarker(
-                                location=[coord[0], coord[1]],
-                                radius=2,
-                                color=color,
-                                fillColor=color,
-                                fillOpacity=0.6,
-                                popup=f"Speed: {speed_kmh:.1f} km/h"
-                            ).add_to(m)
-                            point_count += 1
+        # Every 10th point of each activity, joined into lines colored by speed
+        selected = np.flatnonzero(activities_data.point_index % 10 == 0)
+        speeds_kmh = activities_data.velocity[selected].astype(np.float64) * 3.6  # Convert m/s to km/h
+        
+        # Color class based on speed; points without a positive speed break the line
+        speed_bands = list(Config.SPEED_COLORS.values())
+        thresholds = [band['threshold'] for band in speed_bands[:-1]]
+        classes = threshold_classes(speeds_kmh, thresholds)
+        
+        features = colored_line_features(activities_data, selected, classes)
+        labels = ([f"&lt; {thresholds[0]:g} km/h"] +
+                  [f"{low:g}-{high:g} km/h" for low, high in zip(thresholds[:-1], thresholds[1:])] +
+                  [f"&gt; {thresholds[-1]:g} km/h"])
+        colors = [band['color'] for band in speed_bands]
+        ColoredLineLayer(features, colors, labels, 'Speed: ').add_to(m)
+        point_count = int((classes >= 0).sum())
         
         # Fit map to bounds if available
         if bounds:
@@ -333,18 +229,18 @@ class StravaHeatmapGenerator(AdvancedVisualizationMixin):
                 [bounds['max_lat'], bounds['max_lon']]
             ], padding=(20, 20))
         
-        # Add legend
-        legend_html = '''
+        # Add legend, from the same bands as the line colors
+        legend_rows = ''.join(
+            f'<p><i class="fa fa-circle" style="color:{color}"></i> {label}</p>\n        '
+            for color, label in zip(colors, labels)
+        )
+        legend_html = f'''
         <div style="position: fixed; 
-                    bottom: 50px; left: 50px; width: 150px; height: 90px; 
+                    bottom: 50px; left: 50px; width: 150px; 
                     background-color: white; border:2px solid grey; z-index:9999; 
                     font-size:14px; padding: 10px; border-radius: 10px;">
         <p><b>Speed Legend</b></p>
-        <p><i class="fa fa-circle" style="color:blue"></i> &lt; 15 km/h</p>
-        <p><i class="fa fa-circle" style="color:green"></i> 15-25 km/h</p>
-        <p><i class="fa fa-circle" style="color:orange"></i> 25-35 km/h</p>
-        <p><i class="fa fa-circle" style="color:red"></i> &gt; 35 km/h</p>
-        </div>
+        {legend_rows}</div>
         '''
         m.get_root().html.add_child(folium.Element(legend_html))
         
@@ -362,70 +258,51 @@ class StravaHeatmapGenerator(AdvancedVisualizationMixin):
             '''
             m.get_root().html.add_child(folium.Element(info_html))
         
-        m.save(output_file)
+        with span('write_file', format='html'):
+            m.save(output_file)
         print(f"Speed heatmap saved to {output_file}")
         print(f"Added {point_count:,} speed-colored points")
         
         return m
     
-    def create_elevation_heatmap(self, activities_data: List[Dict], output_file: str = "elevation_heatmap.html") -> folium.Map:
+    def create_elevation_heatmap(self, activities_data: Union[TrackCollection, List[Dict]], output_file: str = "elevation_heatmap.html") -> folium.Map:
         """Create a heatmap colored by elevation"""
         print("Creating elevation-based heatmap...")
+        activities_data = TrackCollection.coerce(activities_data)
         
-        center = self._calculate_activity_density_center(activities_data)
-        zoom = self._calculate_optimal_zoom(activities_data)
-        bounds = self._get_activity_bounds(activities_data)
+        summary = self._get_dataset_summary(activities_data)
+        center = summary.density_center or self.default_center
+        zoom = summary.zoom or self.default_zoom
+        bounds = summary.bounds
         
         m = folium.Map(location=center, zoom_start=zoom)
         
-        # Collect all elevations to determine color scale
-        all_elevations = []
-        for activity in activities_data:
-            elevations = activity.get('altitude', [])
-            all_elevations.extend([e for e in elevations if e is not None])
+        # Determine color scale from all valid elevations
+        altitude = activities_data.altitude
+        elevation_bounds = value_range(altitude)
         
-        if not all_elevations:
+        if elevation_bounds is None:
             print("No elevation data found")
             return m
         
-        min_elevation = min(all_elevations)
-        max_elevation = max(all_elevations)
+        min_elevation, max_elevation = elevation_bounds
         elevation_range = max_elevation - min_elevation
         
         print(f"Elevation range: {min_elevation:.0f}m - {max_elevation:.0f}m")
         
-        # Create colormap
-        colormap = cm.get_cmap('terrain')
+        # Every 15th point of each activity, joined into lines colored by elevation
+        selected = np.flatnonzero(activities_data.point_index % 15 == 0)
+        elevations = altitude[selected].astype(np.float64)
         
-        point_count = 0
-        for activity in activities_data:
-            coords = activity.get('coordinates', [])
-            elevations = activity.get('altitude', [])
-            
-            if coords and elevations and len(coords) == len(elevations):
-                for i, (coord, elevation) in enumerate(zip(coords, elevations)):
-                    if len(coord) == 2 and elevation is not None:
-                        # Normalize elevation for color mapping
-                        if elevation_range > 0:
-                            normalized_elevation = (elevation - min_elevation) / elevation_range
-                        else:
-                            normalized_elevation = 0.5
-                        
-                        # Get color from colormap
-                        rgba = colormap(normalized_elevation)
-                        color = f'#{int(rgba[0]*255):02x}{int(rgba[1]*255):02x}{int(rgba[2]*255):02x}'
-                        
-                        # Add every 15th point to avoid overcrowding
-                        if i % 15 == 0:
-                            folium.CircleMarker(
-                                location=[coord[0], coord[1]],
-                                radius=2,
-                                color=color,
-                                fillColor=color,
-                                fillOpacity=0.7,
-                                popup=f"Elevation: {elevation:.1f} m"
-                            ).add_to(m)
-                            point_count += 1
+        # Quantized terrain palette indices (-1 without elevation, which breaks the line)
+        levels = 32
+        classes, palette = map_values(elevations, 'terrain', levels, min_elevation, max_elevation)
+        point_count = int((classes >= 0).sum())
+        
+        features = colored_line_features(activities_data, selected, classes)
+        level_edges = min_elevation + np.arange(levels + 1) * (elevation_range / levels)
+        labels = [f"{low:.0f}-{high:.0f} m" for low, high in zip(level_edges[:-1], level_edges[1:])]
+        ColoredLineLayer(features, palette, labels, 'Elevation: ').add_to(m)
         
         # Fit map to bounds if available
         if bounds:
@@ -463,19 +340,22 @@ class StravaHeatmapGenerator(AdvancedVisualizationMixin):
             '''
             m.get_root().html.add_child(folium.Element(info_html))
         
-        m.save(output_file)
+        with span('write_file', format='html'):
+            m.save(output_file)
         print(f"Elevation heatmap saved to {output_file}")
         print(f"Added {point_count:,} elevation-colored points")
         
         return m
     
-    def create_route_map(self, activities_data: List[Dict], output_file: str = "routes_map.html") -> folium.Map:
+    def create_route_map(self, activities_data: Union[TrackCollection, List[Dict]], output_file: str = "routes_map.html") -> folium.Map:
         """Create a map showing individual routes"""
         print("Creating routes map...")
+        activities_data = TrackCollection.coerce(activities_data)
         
-        center = self._calculate_activity_density_center(activities_data)
-        zoom = self._calculate_optimal_zoom(activities_data)
-        bounds = self._get_activity_bounds(activities_data)
+        summary = self._get_dataset_summary(activities_data)
+        center = summary.density_center or self.default_center
+        zoom = summary.zoom or self.default_zoom
+        bounds = summary.bounds
         
         m = folium.Map(location=center, zoom_start=zoom)
         
@@ -484,29 +364,18 @@ class StravaHeatmapGenerator(AdvancedVisualizationMixin):
                  'beige', 'darkblue', 'darkgreen', 'cadetblue', 'darkpurple', 'white', 
                  'pink', 'lightblue', 'lightgreen', 'gray', 'black', 'lightgray']
         
-        route_count = 0
-        total_points = 0
+        # Every route, at the pyramid level a few zoom levels past the initial view,
+        # coarsened as needed to stay within the vertex budget
+        routes, _ = RoutePyramid.of(activities_data).select(zoom + Config.SIMPLIFY_ZOOM_OFFSET)
+        route_count = len(routes)
+        total_points = routes.point_count
         
-        for i, activity in enumerate(activities_data[:20]):  # Limit to 20 routes for visibility
-            coords = activity.get('coordinates', [])
-            
-            if coords:
-                # Convert coordinates for folium
-                route_coords = [[coord[0], coord[1]] for coord in coords if len(coord) == 2]
-                
-                if route_coords:
-                    color = colors[i % len(colors)]
-                    
-                    folium.PolyLine(
-                        locations=route_coords,
-                        color=color,
-                        weight=3,
-                        opacity=0.7,
-                        popup=f"Route {i+1} (Activity ID: {activity.get('id', 'Unknown')})"
-                    ).add_to(m)
-                    
-                    route_count += 1
-                    total_points += len(route_coords)
+        if route_count:
+            # One canvas-rendered layer for all routes; class i is route i
+            labels = [f"Route {i+1} (Activity ID: {activity_id})" for i, activity_id in enumerate(routes.ids.tolist())]
+            palette = [colors[i % len(colors)] for i in range(route_count)]
+            features = colored_line_features(routes, np.arange(total_points), routes.activity_index)
+            ColoredLineLayer(features, palette, labels, title='', weight=3, opacity=0.7).add_to(m)
         
         # Fit map to bounds if available
         if bounds:
@@ -530,7 +399,8 @@ class StravaHeatmapGenerator(AdvancedVisualizationMixin):
             '''
             m.get_root().html.add_child(folium.Element(info_html))
         
-        m.save(output_file)
+        with span('write_file', format='html'):
+            m.save(output_file)
         print(f"Routes map saved to {output_file}")
         print(f"Added {route_count} routes with {total_points:,} total points")
         
@@ -584,30 +454,48 @@ class StravaHeatmapGenerator(AdvancedVisualizationMixin):
         ax4.grid(True, alpha=0.3)
         
         plt.tight_layout()
-        plt.savefig(output_file, dpi=300, bbox_inches='tight')
+        with span('write_file', format='png'):
+            plt.savefig(output_file, dpi=300, bbox_inches='tight')
         print(f"Activity statistics chart saved to {output_file}")
         plt.close()
     
-    def generate_all_maps(self, activities_data: List[Dict], activities_df: pd.DataFrame) -> Dict[str, str]:
+    def render_maps(self, jobs: List[RenderJob], activities_data: Union[TrackCollection, List[Dict], None] = None,
+                    activities_df: Optional[pd.DataFrame] = None, parallel: bool = True,
+                    on_complete: Optional[Callable[[str, Dict], None]] = None) -> Dict[str, Dict]:
+        """Render independent map jobs, in parallel worker processes unless parallel is False
+        
+        on_complete(name, result) is called as each map finishes.
+        """
+        tracks = TrackCollection.coerce(activities_data) if activities_data is not None else None
+        if parallel:
+            if self.render_scheduler is None:
+                self.render_scheduler = RenderScheduler()
+            scheduler = self.render_scheduler
+        else:
+            scheduler = RenderScheduler(max_workers=1)
+        return scheduler.run(jobs, tracks, activities_df, local_targets={'heatmap': self}, on_complete=on_complete)
+    
+    def generate_all_maps(self, activities_data: Union[TrackCollection, List[Dict]], activities_df: pd.DataFrame,
+                          parallel: bool = True) -> Dict[str, str]:
         """Generate all types of maps and return file paths"""
-        output_files = {}
+        jobs = []
         
-        if activities_data:
-            output_files['basic'] = "maps/basic_heatmap.html"
-            output_files['speed'] = "maps/speed_heatmap.html"
-            output_files['elevation'] = "maps/elevation_heatmap.html"
-            output_files['routes'] = "maps/routes_map.html"
-            
+        # Convert once so every map builder shares the same arrays and dataset summary
+        activities_data = TrackCollection.coerce(activities_data)
+        
+        if len(activities_data):
             # Create maps directory
             os.makedirs("maps", exist_ok=True)
             
-            self.create_basic_heatmap(activities_data, output_files['basic'])
-            self.create_speed_heatmap(activities_data, output_files['speed'])
-            self.create_elevation_heatmap(activities_data, output_files['elevation'])
-            self.create_route_map(activities_data, output_files['routes'])
+            jobs += [
+                RenderJob('basic', 'create_basic_heatmap', "maps/basic_heatmap.html"),
+                RenderJob('speed', 'create_speed_heatmap', "maps/speed_heatmap.html"),
+                RenderJob('elevation', 'create_elevation_heatmap', "maps/elevation_heatmap.html"),
+                RenderJob('routes', 'create_route_map', "maps/routes_map.html")
+            ]
         
         if not activities_df.empty:
-            output_files['stats'] = "maps/activity_stats.png"
-            self.create_activity_stats_chart(activities_df, output_files['stats'])
+            jobs.append(RenderJob('stats', 'create_activity_stats_chart', "maps/activity_stats.png", data='dataframe'))
         
-        return output_files
+        results = self.render_maps(jobs, activities_data, activities_df, parallel=parallel)
+        return {name: result['output_file'] for name, result in results.items() if not result['error']}
@@ -0,0 +1,111 @@
+"""
+Pooled keep-alive HTTP session with connect/transfer timing for Strava API calls
+"""
+import threading
+import time
+from typing import Dict
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+
+
+class ConnectionTimings:
+    """Thread-safe accumulator for per-phase request timings"""
+    
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+    
+    def reset(self) -> None:
+        """Reset all counters"""
+        self.connections_opened = 0
+        self.connect_seconds = 0.0
+        self.requests = 0
+        self.request_seconds = 0.0
+    
+    def record_connect(self, seconds: float) -> None:
+        """Record a new TCP+TLS connection"""
+        with self._lock:
+            self.connections_opened += 1
+            self.connect_seconds += seconds
+    
+    def record_request(self, seconds: float) -> None:
+        """Record the wall time of a full request (connect, wait and transfer)"""
+        with self._lock:
+            self.requests += 1
+            self.request_seconds += seconds
+    
+    def summary(self) -> Dict:
+        """Summarize time spent on connection setup versus request transfer"""
+        with self._lock:
+            transfer_seconds = max(0.0, self.request_seconds - self.connect_seconds)
+            return {
+                'requests': self.requests,
+                'connections_opened': self.connections_opened,
+                'connections_reused': max(0, self.requests - self.connections_opened),
+                'connect_seconds': round(self.connect_seconds, 4),
+                'transfer_seconds': round(transfer_seconds, 4),
+                'avg_connect_ms': round(1000 * self.connect_seconds / self.connections_opened, 2)
+                                  if self.connections_opened else 0.0,
+                'avg_transfer_ms': round(1000 * transfer_seconds / self.requests, 2)
+                                   if self.requests else 0.0
+            }
+
+
+def _timed_pool_class(pool_cls, connection_cls, timings: ConnectionTimings):
+    """Build a connection pool class whose connections report their setup time"""
+    
+    class TimedConnection(connection_cls):
+        def connect(self):
+            start = time.perf_counter()
+            try:
+                return super().connect()
+            finally:
+                timings.record_connect(time.perf_counter() - start)
+    
+    class TimedConnectionPool(pool_cls):
+        ConnectionCls = TimedConnection
+    
+    return TimedConnectionPool
+
+
+class TimedHTTPAdapter(HTTPAdapter):
+    """HTTPAdapter with a fixed-size keep-alive pool that records connection setup time"""
+    
+    def __init__(self, timings: ConnectionTimings, pool_size: int = 10):
+        self.timings = timings
+        super().__init__(pool_connections=pool_size, pool_maxsize=pool_size)
+    
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {
+            'http': _timed_pool_class(HTTPConnectionPool, HTTPConnection, self.timings),
+            'https': _timed_pool_class(HTTPSConnectionPool, HTTPSConnection, self.timings)
+        }
+
+
+class PooledSession(requests.Session):
+    """requests.Session that reuses connections across threads and tracks per-phase timing"""
+    
+    def __init__(self, pool_size: int = 10):
+        super().__init__()
+        self.pool_size = pool_size
+        self.timings = ConnectionTimings()
+        
+        adapter = TimedHTTPAdapter(self.timings, pool_size=pool_size)
+        self.mount('https://', adapter)
+        self.mount('http://', adapter)
+        
+        self.headers.update({
+            'Accept-Encoding': 'gzip, deflate',
+            'Connection': 'keep-alive'
+        })
+    
+    def request(self, *args, **kwargs) -> requests.Response:
+        start = time.perf_counter()
+        try:
+            return super().request(*args, **kwargs)
+        finally:
+            self.timings.record_request(time.perf_counter() - start)
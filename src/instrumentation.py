@@ -0,0 +1,205 @@
+"""
+Lightweight pipeline instrumentation: timed spans and counters, exported as structured
+logs, Prometheus text and a profile summary
+"""
+import functools
+import json
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from typing import Dict, Iterator, List, Optional, Tuple
+
+# (metric name, sorted (label, value) pairs)
+MetricKey = Tuple[str, Tuple[Tuple[str, str], ...]]
+
+
+def _key(name: str, labels: Dict) -> MetricKey:
+    return name, tuple(sorted((label, str(value)) for label, value in labels.items()))
+
+
+def _escape(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(labels: Tuple[Tuple[str, str], ...]) -> str:
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{label}="{_escape(value)}"' for label, value in labels) + '}'
+
+
+class MetricsRegistry:
+    """Thread-safe counters and span timers of one process
+    
+    Spans record their duration into a timer (count, total and max seconds per name and
+    label set) and, when a log destination is configured, write one JSON line each.
+    Worker processes ship their metrics back with snapshot(reset=True) and merge().
+    """
+    
+    def __init__(self, log_destination: Optional[str] = None):
+        self._lock = threading.Lock()
+        self._counters: Dict[MetricKey, float] = {}
+        self._timers: Dict[MetricKey, List[float]] = {}
+        self._local = threading.local()
+        self._log_file = None
+        self.configure_log(log_destination)
+    
+    def configure_log(self, destination: Optional[str]) -> None:
+        """Write finished spans as JSON lines to a file path, '-' for stderr, or nowhere (None)"""
+        with self._lock:
+            if self._log_file not in (None, sys.stderr):
+                self._log_file.close()
+            if not destination:
+                self._log_file = None
+            elif destination == '-':
+                self._log_file = sys.stderr
+            else:
+                self._log_file = open(destination, 'a', buffering=1)
+    
+    def increment(self, name: str, value: float = 1.0, **labels) -> None:
+        """Add to a counter"""
+        key = _key(name, labels)
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0.0) + value
+    
+    def observe(self, name: str, seconds: float, **labels) -> None:
+        """Record one duration into a timer"""
+        key = _key(name, labels)
+        with self._lock:
+            timer = self._timers.get(key)
+            if timer is None:
+                self._timers[key] = [1, seconds, seconds]
+            else:
+                timer[0] += 1
+                timer[1] += seconds
+                timer[2] = max(timer[2], seconds)
+    
+    @contextmanager
+    def span(self, name: str, **labels) -> Iterator[None]:
+        """Time the enclosed block as a stage; nested spans log their parent stage"""
+        stack = self._local.__dict__.setdefault('stack', [])
+        parent = stack[-1] if stack else None
+        stack.append(name)
+        error = None
+        start = time.perf_counter()
+        try:
+            yield
+        except BaseException as e:
+            error = type(e).__name__
+            raise
+        finally:
+            seconds = time.perf_counter() - start
+            stack.pop()
+            self.observe(name, seconds, **labels)
+            if self._log_file is not None:
+                self._log_span(name, labels, seconds, parent, error)
+    
+    def timed(self, name: str, **labels):
+        """Decorator running every call of a function inside a span"""
+        def decorator(func):
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                with self.span(name, **labels):
+                    return func(*args, **kwargs)
+            return wrapper
+        return decorator
+    
+    def _log_span(self, name: str, labels: Dict, seconds: float, parent: Optional[str], error: Optional[str]) -> None:
+        event = {'ts': datetime.now(timezone.utc).isoformat(), 'event': 'span', 'span': name,
+                 'seconds': round(seconds, 6), 'pid': os.getpid()}
+        if labels:
+            event['labels'] = {label: str(value) for label, value in labels.items()}
+        if parent:
+            event['parent'] = parent
+        if error:
+            event['error'] = error
+        line = json.dumps(event)
+        with self._lock:
+            if self._log_file is not None:
+                self._log_file.write(line + '\n')
+    
+    def snapshot(self, reset: bool = False) -> Dict:
+        """JSON-friendly copy of every counter and timer, optionally clearing them"""
+        with self._lock:
+            data = {
+                'counters': [[name, dict(labels), value] for (name, labels), value in self._counters.items()],
+                'timers': [[name, dict(labels)] + list(timer) for (name, labels), timer in self._timers.items()]
+            }
+            if reset:
+                self._counters.clear()
+                self._timers.clear()
+        return data
+    
+    def merge(self, snapshot: Optional[Dict]) -> None:
+        """Add another process's snapshot to this registry"""
+        if not snapshot:
+            return
+        for name, labels, value in snapshot.get('counters', []):
+            self.increment(name, value, **labels)
+        with self._lock:
+            for name, labels, count, total, longest in snapshot.get('timers', []):
+                key = _key(name, labels)
+                timer = self._timers.setdefault(key, [0, 0.0, 0.0])
+                timer[0] += count
+                timer[1] += total
+                timer[2] = max(timer[2], longest)
+    
+    def reset(self) -> None:
+        self.snapshot(reset=True)
+    
+    def to_prometheus(self, prefix: str = 'strava_heatmap_') -> str:
+        """Prometheus text exposition: counters as <name>_total, spans as <name>_seconds summaries"""
+        with self._lock:
+            counters = sorted(self._counters.items())
+            timers = sorted((key, list(timer)) for key, timer in self._timers.items())
+        
+        lines = []
+        declared = set()
+        
+        def declare(metric: str, kind: str) -> None:
+            if metric not in declared:
+                declared.add(metric)
+                lines.append(f"# TYPE {metric} {kind}")
+        
+        for (name, labels), value in counters:
+            declare(f"{prefix}{name}_total", 'counter')
+            lines.append(f"{prefix}{name}_total{_format_labels(labels)} {value:g}")
+        for (name, labels), (count, total, _) in timers:
+            declare(f"{prefix}{name}_seconds", 'summary')
+            lines.append(f"{prefix}{name}_seconds_count{_format_labels(labels)} {count}")
+            lines.append(f"{prefix}{name}_seconds_sum{_format_labels(labels)} {total:.6f}")
+        for (name, labels), (_, _, longest) in timers:
+            declare(f"{prefix}{name}_seconds_max", 'gauge')
+            lines.append(f"{prefix}{name}_seconds_max{_format_labels(labels)} {longest:.6f}")
+        return '\n'.join(lines) + '\n'
+    
+    def format_summary(self) -> str:
+        """Table of stage timings (slowest total first) and counters, for --profile"""
+        with self._lock:
+            timers = sorted(self._timers.items(), key=lambda item: -item[1][1])
+            counters = sorted(self._counters.items())
+        
+        def describe(name: str, labels) -> str:
+            return name + (' ' + ' '.join(f"{label}={value}" for label, value in labels) if labels else '')
+        
+        stages = [(describe(name, labels), timer) for (name, labels), timer in timers]
+        counts = [(describe(name, labels), value) for (name, labels), value in counters]
+        width = max([len(label) for label, _ in stages + counts] + [24])
+        lines = [f"{'stage':<{width}} {'calls':>7} {'total s':>9} {'mean ms':>9} {'max ms':>9}"]
+        for label, (count, total, longest) in stages:
+            lines.append(f"{label:<{width}} {count:>7} {total:>9.2f} {total / count * 1000:>9.1f} {longest * 1000:>9.1f}")
+        if counts:
+            lines.append('')
+            lines.append(f"{'counter':<{width}} {'value':>7}")
+            for label, value in counts:
+                lines.append(f"{label:<{width}} {value:>7g}")
+        return '\n'.join(lines)
+
+
+# Process-wide registry; STRAVA_METRICS_LOG enables structured span logs ('-' for stderr)
+metrics = MetricsRegistry(os.getenv('STRAVA_METRICS_LOG'))
+span = metrics.span
+timed = metrics.timed
+increment = metrics.increment
@@ -0,0 +1,168 @@
+"""
+In-process background job queue for long-running map generation, with progress events
+"""
+import hashlib
+import json
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+from .config import Config
+
+
+class Job:
+    """One queued pipeline run and the progress events it has reported so far"""
+    
+    PENDING_STATES = ('queued', 'running')
+    
+    def __init__(self, key: str, params: Dict):
+        self.id = uuid.uuid4().hex
+        self.key = key
+        self.params = params
+        self.status = 'queued'
+        self.stage = 'queued'
+        self.progress = 0.0
+        self.result: Optional[Any] = None
+        self.error: Optional[str] = None
+        self.created_at = time.time()
+        self.finished_at: Optional[float] = None
+        self.events: List[Dict] = []
+    
+    @property
+    def pending(self) -> bool:
+        return self.status in self.PENDING_STATES
+    
+    def to_dict(self) -> Dict:
+        return {
+            'job_id': self.id,
+            'status': self.status,
+            'stage': self.stage,
+            'progress': round(self.progress, 3),
+            'result': self.result,
+            'error': self.error,
+            'created_at': self.created_at,
+            'finished_at': self.finished_at
+        }
+
+
+class JobQueue:
+    """Runs jobs on a small thread pool and lets any number of clients follow their progress
+    
+    runner(params, report) does the work: it calls report(stage, progress, message) as it
+    goes and returns a JSON-serializable result. Submitting parameters identical to a job
+    that is still queued or running returns that job instead of starting another one.
+    Finished jobs are kept (up to max_finished) so their outcome can still be fetched.
+    """
+    
+    def __init__(self, runner: Callable[[Dict, Callable], Any], max_workers: int = Config.JOB_WORKERS,
+                 max_finished: int = Config.JOB_HISTORY_SIZE):
+        self.runner = runner
+        self.max_finished = max_finished
+        self._executor = ThreadPoolExecutor(max_workers=max(1, max_workers), thread_name_prefix='job')
+        self._jobs: 'OrderedDict[str, Job]' = OrderedDict()
+        self._pending_by_key: Dict[str, Job] = {}
+        self._changed = threading.Condition()
+    
+    @staticmethod
+    def job_key(params: Dict) -> str:
+        """Digest of the job parameters, identical for identical requests"""
+        return hashlib.sha1(json.dumps(params, sort_keys=True, default=str).encode()).hexdigest()
+    
+    def submit(self, params: Dict) -> Tuple[Job, bool]:
+        """Queue a job; returns (job, created), where created is False for a deduplicated request"""
+        key = self.job_key(params)
+        with self._changed:
+            job = self._pending_by_key.get(key)
+            if job is not None:
+                return job, False
+            
+            job = Job(key, params)
+            self._jobs[job.id] = job
+            self._pending_by_key[key] = job
+            self._add_event(job, 'queued', 'Waiting for a worker')
+        
+        self._executor.submit(self._run, job)
+        return job, True
+    
+    def get(self, job_id: str) -> Optional[Job]:
+        with self._changed:
+            return self._jobs.get(job_id)
+    
+    def _add_event(self, job: Job, event: str, message: Optional[str] = None) -> None:
+        """Record a progress event and wake the event streams (caller holds the condition)"""
+        job.events.append({
+            'id': len(job.events),
+            'event': event,
+            'data': dict(job.to_dict(), message=message)
+        })
+        self._changed.notify_all()
+    
+    def _report(self, job: Job, stage: str, progress: float, message: Optional[str] = None) -> None:
+        with self._changed:
+            job.stage = stage
+            job.progress = min(max(progress, 0.0), 1.0)
+            self._add_event(job, 'progress', message)
+    
+    def _run(self, job: Job) -> None:
+        with self._changed:
+            job.status = 'running'
+            job.stage = 'starting'
+            self._add_event(job, 'progress', 'Started')
+        
+        def report(stage: str, progress: float, message: Optional[str] = None) -> None:
+            self._report(job, stage, progress, message)
+        
+        try:
+            result = self.runner(job.params, report)
+            status, error = 'succeeded', None
+        except Exception as e:
+            print(f"Error running job {job.id}: {e}")
+            result, status, error = None, 'failed', str(e)
+        
+        with self._changed:
+            job.status = status
+            job.stage = 'done'
+            job.result = result
+            job.error = error
+            job.finished_at = time.time()
+            if status == 'succeeded':
+                job.progress = 1.0
+            self._pending_by_key.pop(job.key, None)
+            self._add_event(job, 'done', error)
+            self._forget_old_jobs()
+    
+    def _forget_old_jobs(self) -> None:
+        finished = [job_id for job_id, job in self._jobs.items() if not job.pending]
+        for job_id in finished[:max(0, len(finished) - self.max_finished)]:
+            del self._jobs[job_id]
+    
+    def events(self, job_id: str, last_event_id: int = -1, heartbeat: float = 15.0) -> Iterator[Optional[Dict]]:
+        """Yield a job's events after last_event_id as they happen, ending after its 'done' event
+        
+        None is yielded when nothing happened for heartbeat seconds, so the caller can keep
+        the connection alive.
+        """
+        next_index = last_event_id + 1
+        while True:
+            with self._changed:
+                job = self._jobs.get(job_id)
+                if job is None:
+                    return
+                if next_index >= len(job.events):
+                    self._changed.wait(heartbeat)
+                new_events = job.events[next_index:]
+            
+            if not new_events:
+                yield None
+                continue
+            for event in new_events:
+                yield event
+                if event['event'] == 'done':
+                    return
+            next_index += len(new_events)
+    
+    def shutdown(self, wait: bool = True) -> None:
+        self._executor.shutdown(wait=wait)
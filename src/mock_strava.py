@@ -0,0 +1,288 @@
+"""
+Local stand-in for the Strava API, for offline load, retry and rate-limit testing
+"""
+import argparse
+import json
+import math
+import os
+import random
+import threading
+import time
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, List, Optional, Tuple
+from urllib.parse import parse_qs, urlparse
+
+from .config import Config
+from .synthetic_data import SyntheticDataset
+from .track_store import TrackStore
+
+API_PREFIX = '/api/v3'
+STREAM_TYPES = ('latlng', 'altitude', 'velocity_smooth', 'distance', 'time')
+
+
+class MockDataset:
+    """The athlete, activity summaries and streams served by MockStravaServer
+    
+    streams(activity_id) returns {stream type: data list}, or None for an unknown activity.
+    """
+    
+    def __init__(self, athlete: Dict, activities: List[Dict], streams: Callable[[int], Optional[Dict[str, list]]]):
+        self.athlete = athlete
+        self.activities = sorted(activities, key=lambda a: a['start_date'])
+        self._start_times = [datetime.fromisoformat(a['start_date'].replace('Z', '+00:00')).timestamp()
+                             for a in self.activities]
+        self._ids = {activity['id'] for activity in activities}
+        self._streams = streams
+    
+    @classmethod
+    def synthetic(cls, n_activities: int = 200, points_per_activity: int = 2000, seed: int = 0,
+                  days: int = 365) -> 'MockDataset':
+        """One synthetic athlete's rides over the last `days` days, identical for the same seed"""
+        dataset = SyntheticDataset(1, n_activities, points_per_activity, seed=seed, days=days)
+        return cls(dataset.athletes[0], dataset.activities(), dataset.streams)
+    
+    @classmethod
+    def from_cache(cls, cache_dir: str = 'cache') -> 'MockDataset':
+        """Replay recorded data: the synced activity stores and the track store under cache_dir"""
+        activities = {}
+        athlete_id = 0
+        for name in sorted(os.listdir(cache_dir)):
+            if name.startswith('activities_') and name.endswith('.json'):
+                with open(os.path.join(cache_dir, name)) as f:
+                    data = json.load(f)
+                athlete_id = data.get('athlete_id') or athlete_id
+                activities.update(data.get('activities', {}))
+        track_store = TrackStore(os.path.join(cache_dir, 'tracks'))
+        
+        def streams(activity_id: int) -> Optional[Dict[str, list]]:
+            stored = track_store.get_streams(activity_id)
+            return None if stored is None else {key: value['data'] for key, value in stored.items()}
+        
+        athlete = {'id': athlete_id, 'firstname': 'Recorded', 'lastname': 'Rider'}
+        return cls(athlete, list(activities.values()), streams)
+    
+    def list_activities(self, after: Optional[float] = None, before: Optional[float] = None) -> List[Dict]:
+        """Activities in (after, before), oldest first when after is given and newest first otherwise"""
+        selected = [activity for activity, start in zip(self.activities, self._start_times)
+                    if (after is None or start > after) and (before is None or start < before)]
+        return selected if after is not None else selected[::-1]
+    
+    def streams(self, activity_id: int) -> Optional[Dict[str, list]]:
+        if activity_id not in self._ids:
+            return None
+        return self._streams(activity_id)
+
+
+class MockStravaServer:
+    """Threaded HTTP server answering the Strava endpoints StravaAPI uses
+    
+    Serves /athlete, /athlete/activities (after/before/page/per_page) and
+    /activities/{id}/streams under /api/v3, with Strava's X-RateLimit-Limit and
+    X-RateLimit-Usage headers. It can add latency, answer 429 with Retry-After when the
+    15-minute or daily budget is spent or at random (rate_429), and fail with 500s at
+    random (error_rate). Counters are available from stats() or GET /_mock/stats.
+    """
+    
+    def __init__(self, dataset: Optional[MockDataset] = None, host: str = '127.0.0.1', port: int = 0,
+                 latency: float = 0.0, jitter: float = 0.0, rate_429: float = 0.0, error_rate: float = 0.0,
+                 retry_after: float = 1.0, short_limit: int = Config.STRAVA_RATE_LIMIT,
+                 daily_limit: int = Config.STRAVA_DAILY_RATE_LIMIT, short_window: int = 900, seed: int = 0):
+        self.dataset = dataset or MockDataset.synthetic(seed=seed)
+        self.host = host
+        self.port = port
+        self.latency = latency
+        self.jitter = jitter
+        self.rate_429 = rate_429
+        self.error_rate = error_rate
+        self.retry_after = retry_after
+        self.short_limit = short_limit
+        self.daily_limit = daily_limit
+        self.short_window = short_window
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._usage = {'short': [0, 0], 'daily': [0, 0]}  # window -> [window index, requests]
+        self._server: Optional[ThreadingHTTPServer] = None
+        self._thread: Optional[threading.Thread] = None
+        self.reset_stats()
+    
+    @property
+    def base_url(self) -> str:
+        return f"http://{self.host}:{self.port}{API_PREFIX}"
+    
+    def start(self) -> str:
+        """Serve in a background thread; returns the base URL to give StravaAPI"""
+        handler = type('MockStravaHandler', (_MockStravaHandler,), {'mock': self})
+        self._server = ThreadingHTTPServer((self.host, self.port), handler)
+        self._server.daemon_threads = True
+        self.port = self._server.server_port
+        self._thread = threading.Thread(target=self._server.serve_forever, name='mock-strava', daemon=True)
+        self._thread.start()
+        return self.base_url
+    
+    def stop(self) -> None:
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+    
+    def __enter__(self) -> 'MockStravaServer':
+        self.start()
+        return self
+    
+    def __exit__(self, *exc_info) -> None:
+        self.stop()
+    
+    def reset_stats(self) -> None:
+        with self._lock:
+            self._stats = {'requests': 0, 'by_endpoint': {}, 'by_status': {}, 'in_flight': 0, 'max_in_flight': 0}
+    
+    def stats(self) -> Dict:
+        with self._lock:
+            return json.loads(json.dumps(self._stats))
+    
+    def _count_request(self, now: float) -> Tuple[int, int, Optional[float]]:
+        """Charge a request to both windows: (short usage, daily usage, seconds until reset if over)"""
+        with self._lock:
+            over = None
+            for name, window, limit in (('short', self.short_window, self.short_limit),
+                                        ('daily', 86400, self.daily_limit)):
+                usage = self._usage[name]
+                index = int(now // window)
+                if usage[0] != index:
+                    usage[0], usage[1] = index, 0
+                usage[1] += 1
+                if usage[1] > limit:
+                    over = max(over or 0.0, (index + 1) * window - now)
+            return self._usage['short'][1], self._usage['daily'][1], over
+    
+    def handle(self, path: str, query: Dict[str, List[str]], headers) -> Tuple[int, Dict[str, str], object]:
+        """(status, extra headers, JSON body) for one GET request"""
+        if path == '/_mock/stats':
+            return 200, {}, self.stats()
+        if not path.startswith(API_PREFIX):
+            return 404, {}, {'message': 'Record Not Found'}
+        path = path[len(API_PREFIX):].rstrip('/')
+        
+        short_usage, daily_usage, over = self._count_request(time.time())
+        rate_headers = {'X-RateLimit-Limit': f"{self.short_limit},{self.daily_limit}",
+                        'X-RateLimit-Usage': f"{short_usage},{daily_usage}"}
+        if not headers.get('Authorization', '').startswith('Bearer '):
+            return 401, rate_headers, {'message': 'Authorization Error'}
+        
+        delay = self.latency + (self._random.uniform(0, self.jitter) if self.jitter else 0.0)
+        if delay > 0:
+            time.sleep(delay)
+        
+        with self._lock:
+            roll = self._random.random()
+        if over is not None or roll < self.rate_429:
+            retry_after = math.ceil(over) if over is not None else self.retry_after
+            return 429, dict(rate_headers, **{'Retry-After': str(retry_after)}), {'message': 'Rate Limit Exceeded'}
+        if roll < self.rate_429 + self.error_rate:
+            return 500, rate_headers, {'message': 'Internal Server Error'}
+        
+        status, body = self._route(path, query)
+        return status, rate_headers, body
+    
+    def _route(self, path: str, query: Dict[str, List[str]]) -> Tuple[int, object]:
+        def param(name, default=None, convert=int):
+            values = query.get(name)
+            return convert(values[0]) if values else default
+        
+        if path == '/athlete':
+            return 200, self.dataset.athlete
+        if path == '/athlete/activities':
+            per_page = min(param('per_page', 30), 200)
+            page = max(param('page', 1), 1)
+            activities = self.dataset.list_activities(param('after', None, float), param('before', None, float))
+            return 200, activities[(page - 1) * per_page:page * per_page]
+        
+        parts = path.strip('/').split('/')
+        if len(parts) == 3 and parts[0] == 'activities' and parts[2] == 'streams' and parts[1].isdigit():
+            streams = self.dataset.streams(int(parts[1]))
+            if streams is None:
+                return 404, {'message': 'Record Not Found'}
+            keys = param('keys', ','.join(STREAM_TYPES), str).split(',')
+            # Strava always includes distance, the series the others are indexed by
+            selected = {key: streams[key] for key in dict.fromkeys(keys + ['distance']) if key in streams}
+            payload = {key: {'data': data, 'series_type': 'distance', 'original_size': len(data), 'resolution': 'high'}
+                       for key, data in selected.items()}
+            if param('key_by_type', 'false', str) == 'true':
+                return 200, payload
+            return 200, [dict(stream, type=key) for key, stream in payload.items()]
+        return 404, {'message': 'Record Not Found'}
+
+
+class _MockStravaHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    mock: MockStravaServer
+    
+    def do_GET(self):
+        url = urlparse(self.path)
+        endpoint = url.path
+        parts = endpoint.split('/')
+        if len(parts) > 4 and parts[-3] == 'activities':
+            endpoint = '/'.join(parts[:-2] + ['{id}', parts[-1]])
+        
+        mock = self.mock
+        with mock._lock:
+            mock._stats['in_flight'] += 1
+            mock._stats['max_in_flight'] = max(mock._stats['max_in_flight'], mock._stats['in_flight'])
+        try:
+            status, headers, body = mock.handle(url.path, parse_qs(url.query), self.headers)
+        finally:
+            with mock._lock:
+                stats = mock._stats
+                stats['in_flight'] -= 1
+                stats['requests'] += 1
+                stats['by_endpoint'][endpoint] = stats['by_endpoint'].get(endpoint, 0) + 1
+                stats['by_status'][str(status)] = stats['by_status'].get(str(status), 0) + 1
+        
+        payload = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(payload)))
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(payload)
+    
+    def log_message(self, format, *args):
+        pass
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Serve a local stand-in for the Strava API')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--activities', type=int, default=200, help='Synthetic activities to serve (default: 200)')
+    parser.add_argument('--points', type=int, default=2000, help='GPS points per synthetic activity (default: 2000)')
+    parser.add_argument('--seed', type=int, default=0, help='Seed of the synthetic data, latency and errors')
+    parser.add_argument('--from-cache', metavar='DIR', help='Replay recorded activities and streams from a cache directory')
+    parser.add_argument('--latency', type=float, default=0.0, help='Seconds added to every response')
+    parser.add_argument('--jitter', type=float, default=0.0, help='Extra random latency, up to this many seconds')
+    parser.add_argument('--rate-429', type=float, default=0.0, help='Fraction of requests answered with 429')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='Fraction of requests answered with 500')
+    parser.add_argument('--retry-after', type=float, default=1.0, help='Retry-After seconds of random 429s')
+    parser.add_argument('--short-limit', type=int, default=Config.STRAVA_RATE_LIMIT, help='Requests per 15 minutes')
+    parser.add_argument('--daily-limit', type=int, default=Config.STRAVA_DAILY_RATE_LIMIT, help='Requests per day')
+    args = parser.parse_args()
+    
+    dataset = (MockDataset.from_cache(args.from_cache) if args.from_cache
+               else MockDataset.synthetic(args.activities, args.points, args.seed))
+    server = MockStravaServer(dataset, args.host, args.port, latency=args.latency, jitter=args.jitter,
+                              rate_429=args.rate_429, error_rate=args.error_rate, retry_after=args.retry_after,
+                              short_limit=args.short_limit, daily_limit=args.daily_limit, seed=args.seed)
+    base_url = server.start()
+    print(f"Mock Strava API serving {len(dataset.activities)} activities at {base_url}")
+    print(f"Point the app at it with STRAVA_API_BASE_URL={base_url}")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.stop()
+
+
+if __name__ == '__main__':
+    main()
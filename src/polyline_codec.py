@@ -0,0 +1,95 @@
+"""
+Vectorized encoding and decoding of Google encoded polylines (Strava's map.summary_polyline)
+"""
+from typing import Sequence, Tuple
+
+import numpy as np
+
+PRECISION = 5
+
+
+def decode_polylines(encoded: Sequence[str], precision: int = PRECISION) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Decode many encoded polylines at once into (offsets, lat, lon)
+    
+    Polyline i owns points offsets[i]:offsets[i + 1], matching TrackCollection's layout.
+    All strings are decoded in a few array passes over their concatenated characters:
+    each character carries 5 bits of a value and a continuation bit, so the characters are
+    grouped into values with reduceat, zigzag-decoded into deltas and summed per polyline.
+    """
+    encoded = [s or '' for s in encoded]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    if not encoded:
+        return offsets, np.empty(0), np.empty(0)
+    
+    try:
+        chars = np.frombuffer(''.join(encoded).encode('ascii'), dtype=np.uint8).astype(np.int64) - 63
+    except UnicodeEncodeError:
+        raise ValueError("Encoded polylines must be ASCII")
+    if len(chars) and (chars.min() < 0 or chars.max() > 63):
+        raise ValueError("Encoded polylines contain characters outside the polyline alphabet")
+    
+    char_offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    np.cumsum([len(s) for s in encoded], out=char_offsets[1:])
+    is_last = (chars & 0x20) == 0
+    values_before = np.concatenate([[0], np.cumsum(is_last)])
+    value_counts = values_before[char_offsets[1:]] - values_before[char_offsets[:-1]]
+    # Every polyline must end on a complete value and hold whole (lat, lon) pairs
+    lengths = np.diff(char_offsets)
+    truncated = np.zeros(len(encoded), dtype=bool)
+    truncated[lengths > 0] = ~is_last[char_offsets[1:][lengths > 0] - 1]
+    malformed = np.flatnonzero(truncated | (value_counts % 2 == 1))
+    if len(malformed):
+        raise ValueError(f"Malformed encoded polyline at index {int(malformed[0])}")
+    np.cumsum(value_counts // 2, out=offsets[1:])
+    if not len(chars):
+        return offsets, np.empty(0), np.empty(0)
+    
+    value_starts = np.flatnonzero(np.concatenate([[True], is_last[:-1]]))
+    value_index = np.cumsum(np.concatenate([[False], is_last[:-1]]))
+    shift = 5 * (np.arange(len(chars)) - value_starts[value_index])
+    values = np.add.reduceat((chars & 0x1f) << shift, value_starts)
+    deltas = np.where(values & 1, ~(values >> 1), values >> 1)
+    
+    # Values alternate lat, lon within each polyline and every polyline holds whole pairs
+    lat, lon = _cumsum_per_track(deltas[0::2], offsets), _cumsum_per_track(deltas[1::2], offsets)
+    scale = 10.0 ** precision
+    return offsets, lat / scale, lon / scale
+
+
+def _cumsum_per_track(deltas: np.ndarray, offsets: np.ndarray) -> np.ndarray:
+    """Running sums of deltas restarting at each track's first point"""
+    totals = np.cumsum(deltas)
+    lengths = np.diff(offsets)
+    has_points = lengths > 0
+    before = np.zeros(len(lengths), dtype=np.int64)
+    before[has_points] = totals[offsets[:-1][has_points]] - deltas[offsets[:-1][has_points]]
+    return totals - np.repeat(before, lengths)
+
+
+def decode_polyline(encoded: str, precision: int = PRECISION) -> np.ndarray:
+    """(n, 2) array of [lat, lon] points of one encoded polyline"""
+    _, lat, lon = decode_polylines([encoded], precision)
+    return np.column_stack([lat, lon])
+
+
+def encode_polyline(lat: np.ndarray, lon: np.ndarray, precision: int = PRECISION) -> str:
+    """Encode a track as a Google encoded polyline (the inverse of decode_polyline)"""
+    scale = 10.0 ** precision
+    points = np.column_stack([np.round(np.asarray(lat, dtype=np.float64) * scale),
+                              np.round(np.asarray(lon, dtype=np.float64) * scale)]).astype(np.int64)
+    if not len(points):
+        return ''
+    deltas = np.diff(points, axis=0, prepend=0).ravel()
+    values = np.where(deltas < 0, ~(deltas << 1), deltas << 1)
+
+    # Split each value into 5-bit chunks, least significant first, flagging all but the last
+    n_chunks = np.ones(len(values), dtype=np.int64)
+    remaining = values >> 5
+    while remaining.any():
+        n_chunks += remaining > 0
+        remaining >>= 5
+    value_index = np.repeat(np.arange(len(values)), n_chunks)
+    chunk = np.arange(len(value_index)) - np.repeat(np.cumsum(n_chunks) - n_chunks, n_chunks)
+    chars = (values[value_index] >> (5 * chunk)) & 0x1F
+    chars |= np.where(chunk < n_chunks[value_index] - 1, 0x20, 0)
+    return (chars + 63).astype(np.uint8).tobytes().decode('ascii')
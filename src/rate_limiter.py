@@ -0,0 +1,212 @@
+"""
+Token-bucket rate limiter driven by Strava's X-RateLimit-Usage/Limit headers
+"""
+import asyncio
+import math
+import threading
+import time
+from email.utils import parsedate_to_datetime
+from typing import Callable, Dict, Mapping, Optional
+
+
+class _WindowBucket:
+    """Budget of one rate-limit window: free use until its reserve, then a paced token bucket
+    
+    While more than `reserve` requests remain, requests go out as fast as they are made.
+    The last `reserve` requests of the window are paced: up to `burst` back-to-back, then
+    tokens refill at the rate that spreads what is left evenly until the window resets.
+    """
+    
+    def __init__(self, name: str, limit: int, window_seconds: int, burst: int, reserve_fraction: float, now: float):
+        self.name = name
+        self.limit = limit
+        self.window_seconds = window_seconds
+        self.burst = burst
+        self.reserve_fraction = reserve_fraction
+        self.usage = 0
+        self.reset_at = self._next_boundary(now)
+        self.tokens = float(min(burst, limit))
+        self.last_refill = now
+    
+    def _next_boundary(self, now: float) -> float:
+        """Strava windows reset on natural UTC boundaries (quarter hours and midnight)"""
+        return (now // self.window_seconds + 1) * self.window_seconds
+    
+    @property
+    def remaining(self) -> int:
+        return max(0, self.limit - self.usage)
+    
+    @property
+    def reserve(self) -> int:
+        return math.ceil(self.limit * self.reserve_fraction)
+    
+    @property
+    def pacing(self) -> bool:
+        """Whether the window is down to its reserve and requests are paced"""
+        return self.remaining <= self.reserve
+    
+    def refill(self, now: float) -> None:
+        """Roll the window over if needed; tokens only refill gradually while pacing"""
+        if now >= self.reset_at:
+            self.usage = 0
+            self.reset_at = self._next_boundary(now)
+            self.tokens = float(self.burst)
+        elif self.pacing:
+            elapsed = max(0.0, now - self.last_refill)
+            self.tokens += elapsed * self.refill_rate(now)
+        else:
+            self.tokens = float(self.burst)
+        
+        self.tokens = min(self.tokens, float(min(self.burst, self.remaining)))
+        self.last_refill = now
+    
+    def refill_rate(self, now: float) -> float:
+        """Tokens per second needed to use the rest of the budget by the end of the window"""
+        return self.remaining / max(self.reset_at - now, 1.0)
+    
+    def wait_time(self, now: float) -> float:
+        """Seconds until a request may be sent (0 if one may be sent now)"""
+        if self.remaining <= 0:
+            return max(0.0, self.reset_at - now)
+        if not self.pacing or self.tokens >= 1:
+            return 0.0
+        return (1 - self.tokens) / max(self.refill_rate(now), 1e-9)
+    
+    def consume(self) -> None:
+        if self.pacing:
+            self.tokens = max(self.tokens - 1, 0.0)
+        self.usage += 1
+    
+    def sync(self, limit: int, usage: int, now: float) -> None:
+        """Adopt the server-side limit and usage, which are authoritative"""
+        if now >= self.reset_at:
+            self.refill(now)
+        self.limit = limit
+        self.usage = max(usage, 0)
+        self.tokens = min(self.tokens, float(min(self.burst, self.remaining)))
+
+
+class RateLimiter:
+    """Thread- and asyncio-safe limiter tracking Strava's 15-minute and daily request windows
+    
+    Requests are not held back while a window has plenty of budget left. Once a window is
+    down to its reserve (reserve_fraction of its limit) the rest is paced evenly until it
+    resets, so a bulk sync never runs the window dry early and stalls on 429s.
+    """
+    
+    SHORT_WINDOW_SECONDS = 15 * 60
+    DAILY_WINDOW_SECONDS = 24 * 60 * 60
+    
+    def __init__(self, short_limit: int = 600, daily_limit: int = 30000, burst: int = 50,
+                 reserve_fraction: float = 0.1, clock: Callable[[], float] = time.time):
+        self._lock = threading.Lock()
+        self._clock = clock
+        now = clock()
+        self._buckets = {
+            'short': _WindowBucket('short', short_limit, self.SHORT_WINDOW_SECONDS, burst, reserve_fraction, now),
+            'daily': _WindowBucket('daily', daily_limit, self.DAILY_WINDOW_SECONDS, burst, reserve_fraction, now)
+        }
+    
+    def _reserve(self) -> float:
+        """Consume a token from every window if possible, otherwise return how long to wait"""
+        with self._lock:
+            now = self._clock()
+            for bucket in self._buckets.values():
+                bucket.refill(now)
+            
+            wait = max(bucket.wait_time(now) for bucket in self._buckets.values())
+            if wait <= 0:
+                for bucket in self._buckets.values():
+                    bucket.consume()
+            return wait
+    
+    def acquire(self) -> float:
+        """Block until a request may be sent; returns the total time spent waiting"""
+        waited = 0.0
+        while True:
+            wait = self._reserve()
+            if wait <= 0:
+                return waited
+            time.sleep(wait)
+            waited += wait
+    
+    async def acquire_async(self) -> float:
+        """Coroutine version of acquire() that yields to the event loop while waiting"""
+        waited = 0.0
+        while True:
+            wait = self._reserve()
+            if wait <= 0:
+                return waited
+            await asyncio.sleep(wait)
+            waited += wait
+    
+    def update_from_headers(self, headers: Mapping[str, str]) -> None:
+        """Sync the buckets with X-RateLimit-Limit / X-RateLimit-Usage ("short,daily") headers"""
+        limits = _parse_header_pair(headers.get('X-RateLimit-Limit'))
+        usage = _parse_header_pair(headers.get('X-RateLimit-Usage'))
+        if not limits or not usage:
+            return
+        
+        with self._lock:
+            now = self._clock()
+            self._buckets['short'].sync(limits[0], usage[0], now)
+            self._buckets['daily'].sync(limits[1], usage[1], now)
+    
+    def penalize(self, retry_after: Optional[float] = None) -> float:
+        """Mark the short window exhausted after a 429; returns the seconds to wait before retrying
+        
+        Without retry_after (seconds, see parse_retry_after) the wait lasts until the window resets.
+        """
+        with self._lock:
+            now = self._clock()
+            bucket = self._buckets['short']
+            bucket.refill(now)
+            bucket.usage = bucket.limit
+            bucket.tokens = 0.0
+            if retry_after is not None:
+                bucket.reset_at = now + max(retry_after, 0.0)
+            return max(bucket.reset_at - now, 0.0)
+    
+    def remaining(self) -> Dict[str, Dict[str, float]]:
+        """Report the remaining budget of each window"""
+        with self._lock:
+            now = self._clock()
+            report = {}
+            for name, bucket in self._buckets.items():
+                bucket.refill(now)
+                report[name] = {
+                    'limit': bucket.limit,
+                    'usage': bucket.usage,
+                    'remaining': bucket.remaining,
+                    'resets_in_seconds': round(bucket.reset_at - now, 1)
+                }
+            return report
+
+
+def _parse_header_pair(value: Optional[str]) -> Optional[tuple]:
+    """Parse a "short,daily" rate limit header into two ints"""
+    if not value:
+        return None
+    try:
+        short, daily = (int(part.strip()) for part in value.split(',')[:2])
+    except ValueError:
+        return None
+    return short, daily
+
+
+def parse_retry_after(value: Optional[str], now: Optional[float] = None) -> Optional[float]:
+    """Seconds to wait from a Retry-After header (delay seconds or an HTTP-date), or None if unusable"""
+    if not value:
+        return None
+    value = value.strip()
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        pass
+    try:
+        retry_at = parsedate_to_datetime(value)
+    except (TypeError, ValueError, IndexError):
+        return None
+    if retry_at is None or retry_at.tzinfo is None:
+        return None
+    return max(retry_at.timestamp() - (time.time() if now is None else now), 0.0)
@@ -0,0 +1,197 @@
+"""
+Runs independent map rendering jobs in parallel on a process pool
+"""
+import multiprocessing
+import os
+import shutil
+import threading
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+from typing import Callable, Dict, List, Optional
+
+import pandas as pd
+
+from .config import Config
+from .instrumentation import metrics, span
+from .tracks import TrackCollection
+
+
+class RenderJob:
+    """One map to render: a method of the heatmap generator (or analytics) and its output file
+    
+    data selects the first argument passed to the method: 'tracks' for the shared
+    TrackCollection or 'dataframe' for the activities DataFrame.
+    """
+    
+    TARGETS = ('heatmap', 'analytics')
+    
+    def __init__(self, name: str, method: str, output_file: str, args: tuple = (), kwargs: Optional[Dict] = None,
+                 data: str = 'tracks', target: str = 'heatmap'):
+        if target not in self.TARGETS:
+            raise ValueError(f"Unknown render target {target!r}; expected one of {self.TARGETS}")
+        self.name = name
+        self.method = method
+        self.output_file = output_file
+        self.args = args
+        self.kwargs = kwargs or {}
+        self.data = data
+        self.target = target
+    
+    def with_output_dir(self, output_dir: str) -> 'RenderJob':
+        """Copy of the job that writes its output file into another directory"""
+        return RenderJob(self.name, self.method, os.path.join(output_dir, os.path.basename(self.output_file)),
+                         self.args, dict(self.kwargs), self.data, self.target)
+    
+    def __repr__(self) -> str:
+        return f"RenderJob({self.name!r}, {self.method!r}, {self.output_file!r})"
+
+
+# Per-process state of pool workers: renderers and the most recently opened shared collection
+_worker_targets: Dict[str, object] = {}
+_worker_collection: Dict[str, TrackCollection] = {}
+
+
+def _get_target(target: str):
+    if target not in _worker_targets:
+        if target == 'heatmap':
+            from .heatmap_generator import StravaHeatmapGenerator
+            _worker_targets[target] = StravaHeatmapGenerator()
+        else:
+            from .analytics import StravaAnalytics
+            _worker_targets[target] = StravaAnalytics()
+    return _worker_targets[target]
+
+
+def _open_shared_collection(data_dir: str) -> TrackCollection:
+    """Memory-map the shared collection once per worker process and run"""
+    if data_dir not in _worker_collection:
+        _worker_collection.clear()
+        _worker_collection[data_dir] = TrackCollection.load(data_dir)
+    return _worker_collection[data_dir]
+
+
+def _execute(job: RenderJob, tracks: Optional[TrackCollection], dataframe: Optional[pd.DataFrame],
+             target=None) -> Dict:
+    """Run one job and report its timing; errors are returned rather than raised"""
+    start = time.perf_counter()
+    try:
+        renderer = target if target is not None else _get_target(job.target)
+        data = tracks if job.data == 'tracks' else dataframe
+        with span('render_map', map=job.name):
+            getattr(renderer, job.method)(data, job.output_file, *job.args, **job.kwargs)
+        error = None
+    except Exception as e:
+        error = str(e)
+    return {'output_file': job.output_file, 'seconds': time.perf_counter() - start, 'error': error}
+
+
+def _run_in_worker(job: RenderJob, data_dir: Optional[str], dataframe: Optional[pd.DataFrame]) -> Dict:
+    tracks = _open_shared_collection(data_dir) if data_dir else None
+    result = _execute(job, tracks, dataframe)
+    # Ship the worker's metrics back to the parent process, which merges them
+    result['metrics'] = metrics.snapshot(reset=True)
+    return result
+
+
+class RenderScheduler:
+    """Renders independent maps concurrently on a process pool
+    
+    Folium/JSON serialization is CPU-bound, so maps are rendered in separate processes.
+    The track data is written once per run as .npy files that every worker memory-maps,
+    instead of being pickled into each job. The pool is kept alive between runs; if it
+    cannot be used, jobs run in the calling process one after another.
+    """
+    
+    def __init__(self, max_workers: int = Config.RENDER_WORKERS, work_dir: str = os.path.join('cache', 'render')):
+        self.max_workers = max(1, max_workers)
+        self.work_dir = work_dir
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._lock = threading.Lock()
+    
+    def _get_executor(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                # spawn: forking a multi-threaded process (e.g. the Flask server) is unsafe
+                self._executor = ProcessPoolExecutor(max_workers=self.max_workers,
+                                                     mp_context=multiprocessing.get_context('spawn'))
+            return self._executor
+    
+    def close(self) -> None:
+        """Shut down the worker processes"""
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+    
+    def run(self, jobs: List[RenderJob], tracks: Optional[TrackCollection] = None,
+            dataframe: Optional[pd.DataFrame] = None, local_targets: Optional[Dict[str, object]] = None,
+            on_complete: Optional[Callable[[str, Dict], None]] = None) -> Dict[str, Dict]:
+        """Render every job and return {job name: {'output_file', 'seconds', 'error'}}
+        
+        local_targets are the renderer instances used when jobs run in this process;
+        on_complete(name, result) is called as each job finishes.
+        """
+        if not jobs:
+            return {}
+        
+        start = time.perf_counter()
+        if self.max_workers == 1 or len(jobs) == 1:
+            results = self._run_locally(jobs, tracks, dataframe, local_targets, on_complete)
+        else:
+            results = self._run_in_pool(jobs, tracks, dataframe, local_targets, on_complete)
+        
+        elapsed = time.perf_counter() - start
+        slowest = max(results, key=lambda name: results[name]['seconds'])
+        print(f"Rendered {len(jobs)} maps in {elapsed:.1f}s "
+              f"(slowest: {slowest}, {results[slowest]['seconds']:.1f}s)")
+        for name, result in results.items():
+            if result['error']:
+                print(f"Error rendering {name} map: {result['error']}")
+        return results
+    
+    def _run_locally(self, jobs: List[RenderJob], tracks: Optional[TrackCollection],
+                     dataframe: Optional[pd.DataFrame], local_targets: Optional[Dict[str, object]],
+                     on_complete: Optional[Callable[[str, Dict], None]]) -> Dict[str, Dict]:
+        local_targets = local_targets or {}
+        results = {}
+        for job in jobs:
+            results[job.name] = _execute(job, tracks, dataframe, local_targets.get(job.target))
+            if on_complete:
+                on_complete(job.name, results[job.name])
+        return results
+    
+    def _run_in_pool(self, jobs: List[RenderJob], tracks: Optional[TrackCollection],
+                     dataframe: Optional[pd.DataFrame], local_targets: Optional[Dict[str, object]],
+                     on_complete: Optional[Callable[[str, Dict], None]]) -> Dict[str, Dict]:
+        data_dir = None
+        if tracks is not None and any(job.data == 'tracks' for job in jobs):
+            data_dir = os.path.join(self.work_dir, uuid.uuid4().hex)
+            # Summarized once here and saved with the arrays, not again in every worker
+            tracks.summary()
+            tracks.save(data_dir)
+        
+        results = {}
+        try:
+            executor = self._get_executor()
+            futures = {
+                executor.submit(_run_in_worker, job, data_dir, dataframe if job.data == 'dataframe' else None): job
+                for job in jobs
+            }
+            for future in as_completed(futures):
+                name = futures[future].name
+                results[name] = future.result()
+                metrics.merge(results[name].pop('metrics', None))
+                if on_complete:
+                    on_complete(name, results[name])
+        except (BrokenProcessPool, OSError) as e:
+            print(f"Warning: Render pool unavailable ({e}); rendering remaining maps sequentially")
+            with self._lock:
+                self._executor = None
+            remaining = [job for job in jobs if job.name not in results]
+            results.update(self._run_locally(remaining, tracks, dataframe, local_targets, on_complete))
+        finally:
+            if data_dir:
+                shutil.rmtree(data_dir, ignore_errors=True)
+        
+        return {job.name: results[job.name] for job in jobs}
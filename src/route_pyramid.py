@@ -0,0 +1,129 @@
+"""
+Multi-resolution (level-of-detail) route geometry for drawing many routes under a vertex budget
+"""
+from typing import Dict, Optional, Sequence, Tuple
+
+import numpy as np
+
+from .config import Config
+from .instrumentation import span
+from .simplify import douglas_peucker, project_tracks, tolerance_for_zoom, track_latitudes
+from .tracks import TrackCollection, valid_coordinate_mask
+
+# min_zoom of vertices that only appear at full resolution
+FULL_DETAIL = 255
+
+
+def point_min_zoom(offsets: np.ndarray, lat: np.ndarray, lon: np.ndarray,
+                   zooms: Sequence[int] = Config.ROUTE_LOD_ZOOMS) -> np.ndarray:
+    """Coarsest pyramid zoom at which each vertex is kept (FULL_DETAIL if only at full resolution)
+    
+    Each level is Douglas-Peucker at the tolerance of one pixel at that zoom (at the track's
+    own latitude). Douglas-Peucker always splits at the same farthest vertex and only stops
+    earlier for a larger tolerance, so the levels are nested and one uint8 per vertex describes
+    the whole pyramid. Invalid coordinates are skipped and get FULL_DETAIL.
+    """
+    offsets = np.asarray(offsets, dtype=np.int64)
+    lat = np.asarray(lat, dtype=np.float64)
+    lon = np.asarray(lon, dtype=np.float64)
+    min_zoom = np.full(len(lat), FULL_DETAIL, dtype=np.uint8)
+    if not len(lat):
+        return min_zoom
+    
+    valid = valid_coordinate_mask(lat, lon)
+    owners = np.repeat(np.arange(len(offsets) - 1), np.diff(offsets))
+    valid_offsets = np.zeros(len(offsets), dtype=np.int64)
+    np.cumsum(np.bincount(owners[valid], minlength=len(offsets) - 1), out=valid_offsets[1:])
+    tracks = TrackCollection(np.arange(len(offsets) - 1), valid_offsets, lat[valid], lon[valid])
+    
+    x, y = project_tracks(tracks)
+    latitudes = np.nan_to_num(track_latitudes(tracks))
+    level = np.full(tracks.point_count, FULL_DETAIL, dtype=np.uint8)
+    for zoom in sorted(zooms):
+        keep = douglas_peucker(x, y, tracks.offsets, tolerance_for_zoom(zoom, latitudes))
+        level[keep & (level == FULL_DETAIL)] = zoom
+    
+    min_zoom[valid] = level
+    return min_zoom
+
+
+class RoutePyramid:
+    """Level-of-detail view of a TrackCollection's routes
+    
+    Built from the collection's precomputed min_zoom (persisted by the TrackStore) when it
+    has one, otherwise computed once and cached on the collection. Per-level vertex counts
+    and per-track bounds are kept so a viewport's vertex cost is known before drawing it.
+    """
+    
+    def __init__(self, collection: TrackCollection, zooms: Sequence[int] = Config.ROUTE_LOD_ZOOMS):
+        self.collection = collection
+        self.zooms = tuple(sorted(zooms))
+        min_zoom = collection.min_zoom
+        if min_zoom is None:
+            min_zoom = point_min_zoom(collection.offsets, collection.lat, collection.lon, self.zooms)
+        self.min_zoom = np.asarray(min_zoom, dtype=np.uint8)
+        
+        # vertex_counts[level, track]: vertices of each track at each pyramid level
+        owners = collection.activity_index
+        self.vertex_counts = np.array([
+            np.bincount(owners[self.min_zoom <= zoom], minlength=len(collection)) for zoom in self.zooms
+        ], dtype=np.int64).reshape(len(self.zooms), len(collection))
+        
+        self.track_bounds = np.full((len(collection), 4), np.nan)
+        lengths = collection.lengths
+        has_points = lengths > 0
+        if has_points.any():
+            starts = collection.offsets[:-1][has_points]
+            self.track_bounds[has_points] = np.column_stack([
+                np.minimum.reduceat(collection.lat, starts), np.minimum.reduceat(collection.lon, starts),
+                np.maximum.reduceat(collection.lat, starts), np.maximum.reduceat(collection.lon, starts)
+            ])
+    
+    @classmethod
+    def of(cls, collection: TrackCollection) -> 'RoutePyramid':
+        """The collection's pyramid, built on first use and then reused"""
+        if collection._route_pyramid is None:
+            with span('precompute_geometry', step='route_pyramid'):
+                collection._route_pyramid = cls(collection)
+        return collection._route_pyramid
+    
+    def level_index(self, zoom: float) -> int:
+        """Finest pyramid level that is still no more detailed than the zoom needs"""
+        return max(int(np.searchsorted(self.zooms, zoom, side='right')) - 1, 0)
+    
+    def tracks_in(self, bounds: Optional[Dict[str, float]] = None) -> np.ndarray:
+        """Indices of the tracks intersecting bounds (min_lat, min_lon, max_lat, max_lon), or all tracks"""
+        if bounds is None:
+            return np.flatnonzero(self.collection.lengths > 0)
+        b = self.track_bounds
+        with np.errstate(invalid='ignore'):
+            hits = ((b[:, 0] <= bounds['max_lat']) & (b[:, 2] >= bounds['min_lat']) &
+                    (b[:, 1] <= bounds['max_lon']) & (b[:, 3] >= bounds['min_lon']))
+        return np.flatnonzero(hits)
+    
+    def select(self, zoom: float, bounds: Optional[Dict[str, float]] = None,
+               max_vertices: int = Config.ROUTE_VERTEX_BUDGET) -> Tuple[TrackCollection, int]:
+        """Routes in a viewport simplified for a zoom level, within a vertex budget
+        
+        Uses the level for the zoom, stepping to coarser levels while the visible routes
+        exceed max_vertices; if even the coarsest level is too large, routes are taken in
+        collection order until the budget is spent. Returns (routes, pyramid zoom used).
+        """
+        tracks = self.tracks_in(bounds)
+        level = self.level_index(zoom)
+        while level > 0 and self.vertex_counts[level, tracks].sum() > max_vertices:
+            level -= 1
+        
+        within_budget = np.cumsum(self.vertex_counts[level, tracks]) <= max_vertices
+        # Always show at least one route
+        tracks = tracks[:max(int(within_budget.sum()), 1)]
+        
+        zoom_used = self.zooms[level]
+        routes = self.collection.subset(tracks)
+        return routes.take_points(self.min_zoom[self._point_index(tracks)] <= zoom_used), zoom_used
+    
+    def _point_index(self, tracks: np.ndarray) -> np.ndarray:
+        """Collection point indices of the given tracks, in order"""
+        lengths = self.collection.lengths[tracks]
+        starts = self.collection.offsets[:-1][tracks]
+        return np.repeat(starts - (np.cumsum(lengths) - lengths), lengths) + np.arange(lengths.sum())
@@ -0,0 +1,174 @@
+"""
+Vectorized distance, speed and elevation statistics for activity tracks
+"""
+from typing import Dict
+
+import numpy as np
+
+from .tracks import ActivityTrack, TrackCollection
+
+# WGS-84 ellipsoid (the model geopy's geodesic uses)
+WGS84_A = 6378137.0
+WGS84_F = 1 / 298.257223563
+WGS84_B = WGS84_A * (1 - WGS84_F)
+
+# Mean Earth radius for the spherical (haversine) approximation
+EARTH_RADIUS_M = 6371008.8
+
+DISTANCE_METHODS = ('haversine', 'ellipsoidal')
+
+
+def haversine_distances(lat1, lon1, lat2, lon2) -> np.ndarray:
+    """Great-circle distance in meters between paired points on a sphere
+    
+    Within about 0.5% of the ellipsoidal distance and several times faster.
+    """
+    lat1, lon1, lat2, lon2 = (np.radians(np.asarray(v, dtype=np.float64)) for v in (lat1, lon1, lat2, lon2))
+    a = (np.sin((lat2 - lat1) / 2) ** 2 +
+         np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2)
+    return 2 * EARTH_RADIUS_M * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+
+def ellipsoidal_distances(lat1, lon1, lat2, lon2, tolerance: float = 1e-12,
+                          max_iterations: int = 200) -> np.ndarray:
+    """Distance in meters between paired points on the WGS-84 ellipsoid (Vincenty's inverse formula)
+    
+    Iterates on all pairs at once, only updating pairs that have not converged yet.
+    Nearly antipodal pairs, where the iteration may not converge, fall back to haversine.
+    """
+    lat1, lon1, lat2, lon2 = (np.asarray(v, dtype=np.float64) for v in (lat1, lon1, lat2, lon2))
+    f = WGS84_F
+    
+    L = np.radians(lon2 - lon1)
+    U1 = np.arctan((1 - f) * np.tan(np.radians(lat1)))
+    U2 = np.arctan((1 - f) * np.tan(np.radians(lat2)))
+    sin_U1, cos_U1 = np.sin(U1), np.cos(U1)
+    sin_U2, cos_U2 = np.sin(U2), np.cos(U2)
+    
+    lam = L.copy()
+    sin_sigma = np.zeros_like(L)
+    cos_sigma = np.ones_like(L)
+    sigma = np.zeros_like(L)
+    cos_sq_alpha = np.ones_like(L)
+    cos_2sigma_m = np.zeros_like(L)
+    active = np.ones(L.shape, dtype=bool)
+    
+    for _ in range(max_iterations):
+        if not active.any():
+            break
+        idx = np.flatnonzero(active)
+        sin_lam, cos_lam = np.sin(lam[idx]), np.cos(lam[idx])
+        
+        s_sigma = np.sqrt((cos_U2[idx] * sin_lam) ** 2 +
+                          (cos_U1[idx] * sin_U2[idx] - sin_U1[idx] * cos_U2[idx] * cos_lam) ** 2)
+        c_sigma = sin_U1[idx] * sin_U2[idx] + cos_U1[idx] * cos_U2[idx] * cos_lam
+        sig = np.arctan2(s_sigma, c_sigma)
+        
+        with np.errstate(invalid='ignore', divide='ignore'):
+            sin_alpha = np.where(s_sigma > 0, cos_U1[idx] * cos_U2[idx] * sin_lam / s_sigma, 0.0)
+            c_sq_alpha = 1 - sin_alpha ** 2
+            # Equatorial lines have cos^2(alpha) = 0
+            c_2sigma_m = np.where(c_sq_alpha > 0, c_sigma - 2 * sin_U1[idx] * sin_U2[idx] / c_sq_alpha, 0.0)
+        
+        C = f / 16 * c_sq_alpha * (4 + f * (4 - 3 * c_sq_alpha))
+        lam_prev = lam[idx]
+        lam_new = L[idx] + (1 - C) * f * sin_alpha * (
+            sig + C * s_sigma * (c_2sigma_m + C * c_sigma * (-1 + 2 * c_2sigma_m ** 2)))
+        
+        lam[idx] = lam_new
+        sin_sigma[idx], cos_sigma[idx], sigma[idx] = s_sigma, c_sigma, sig
+        cos_sq_alpha[idx], cos_2sigma_m[idx] = c_sq_alpha, c_2sigma_m
+        active[idx] = np.abs(lam_new - lam_prev) > tolerance
+    
+    u_sq = cos_sq_alpha * (WGS84_A ** 2 - WGS84_B ** 2) / WGS84_B ** 2
+    A = 1 + u_sq / 16384 * (4096 + u_sq * (-768 + u_sq * (320 - 175 * u_sq)))
+    B = u_sq / 1024 * (256 + u_sq * (-128 + u_sq * (74 - 47 * u_sq)))
+    delta_sigma = B * sin_sigma * (cos_2sigma_m + B / 4 * (
+        cos_sigma * (-1 + 2 * cos_2sigma_m ** 2) -
+        B / 6 * cos_2sigma_m * (-3 + 4 * sin_sigma ** 2) * (-3 + 4 * cos_2sigma_m ** 2)))
+    distances = WGS84_B * A * (sigma - delta_sigma)
+    
+    if active.any():
+        distances[active] = haversine_distances(lat1[active], lon1[active], lat2[active], lon2[active])
+    return distances
+
+
+def segment_distances(lat: np.ndarray, lon: np.ndarray, method: str = 'ellipsoidal') -> np.ndarray:
+    """Distance in meters between each pair of consecutive points (length N - 1)"""
+    if method not in DISTANCE_METHODS:
+        raise ValueError(f"Unknown distance method {method!r}; expected one of {DISTANCE_METHODS}")
+    if len(lat) < 2:
+        return np.zeros(0)
+    distance_fn = haversine_distances if method == 'haversine' else ellipsoidal_distances
+    return distance_fn(lat[:-1], lon[:-1], lat[1:], lon[1:])
+
+
+def route_statistics(track: ActivityTrack, method: str = 'ellipsoidal') -> Dict:
+    """Distance, speed and elevation statistics for one track"""
+    collection = TrackCollection([track.id], [0, len(track)], track.lat, track.lon,
+                                 altitude=track.altitude, velocity=track.velocity)
+    return {name: values[0].item() for name, values in collection_statistics(collection, method).items()}
+
+
+def collection_statistics(collection: TrackCollection, method: str = 'ellipsoidal') -> Dict[str, np.ndarray]:
+    """Per-track statistics for a whole collection, as arrays aligned with collection.ids
+    
+    Segments are computed over the concatenated point arrays in one pass; the ones that
+    would join the last point of a track to the first point of the next are dropped
+    before summing per track.
+    """
+    n_tracks = len(collection)
+    lengths = collection.lengths
+    stats = {
+        'total_points': lengths.copy(),
+        'distance_km': np.zeros(n_tracks),
+        'avg_speed_kmh': np.zeros(n_tracks),
+        'max_speed_kmh': np.zeros(n_tracks),
+        'elevation_gain_m': np.zeros(n_tracks),
+        'max_elevation_m': np.zeros(n_tracks)
+    }
+    if n_tracks == 0 or collection.point_count == 0:
+        return stats
+    
+    activity_index = collection.activity_index
+    
+    # Distance: sum of within-track segments
+    distances = segment_distances(collection.lat, collection.lon, method)
+    same_track = activity_index[1:] == activity_index[:-1]
+    stats['distance_km'] = np.bincount(activity_index[1:][same_track], weights=distances[same_track],
+                                       minlength=n_tracks) / 1000
+    
+    # Speed statistics over positive samples
+    velocity = collection.velocity.astype(np.float64)
+    with np.errstate(invalid='ignore'):
+        moving = velocity > 0
+    speeds_kmh = velocity[moving] * 3.6  # Convert m/s to km/h
+    owners = activity_index[moving]
+    counts = np.bincount(owners, minlength=n_tracks)
+    has_speed = counts > 0
+    stats['avg_speed_kmh'][has_speed] = (np.bincount(owners, weights=speeds_kmh, minlength=n_tracks)[has_speed] /
+                                         counts[has_speed])
+    np.maximum.at(stats['max_speed_kmh'], owners, speeds_kmh)
+    
+    # Elevation statistics over valid samples; gain skips over missing samples
+    altitude = collection.altitude.astype(np.float64)
+    valid = np.isfinite(altitude)
+    altitudes = altitude[valid]
+    owners = activity_index[valid]
+    has_altitude = np.bincount(owners, minlength=n_tracks) > 0
+    max_elevation = np.full(n_tracks, -np.inf)
+    np.maximum.at(max_elevation, owners, altitudes)
+    stats['max_elevation_m'][has_altitude] = max_elevation[has_altitude]
+    
+    climbs = np.diff(altitudes)
+    climbing = (climbs > 0) & (owners[1:] == owners[:-1])
+    stats['elevation_gain_m'] = np.bincount(owners[1:][climbing], weights=climbs[climbing], minlength=n_tracks)
+    
+    # Tracks with fewer than two points report zeros, as a single point has no route
+    short = lengths < 2
+    if short.any():
+        for name in ('distance_km', 'avg_speed_kmh', 'max_speed_kmh', 'elevation_gain_m', 'max_elevation_m'):
+            stats[name][short] = 0.0
+    
+    return stats
+
@@ -0,0 +1,204 @@
+"""
+Vectorized line simplification (Douglas-Peucker, Visvalingam-Whyatt) with zoom-based tolerances
+"""
+from typing import Optional, Tuple, Union
+
+import numpy as np
+
+from .config import Config
+from .instrumentation import timed
+from .tracks import TrackCollection
+
+EARTH_RADIUS_M = 6371008.8
+
+# Ground size of one 256 px Web Mercator tile pixel at zoom 0 on the equator
+METERS_PER_PIXEL_ZOOM_0 = 156543.03392
+
+METHODS = ('douglas-peucker', 'visvalingam')
+
+
+def meters_per_pixel(zoom: float, latitude: float = 0.0) -> float:
+    """Ground resolution of a Web Mercator map pixel at a zoom level and latitude"""
+    return METERS_PER_PIXEL_ZOOM_0 * np.cos(np.radians(latitude)) / 2 ** zoom
+
+
+def tolerance_for_zoom(zoom: float, latitude: float = 0.0, pixels: float = Config.SIMPLIFY_TOLERANCE_PIXELS) -> float:
+    """Simplification tolerance in meters that stays below `pixels` screen pixels at a zoom level"""
+    return pixels * meters_per_pixel(zoom, latitude)
+
+
+def track_latitudes(collection: TrackCollection) -> np.ndarray:
+    """Mean latitude (degrees) of each track; NaN for tracks without points"""
+    lengths = collection.lengths
+    sums = np.zeros(len(collection))
+    sums[lengths > 0] = np.add.reduceat(collection.lat, collection.offsets[:-1][lengths > 0])
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return sums / lengths
+
+
+def project_tracks(collection: TrackCollection) -> Tuple[np.ndarray, np.ndarray]:
+    """Local planar coordinates in meters: equirectangular around each track's mean latitude"""
+    cos_lat = np.repeat(np.cos(np.radians(track_latitudes(collection))), collection.lengths)
+    return (EARTH_RADIUS_M * np.radians(collection.lon) * cos_lat,
+            EARTH_RADIUS_M * np.radians(collection.lat))
+
+
+def _segment_distances(x: np.ndarray, y: np.ndarray, points: np.ndarray, starts: np.ndarray,
+                       ends: np.ndarray) -> np.ndarray:
+    """Distance from each point to the segment between its start and end points"""
+    sx, sy = x[starts], y[starts]
+    dx, dy = x[ends] - sx, y[ends] - sy
+    px, py = x[points] - sx, y[points] - sy
+    length_sq = dx * dx + dy * dy
+    with np.errstate(invalid='ignore', divide='ignore'):
+        t = np.where(length_sq > 0, np.clip((px * dx + py * dy) / length_sq, 0.0, 1.0), 0.0)
+    return np.hypot(px - t * dx, py - t * dy)
+
+
+def douglas_peucker(x: np.ndarray, y: np.ndarray, offsets: np.ndarray,
+                    tolerance: Union[float, np.ndarray]) -> np.ndarray:
+    """Boolean mask of the vertices kept by Douglas-Peucker, for every track at once
+    
+    tolerance is in the units of x/y, either one value or one per track. Instead of
+    recursing per segment, each pass splits every open segment of every track together:
+    the interior points of all segments are measured in one array operation and each
+    segment is split at its farthest point if that lies beyond the tolerance.
+    """
+    n_points = len(x)
+    keep = np.zeros(n_points, dtype=bool)
+    lengths = np.diff(offsets)
+    keep[offsets[:-1][lengths > 0]] = True
+    keep[offsets[1:][lengths > 0] - 1] = True
+    
+    starts = offsets[:-1][lengths > 2]
+    ends = offsets[1:][lengths > 2] - 1
+    while len(starts):
+        interior = ends - starts - 1
+        segment = np.repeat(np.arange(len(starts)), interior)
+        first = np.cumsum(interior) - interior
+        points = np.arange(len(segment)) - first[segment] + starts[segment] + 1
+        
+        distances = _segment_distances(x, y, points, starts[segment], ends[segment])
+        max_distance = np.maximum.reduceat(distances, first)
+        # First point of each segment that reaches its maximum distance
+        at_max = np.flatnonzero(distances == max_distance[segment])
+        _, first_at_max = np.unique(segment[at_max], return_index=True)
+        farthest = points[at_max[first_at_max]]
+        
+        if np.ndim(tolerance):
+            split = max_distance > tolerance[np.searchsorted(offsets, starts, side='right') - 1]
+        else:
+            split = max_distance > tolerance
+        farthest = farthest[split]
+        keep[farthest] = True
+        
+        starts = np.concatenate([starts[split], farthest])
+        ends = np.concatenate([farthest, ends[split]])
+        open_segments = ends - starts > 1
+        starts, ends = starts[open_segments], ends[open_segments]
+    
+    return keep
+
+
+def _triangle_areas(x: np.ndarray, y: np.ndarray, previous: np.ndarray, points: np.ndarray,
+                    following: np.ndarray) -> np.ndarray:
+    return 0.5 * np.abs((x[previous] - x[points]) * (y[following] - y[points])
+                        - (x[following] - x[points]) * (y[previous] - y[points]))
+
+
+def visvalingam(x: np.ndarray, y: np.ndarray, offsets: np.ndarray, tolerance: float) -> np.ndarray:
+    """Boolean mask of the vertices kept by Visvalingam-Whyatt, for every track at once
+    
+    A vertex is dropped while the triangle it forms with its remaining neighbours is smaller
+    than tolerance ** 2 / 2 (the area of a spike of height tolerance over a base of tolerance).
+    Rather than removing one vertex at a time from a priority queue, each pass removes every
+    other vertex of each run of qualifying neighbours in one array operation and then
+    recomputes the areas of the vertices left, so long straight runs vanish in a few passes.
+    """
+    min_area = tolerance * tolerance / 2.0
+    n_points = len(x)
+    keep = np.ones(n_points, dtype=bool)
+    lengths = np.diff(offsets)
+    is_end = np.zeros(n_points, dtype=bool)
+    is_end[offsets[:-1][lengths > 0]] = True
+    is_end[offsets[1:][lengths > 0] - 1] = True
+    
+    while True:
+        remaining = np.flatnonzero(keep)
+        # Track ends are always kept, so an interior vertex's neighbours belong to its own track
+        position = np.flatnonzero(~is_end[remaining])
+        if not len(position):
+            break
+        areas = _triangle_areas(x, y, remaining[position - 1], remaining[position], remaining[position + 1])
+        
+        candidate = np.zeros(len(remaining), dtype=bool)
+        candidate[position] = areas < min_area
+        if not candidate.any():
+            break
+        # Remove the 1st, 3rd, ... vertex of each run, so no two neighbours go in the same pass
+        run_start = candidate & ~np.concatenate([[False], candidate[:-1]])
+        start_index = np.maximum.accumulate(np.where(run_start, np.arange(len(remaining)), 0))
+        remove = candidate & ((np.arange(len(remaining)) - start_index) % 2 == 0)
+        keep[remaining[remove]] = False
+    
+    return keep
+
+
+def simplify_mask(collection: TrackCollection, tolerance: float, method: Optional[str] = None) -> np.ndarray:
+    """Boolean mask over the collection's points of the vertices to keep; tolerance is in meters"""
+    method = method or Config.SIMPLIFY_METHOD
+    if method not in METHODS:
+        raise ValueError(f"Unknown simplification method {method!r}; expected one of {METHODS}")
+    if not collection.point_count:
+        return np.zeros(0, dtype=bool)
+    
+    x, y = project_tracks(collection)
+    if method == 'douglas-peucker':
+        return douglas_peucker(x, y, collection.offsets, tolerance)
+    return visvalingam(x, y, collection.offsets, tolerance)
+
+
+@timed('precompute_geometry', step='simplify')
+def simplify_collection(collection: TrackCollection, tolerance: float, method: Optional[str] = None) -> TrackCollection:
+    """The collection with every track simplified to within tolerance meters of its original shape"""
+    return collection.take_points(simplify_mask(collection, tolerance, method))
+
+
+@timed('precompute_geometry', step='resample')
+def resample_collection(collection: TrackCollection, spacing: float) -> TrackCollection:
+    """Points spaced evenly every `spacing` meters along each track, ending on its last point
+    
+    Used for point heatmaps, where line vertices alone would leave straight roads empty.
+    Only latitude and longitude are interpolated.
+    """
+    if not collection.point_count:
+        return TrackCollection.empty()
+    
+    x, y = project_tracks(collection)
+    owner = collection.activity_index
+    steps = np.hypot(np.diff(x), np.diff(y))
+    steps[owner[1:] != owner[:-1]] = 0.0
+    along = np.concatenate([[0.0], np.cumsum(steps)])
+    
+    lengths = collection.lengths
+    has_points = lengths > 0
+    track_start = along[collection.offsets[:-1][has_points]]
+    track_length = along[collection.offsets[1:][has_points] - 1] - track_start
+    
+    # Targets every `spacing` meters along each track, ending exactly on its last point
+    counts = np.ceil(track_length / spacing).astype(np.int64) + 1
+    track = np.repeat(np.arange(len(counts)), counts)
+    step = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+    targets = track_start[track] + np.minimum(step * spacing, track_length[track])
+    
+    # Interpolate within each track's own points: shift tracks apart so ranges never overlap
+    gap = along[-1] + spacing + 1.0
+    shift = np.repeat(np.arange(len(counts)) * gap, lengths[has_points])
+    lat = np.interp(targets + track * gap, along + shift, collection.lat)
+    lon = np.interp(targets + track * gap, along + shift, collection.lon)
+    
+    new_lengths = np.zeros(len(collection), dtype=np.int64)
+    new_lengths[has_points] = counts
+    offsets = np.zeros(len(collection) + 1, dtype=np.int64)
+    np.cumsum(new_lengths, out=offsets[1:])
+    return TrackCollection(collection.ids, offsets, lat, lon, start_times=collection.start_times)
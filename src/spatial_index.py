@@ -0,0 +1,330 @@
+"""
+Uniform-grid spatial index over GPS points for bounding-box, radius and corridor queries
+"""
+import hashlib
+import json
+import os
+import shutil
+import threading
+from typing import Dict, Optional, Sequence, Tuple
+
+import numpy as np
+
+from .config import Config
+from .instrumentation import timed
+from .tracks import TrackCollection, valid_coordinate_mask
+
+METERS_PER_DEGREE = 111195.0  # mean great-circle meters per degree of latitude
+
+
+def _grid_shape(cell_size: float) -> Tuple[int, int]:
+    """(rows, columns) of a world grid with square cells of cell_size degrees"""
+    return int(np.ceil(180.0 / cell_size)), int(np.ceil(360.0 / cell_size))
+
+
+def _cell_rows(lat: np.ndarray, cell_size: float) -> np.ndarray:
+    n_rows, _ = _grid_shape(cell_size)
+    return np.clip(((np.asarray(lat) + 90.0) // cell_size).astype(np.int64), 0, n_rows - 1)
+
+
+def _cell_cols(lon: np.ndarray, cell_size: float) -> np.ndarray:
+    _, n_cols = _grid_shape(cell_size)
+    return np.clip(((np.asarray(lon) + 180.0) // cell_size).astype(np.int64), 0, n_cols - 1)
+
+
+def _ranges_index(starts: np.ndarray, ends: np.ndarray) -> np.ndarray:
+    """Concatenated indices of the half-open ranges [starts, ends)"""
+    lengths = np.maximum(ends - starts, 0)
+    total = int(lengths.sum())
+    if not total:
+        return np.empty(0, dtype=np.int64)
+    return np.repeat(starts - (np.cumsum(lengths) - lengths), lengths) + np.arange(total)
+
+
+class SpatialIndex:
+    """Every GPS point bucketed into a uniform lat/lon grid, sorted by cell
+    
+    Two tables share the cell ordering: each point with its activity, and the distinct
+    (cell, activity) pairs. A query walks the covered cells as a few contiguous key ranges
+    (one per grid row): cells entirely inside the query region contribute their activities
+    straight from the pair table, and only the points of cells on the region's edge are
+    tested exactly, so the cost follows the region's perimeter rather than its area.
+    """
+    
+    ARRAYS = ('ids', 'point_keys', 'point_lat', 'point_lon', 'point_activity', 'pair_keys', 'pair_activity')
+    
+    def __init__(self, cell_size: float, ids: np.ndarray, point_keys: np.ndarray, point_lat: np.ndarray,
+                 point_lon: np.ndarray, point_activity: np.ndarray, pair_keys: np.ndarray, pair_activity: np.ndarray):
+        self.cell_size = float(cell_size)
+        self.n_rows, self.n_cols = _grid_shape(self.cell_size)
+        self.ids = ids
+        self.point_keys = point_keys
+        self.point_lat = point_lat
+        self.point_lon = point_lon
+        self.point_activity = point_activity
+        self.pair_keys = pair_keys
+        self.pair_activity = pair_activity
+    
+    @classmethod
+    @timed('precompute_geometry', step='spatial_index')
+    def build(cls, ids: np.ndarray, offsets: np.ndarray, lat: np.ndarray, lon: np.ndarray,
+              cell_size: float = Config.SPATIAL_INDEX_CELL_DEGREES) -> 'SpatialIndex':
+        """Index tracks given as concatenated point arrays plus offsets; invalid points are skipped"""
+        lat = np.asarray(lat, dtype=np.float64)
+        lon = np.asarray(lon, dtype=np.float64)
+        activity = np.repeat(np.arange(len(ids), dtype=np.int32), np.diff(offsets))
+        valid = valid_coordinate_mask(lat, lon)
+        lat, lon, activity = lat[valid], lon[valid], activity[valid]
+        
+        _, n_cols = _grid_shape(cell_size)
+        keys = _cell_rows(lat, cell_size) * n_cols + _cell_cols(lon, cell_size)
+        order = np.argsort(keys, kind='stable')
+        keys, activity = keys[order], activity[order]
+        
+        # Distinct (cell, activity) pairs, still sorted by cell
+        n_activities = max(len(ids), 1)
+        pair_keys, pair_activity = np.divmod(np.unique(keys * n_activities + activity), n_activities)
+        return cls(cell_size, np.asarray(ids), keys, lat[order], lon[order], activity,
+                   pair_keys, pair_activity.astype(np.int32))
+    
+    @classmethod
+    def from_collection(cls, collection: TrackCollection,
+                        cell_size: float = Config.SPATIAL_INDEX_CELL_DEGREES) -> 'SpatialIndex':
+        return cls.build(collection.ids, collection.offsets, collection.lat, collection.lon, cell_size)
+    
+    def save(self, directory: str) -> None:
+        """Write the index atomically as .npy files"""
+        tmp_dir = f"{directory.rstrip(os.sep)}.tmp_{os.getpid()}_{threading.get_ident()}"
+        os.makedirs(tmp_dir, exist_ok=True)
+        for name in self.ARRAYS:
+            np.save(os.path.join(tmp_dir, f"{name}.npy"), getattr(self, name), allow_pickle=self.ids.dtype == object)
+        with open(os.path.join(tmp_dir, 'meta.json'), 'w') as f:
+            json.dump({'cell_size': self.cell_size}, f)
+        shutil.rmtree(directory, ignore_errors=True)
+        os.rename(tmp_dir, directory)
+    
+    @classmethod
+    def load(cls, directory: str) -> 'SpatialIndex':
+        """Open a saved index; the point tables are memory-mapped"""
+        with open(os.path.join(directory, 'meta.json')) as f:
+            meta = json.load(f)
+        arrays = {}
+        for name in cls.ARRAYS:
+            path = os.path.join(directory, f"{name}.npy")
+            try:
+                arrays[name] = np.load(path, mmap_mode='r')
+            except ValueError:
+                # Object ids and empty arrays cannot be memory-mapped
+                arrays[name] = np.load(path, allow_pickle=True)
+        return cls(meta['cell_size'], **arrays)
+    
+    def _row_of(self, lat: float) -> int:
+        return int(_cell_rows(lat, self.cell_size))
+    
+    def _col_of(self, lon: float) -> int:
+        return int(_cell_cols(lon, self.cell_size))
+    
+    def _collect(self, rows: np.ndarray, outer: Tuple[np.ndarray, np.ndarray], inner: Tuple[np.ndarray, np.ndarray],
+                 contains) -> np.ndarray:
+        """Activity ids for per-row column ranges (inclusive) of covered cells
+        
+        Cells in a row's inner range lie entirely inside the region; the other covered
+        cells are on its edge and contains(lat, lon) decides for each of their points.
+        """
+        outer_lo, outer_hi = outer
+        inner_lo, inner_hi = inner
+        base = rows * self.n_cols
+        has_inner = inner_lo <= inner_hi
+        
+        # Edge cells: the outer range minus the inner range, as up to two ranges per row
+        edge_lo = np.concatenate([outer_lo, inner_hi + 1])
+        edge_hi = np.concatenate([np.where(has_inner, inner_lo - 1, outer_hi), np.where(has_inner, outer_hi, -1)])
+        edge_base = np.concatenate([base, base])
+        edge = edge_lo <= edge_hi
+        point_idx = _ranges_index(np.searchsorted(self.point_keys, edge_base[edge] + edge_lo[edge], 'left'),
+                                  np.searchsorted(self.point_keys, edge_base[edge] + edge_hi[edge], 'right'))
+        inside = contains(np.asarray(self.point_lat[point_idx]), np.asarray(self.point_lon[point_idx]))
+        activities = [np.asarray(self.point_activity[point_idx[inside]])]
+        
+        if has_inner.any():
+            pair_idx = _ranges_index(
+                np.searchsorted(self.pair_keys, base[has_inner] + inner_lo[has_inner], 'left'),
+                np.searchsorted(self.pair_keys, base[has_inner] + inner_hi[has_inner], 'right'))
+            activities.append(np.asarray(self.pair_activity[pair_idx]))
+        
+        return self.ids[np.unique(np.concatenate(activities))]
+    
+    def query_bbox(self, min_lat: float, min_lon: float, max_lat: float, max_lon: float) -> np.ndarray:
+        """Ids of the activities with at least one point inside the bounding box"""
+        if not len(self.point_keys) or min_lat > max_lat or min_lon > max_lon:
+            return self.ids[:0]
+        r0, r1 = self._row_of(min_lat), self._row_of(max_lat)
+        c0, c1 = self._col_of(min_lon), self._col_of(max_lon)
+        rows = np.arange(r0, r1 + 1)
+        outer = (np.full(len(rows), c0), np.full(len(rows), c1))
+        # Cells not on the box's first/last row or column are entirely inside it
+        interior_row = (rows > r0) & (rows < r1)
+        inner = (np.where(interior_row, c0 + 1, 1), np.where(interior_row, c1 - 1, 0))
+        
+        def contains(lat, lon):
+            return (lat >= min_lat) & (lat <= max_lat) & (lon >= min_lon) & (lon <= max_lon)
+        
+        return self._collect(rows, outer, inner, contains)
+    
+    def points_in_bbox(self, min_lat: float, min_lon: float, max_lat: float, max_lon: float) -> np.ndarray:
+        """Indices into the point table (point_lat, point_lon, point_activity) of the points in the box"""
+        if not len(self.point_keys) or min_lat > max_lat or min_lon > max_lon:
+            return np.empty(0, dtype=np.int64)
+        base = np.arange(self._row_of(min_lat), self._row_of(max_lat) + 1) * self.n_cols
+        point_idx = _ranges_index(np.searchsorted(self.point_keys, base + self._col_of(min_lon), 'left'),
+                                  np.searchsorted(self.point_keys, base + self._col_of(max_lon), 'right'))
+        lat = np.asarray(self.point_lat[point_idx])
+        lon = np.asarray(self.point_lon[point_idx])
+        return point_idx[(lat >= min_lat) & (lat <= max_lat) & (lon >= min_lon) & (lon <= max_lon)]
+    
+    def query_radius(self, lat: float, lon: float, radius_m: float) -> np.ndarray:
+        """Ids of the activities passing within radius_m meters of a point
+        
+        Distances use an equirectangular projection around the center, accurate to well
+        under a percent over the distances of a ride.
+        """
+        if not len(self.point_keys):
+            return self.ids[:0]
+        radius = radius_m / METERS_PER_DEGREE  # in degrees of latitude
+        cos_lat = max(np.cos(np.radians(lat)), 1e-6)
+        
+        r0, r1 = self._row_of(lat - radius), self._row_of(lat + radius)
+        rows = np.arange(r0, r1 + 1)
+        row_south = rows * self.cell_size - 90.0
+        row_north = row_south + self.cell_size
+        # Latitude offsets of each row band's nearest and farthest edge from the center
+        near = np.where((row_south <= lat) & (lat <= row_north), 0.0,
+                        np.minimum(np.abs(row_south - lat), np.abs(row_north - lat)))
+        far = np.maximum(np.abs(row_south - lat), np.abs(row_north - lat))
+        
+        # Half-width in longitude of the circle's chord at those offsets
+        outer_half = np.sqrt(np.maximum(radius ** 2 - near ** 2, 0.0)) / cos_lat
+        inner_half = np.sqrt(np.maximum(radius ** 2 - far ** 2, 0.0)) / cos_lat
+        outer = (_cell_cols(lon - outer_half, self.cell_size), _cell_cols(lon + outer_half, self.cell_size))
+        # Only cells whose whole column span falls within the inner chord are entirely inside
+        inner_has = far < radius
+        inner = (np.where(inner_has, _cell_cols(lon - inner_half, self.cell_size) + 1, 1),
+                 np.where(inner_has, _cell_cols(lon + inner_half, self.cell_size) - 1, 0))
+        
+        def contains(point_lat, point_lon):
+            dy = point_lat - lat
+            dx = (point_lon - lon) * cos_lat
+            return dx * dx + dy * dy <= radius * radius
+        
+        return self._collect(rows, outer, inner, contains)
+    
+    def query_corridor(self, polyline: Sequence[Sequence[float]], width_m: float) -> np.ndarray:
+        """Ids of the activities passing within width_m meters of a polyline of [lat, lon] vertices"""
+        line = np.asarray(polyline, dtype=np.float64).reshape(-1, 2)
+        if not len(self.point_keys) or not len(line):
+            return self.ids[:0]
+        width = width_m / METERS_PER_DEGREE
+        cos_lat = max(np.cos(np.radians(line[:, 0].mean())), 1e-6)
+        
+        # Cells around samples taken along the line at half-cell spacing
+        if len(line) > 1:
+            steps = np.maximum(np.ceil(np.abs(np.diff(line, axis=0)).max(axis=1) / (self.cell_size / 2)), 1).astype(int)
+            samples = np.concatenate([
+                start + np.linspace(0.0, 1.0, n + 1)[:, None] * (end - start)
+                for start, end, n in zip(line[:-1], line[1:], steps)
+            ])
+        else:
+            samples = line
+        reach_rows = int(np.ceil(width / self.cell_size)) + 1
+        reach_cols = int(np.ceil(width / cos_lat / self.cell_size)) + 1
+        sample_rows = _cell_rows(samples[:, 0], self.cell_size)
+        sample_cols = _cell_cols(samples[:, 1], self.cell_size)
+        rows = np.clip(sample_rows[:, None, None] + np.arange(-reach_rows, reach_rows + 1)[None, :, None],
+                       0, self.n_rows - 1)
+        cols = np.clip(sample_cols[:, None, None] + np.arange(-reach_cols, reach_cols + 1)[None, None, :],
+                       0, self.n_cols - 1)
+        rows, cols = np.divmod(np.unique(rows * self.n_cols + cols), self.n_cols)
+        
+        # Planar coordinates (degrees of latitude) around the line
+        ax, ay = line[:-1, 1] * cos_lat, line[:-1, 0]
+        bx, by = line[1:, 1] * cos_lat, line[1:, 0]
+        
+        def contains(point_lat, point_lon):
+            px, py = point_lon * cos_lat, point_lat
+            best = np.hypot(px - line[0, 1] * cos_lat, py - line[0, 0])
+            for x0, y0, x1, y1 in zip(ax, ay, bx, by):
+                dx, dy = x1 - x0, y1 - y0
+                length_sq = dx * dx + dy * dy
+                t = np.clip(((px - x0) * dx + (py - y0) * dy) / length_sq, 0.0, 1.0) if length_sq else 0.0
+                best = np.minimum(best, np.hypot(px - x0 - t * dx, py - y0 - t * dy))
+            return best <= width
+        
+        # Each candidate cell is its own one-cell range; none is assumed to be fully inside
+        return self._collect(rows, (cols, cols), (np.ones_like(cols), np.zeros_like(cols)), contains)
+    
+    def query(self, region: Dict) -> np.ndarray:
+        """Activity ids for a region given as {'bbox': [min_lat, min_lon, max_lat, max_lon]},
+        {'center': [lat, lon], 'radius_m': r} or {'polyline': [[lat, lon], ...], 'width_m': w}
+        """
+        if 'bbox' in region:
+            min_lat, min_lon, max_lat, max_lon = (float(v) for v in region['bbox'])
+            return self.query_bbox(min_lat, min_lon, max_lat, max_lon)
+        if 'center' in region:
+            lat, lon = (float(v) for v in region['center'])
+            return self.query_radius(lat, lon, float(region['radius_m']))
+        if 'polyline' in region:
+            return self.query_corridor(region['polyline'], float(region.get('width_m', Config.SPATIAL_CORRIDOR_WIDTH_M)))
+        raise ValueError("Region needs 'bbox', 'center' and 'radius_m', or 'polyline'")
+
+
+def filter_collection(collection: TrackCollection, region: Dict) -> TrackCollection:
+    """The tracks of the collection that pass through a region (see SpatialIndex.query)"""
+    ids = SpatialIndex.from_collection(collection).query(region)
+    return collection.subset(np.flatnonzero(np.isin(collection.ids, ids)))
+
+
+class StoreSpatialIndex:
+    """Spatial index over every track in a TrackStore, persisted under cache_dir
+    
+    The index is saved in a directory named after the store's version, so it is rebuilt
+    (and older copies removed) only when new activities have been stored.
+    """
+    
+    def __init__(self, track_store, cache_dir: str = os.path.join('cache', 'spatial_index'),
+                 cell_size: float = Config.SPATIAL_INDEX_CELL_DEGREES):
+        self.track_store = track_store
+        self.cache_dir = cache_dir
+        self.cell_size = cell_size
+        self._lock = threading.Lock()
+        self._version: Optional[str] = None
+        self._index: Optional[SpatialIndex] = None
+    
+    def get(self) -> SpatialIndex:
+        """The index for the store's current contents"""
+        self.track_store.refresh()
+        version = hashlib.sha1(f"{self.track_store.version()}|{self.cell_size}".encode()).hexdigest()[:12]
+        with self._lock:
+            if version != self._version:
+                self._index = self._load_or_build(version)
+                self._version = version
+            return self._index
+    
+    def _load_or_build(self, version: str) -> SpatialIndex:
+        index_dir = os.path.join(self.cache_dir, version)
+        if os.path.isdir(index_dir):
+            try:
+                return SpatialIndex.load(index_dir)
+            except Exception as e:
+                print(f"Warning: Error reading spatial index {index_dir}: {e}")
+        
+        ids, offsets, columns = self.track_store.load_columns()
+        index = SpatialIndex.build(ids, offsets, columns['lat'], columns['lon'], self.cell_size)
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            for name in os.listdir(self.cache_dir):
+                if name != version:
+                    shutil.rmtree(os.path.join(self.cache_dir, name), ignore_errors=True)
+            index.save(index_dir)
+        except OSError as e:
+            print(f"Warning: Error writing spatial index {index_dir}: {e}")
+        return index
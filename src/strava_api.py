@@ -2,25 +2,40 @@
 Strava API client for fetching activity data
 """
 import os
-import sys
 import requests
+import numpy as np
 import pandas as pd
-from datetime import datetime, timedelta
-from typing import List, Dict, Optional
+from datetime import datetime, timedelta, timezone
+from typing import Callable, List, Dict, Optional, Iterator, Tuple, Union
 import json
+import re
+import threading
 import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
 
-# Add the parent directory to the path to import cache_manager
-sys.path.append(os.path.dirname(os.path.abspath(__file__)))
-from cache_manager import CacheManager
+from .activity_store import ActivityStore, clear_activity_stores
+from .cache_manager import CacheManager
+from .config import Config
+from .http_session import PooledSession
+from .polyline_codec import decode_polylines
+from .rate_limiter import RateLimiter, parse_retry_after
+from .track_store import TrackStore
+from .tracks import ActivityTrack, TrackCollection, MIN_TRACK_POINTS
+
+from .instrumentation import increment, span, timed
 
 
 class StravaAPI:
-    def __init__(self, client_id: str, client_secret: str, access_token: str, enable_cache: bool = True):
+    DEFAULT_STREAM_TYPES = ["latlng", "altitude", "velocity_smooth", "distance", "time"]
+    
+    def __init__(self, client_id: str, client_secret: str, access_token: str, enable_cache: bool = True,
+                 max_workers: int = Config.MAX_CONCURRENT_REQUESTS, pool_size: Optional[int] = None,
+                 incremental_sync: bool = True, base_url: Optional[str] = None):
         self.client_id = client_id
         self.client_secret = client_secret
         self.access_token = access_token
-        self.base_url = "https://www.strava.com/api/v3"
+        # STRAVA_API_BASE_URL points the client at another server, e.g. the local mock (src/mock_strava.py)
+        self.base_url = (base_url or os.getenv('STRAVA_API_BASE_URL') or Config.STRAVA_BASE_URL).rstrip('/')
         self.headers = {
             "Authorization": f"Bearer {access_token}",
             "Content-Type": "application/json"
@@ -29,30 +44,54 @@ class StravaAPI:
         # Initialize cache manager if enabled
         self.cache_manager = CacheManager() if enable_cache else None
         
-        # Rate limiting - Strava allows 100 requests per 15 minutes, 1000 per day
+        # Streams of finished activities never change; they are kept in a columnar store
+        self.track_store = (TrackStore(os.path.join(self.cache_manager.cache_dir, 'tracks'))
+                            if self.cache_manager else None)
+        
+        # Incremental sync keeps a persistent activity store next to the cache
+        self.incremental_sync = incremental_sync and self.cache_manager is not None
+        self._athlete_id = None
+        
+        # Rate limiting - budgets are synced from Strava's X-RateLimit-* response headers
         self.request_count = 0
-        self.last_request_time = 0
-        self.rate_limit_delay = 0.6  # Minimum delay between requests
+        self._request_count_lock = threading.Lock()
+        self.rate_limiter = RateLimiter(
+            short_limit=Config.STRAVA_RATE_LIMIT,
+            daily_limit=Config.STRAVA_DAILY_RATE_LIMIT,
+            burst=Config.RATE_LIMIT_BURST,
+            reserve_fraction=Config.RATE_LIMIT_RESERVE
+        )
+        
+        # Number of stream requests kept in flight by get_activities_with_detailed_streams
+        self.max_workers = max(1, max_workers)
+        
+        # Keep-alive connection pool, sized to the concurrency level by default
+        self.session = PooledSession(pool_size=pool_size or self.max_workers)
     
     def _make_request(self, url: str, params: Optional[Dict] = None, retries: int = 3) -> requests.Response:
         """Make a rate-limited request to Strava API with retry logic"""
         for attempt in range(retries):
             try:
-                # Rate limiting
-                current_time = time.time()
-                time_since_last = current_time - self.last_request_time
-                if time_since_last < self.rate_limit_delay:
-                    time.sleep(self.rate_limit_delay - time_since_last)
+                # Rate limiting (shared by every worker thread)
+                with span('rate_limit_wait'):
+                    self.rate_limiter.acquire()
                 
-                response = requests.get(url, headers=self.headers, params=params, timeout=30)
-                self.last_request_time = time.time()
-                self.request_count += 1
+                endpoint = self._endpoint(url)
+                with span('strava_request', endpoint=endpoint):
+                    response = self.session.get(url, headers=self.headers, params=params, timeout=30)
+                increment('strava_responses', endpoint=endpoint, status=response.status_code)
+                with self._request_count_lock:
+                    self.request_count += 1
+                self.rate_limiter.update_from_headers(response.headers)
                 
                 # Handle rate limiting
                 if response.status_code == 429:
-                    retry_after = int(response.headers.get('Retry-After', 900))  # Default 15 minutes
-                    print(f"Rate limited. Waiting {retry_after} seconds...")
-                    time.sleep(retry_after)
+                    retry_after = response.headers.get('Retry-After')
+                    # Without a usable Retry-After, wait for the current 15-minute window to reset
+                    wait = self.rate_limiter.penalize(parse_retry_after(retry_after))
+                    print(f"Rate limited. Waiting {wait:.0f} seconds...")
+                    with span('rate_limit_wait'):
+                        time.sleep(wait)
                     continue
                 
                 # Check for other errors
@@ -72,13 +111,50 @@ class StravaAPI:
         
         raise Exception(f"Failed to make request after {retries} attempts")
     
+    def _endpoint(self, url: str) -> str:
+        """API path of a URL with ids replaced, to label request metrics"""
+        path = url[len(self.base_url):] if url.startswith(self.base_url) else url
+        return re.sub(r'/\d+', '/{id}', path)
+    
+    def get_rate_limit_status(self) -> Dict:
+        """Get the remaining request budget for the 15-minute and daily windows"""
+        return self.rate_limiter.remaining()
+    
+    def get_connection_timings(self) -> Dict:
+        """Get time spent on connection setup versus transfer for all requests so far"""
+        return self.session.timings.summary()
+    
+    def close(self) -> None:
+        """Persist buffered tracks and close pooled HTTP connections"""
+        if self.track_store:
+            self.track_store.flush()
+        self.session.close()
+    
     def get_athlete_info(self) -> Dict:
         """Get authenticated athlete information"""
         url = f"{self.base_url}/athlete"
         response = self._make_request(url)
         return response.json()
     
-    def get_activities(self, limit: int = 200, page: int = 1, after: Optional[datetime] = None) -> List[Dict]:
+    def get_athlete_id(self) -> int:
+        """Get the authenticated athlete's id, cached so incremental syncs don't spend a request on it"""
+        if self._athlete_id is not None:
+            return self._athlete_id
+        
+        cache_key = None
+        if self.cache_manager:
+            cache_key = self.cache_manager.get_athlete_cache_key(self.access_token)
+            self._athlete_id = self.cache_manager.get(cache_key, namespace='athlete')
+        
+        if self._athlete_id is None:
+            self._athlete_id = self.get_athlete_info()['id']
+            if cache_key:
+                self.cache_manager.set(cache_key, self._athlete_id, namespace='athlete')
+        
+        return self._athlete_id
+    
+    def get_activities(self, limit: int = 200, page: int = 1, after: Optional[datetime] = None,
+                       before: Optional[datetime] = None) -> List[Dict]:
         """Get athlete activities"""
         url = f"{self.base_url}/athlete/activities"
         params = {
@@ -88,22 +164,37 @@ class StravaAPI:
         
         if after:
             params["after"] = int(after.timestamp())
+        if before:
+            params["before"] = int(before.timestamp())
         
         response = self._make_request(url, params)
         return response.json()
     
-    def get_activity_streams(self, activity_id: int, stream_types: List[str] = None) -> Dict:
-        """Get activity streams (GPS coordinates, elevation, etc.) with caching"""
-        if stream_types is None:
-            stream_types = ["latlng", "altitude", "velocity_smooth", "distance", "time"]
+    def _is_default_streams(self, stream_types: Optional[List[str]]) -> bool:
+        return stream_types is None or sorted(stream_types) == sorted(self.DEFAULT_STREAM_TYPES)
+    
+    def _get_cached_streams(self, activity_id: int, stream_types: Optional[List[str]] = None) -> Optional[Dict]:
+        """Return cached streams for an activity, or None on a cache miss"""
+        if not self.cache_manager:
+            return None
         
-        # Check cache first
-        if self.cache_manager:
-            cache_key = self.cache_manager.get_streams_cache_key(activity_id, self.access_token)
-            cached_data = self.cache_manager.get(cache_key)
-            if cached_data is not None:
-                return cached_data
+        default_streams = self._is_default_streams(stream_types)
+        if default_streams:
+            streams = self.track_store.get_streams(activity_id)
+            if streams is not None:
+                return streams
+        
+        cache_key = self.cache_manager.get_streams_cache_key(activity_id, None if default_streams else stream_types)
+        streams = self.cache_manager.get(cache_key, namespace='streams')
         
+        # Move streams cached before the track store existed into it
+        if streams is not None and default_streams:
+            self.track_store.put_streams(activity_id, streams)
+        
+        return streams
+    
+    def _fetch_activity_streams(self, activity_id: int, stream_types: List[str]) -> Dict:
+        """Fetch activity streams from the API and cache the result"""
         stream_types_str = ",".join(stream_types)
         url = f"{self.base_url}/activities/{activity_id}/streams"
         params = {
@@ -115,9 +206,13 @@ class StravaAPI:
             response = self._make_request(url, params)
             data = response.json()
             
-            # Cache the result
+            # Cache the result; the standard stream set goes to the columnar track store
             if self.cache_manager:
-                self.cache_manager.set(cache_key, data)
+                if self._is_default_streams(stream_types):
+                    self.track_store.put_streams(activity_id, data)
+                else:
+                    cache_key = self.cache_manager.get_streams_cache_key(activity_id, stream_types)
+                    self.cache_manager.set(cache_key, data, namespace='streams')
             
             return data
             
@@ -125,36 +220,48 @@ class StravaAPI:
             print(f"Warning: Failed to get streams for activity {activity_id}: {e}")
             return {}
     
-    def get_all_cycling_activities(self, days_back: int = 365) -> pd.DataFrame:
-        """Get all cycling activities with GPS data, using cache when possible"""
+    def get_activity_streams(self, activity_id: int, stream_types: List[str] = None) -> Dict:
+        """Get activity streams (GPS coordinates, elevation, etc.) with caching"""
+        if stream_types is None:
+            stream_types = self.DEFAULT_STREAM_TYPES
+        
         # Check cache first
-        if self.cache_manager:
-            cache_key = self.cache_manager.get_activities_cache_key(days_back, self.access_token)
-            cached_data = self.cache_manager.get(cache_key)
-            if cached_data is not None:
-                print(f"Using cached activities data ({len(cached_data)} activities)")
-                return pd.DataFrame(cached_data)
+        cached_data = self._get_cached_streams(activity_id, stream_types)
+        if cached_data is not None:
+            return cached_data
         
-        after_date = datetime.now() - timedelta(days=days_back)
+        data = self._fetch_activity_streams(activity_id, stream_types)
+        if self.track_store:
+            self.track_store.flush()
+        return data
+    
+    @staticmethod
+    def _is_cycling_activity(activity: Dict) -> bool:
+        """Cycling activities with GPS data, excluding very short ones (< 0.5km)"""
+        return (activity.get('type') in ['Ride', 'VirtualRide', 'EBikeRide'] and 
+                bool(activity.get('map', {}).get('summary_polyline')) and
+                activity.get('distance', 0) > 500)
+    
+    def _fetch_activity_pages(self, after: Optional[datetime] = None, before: Optional[datetime] = None,
+                              on_page=None) -> List[Dict]:
+        """Page through the activity listing and return the cycling activities found
+        
+        on_page, if given, is called with every raw page so callers can track sync markers.
+        """
         all_activities = []
         page = 1
         
-        print("Fetching activities from Strava...")
-        
         while True:
-            activities = self.get_activities(limit=200, page=page, after=after_date)
+            activities = self.get_activities(limit=200, page=page, after=after, before=before)
             
             if not activities:
                 break
             
-            # Filter for cycling activities with GPS data
-            cycling_activities = [
-                activity for activity in activities 
-                if activity.get('type') in ['Ride', 'VirtualRide', 'EBikeRide'] and 
-                   activity.get('map', {}).get('summary_polyline') and
-                   activity.get('distance', 0) > 500  # Filter out very short activities (< 0.5km)
-            ]
+            if on_page:
+                on_page(activities)
             
+            # Filter for cycling activities with GPS data
+            cycling_activities = [activity for activity in activities if self._is_cycling_activity(activity)]
             all_activities.extend(cycling_activities)
             
             if len(activities) < 200:  # Last page
@@ -163,14 +270,84 @@ class StravaAPI:
             page += 1
             print(f"Fetched page {page-1}, found {len(cycling_activities)} cycling activities...")
         
+        return all_activities
+    
+    def sync_activities(self, days_back: int = 365) -> ActivityStore:
+        """Bring the athlete's persistent activity store up to date
+        
+        Activities are listed from the store's high-water mark on, reaching back at least
+        Config.SYNC_RELIST_DAYS so late uploads with an older start_date are picked up and
+        activities deleted within that window are dropped from the store. A one-off backfill
+        runs when days_back reaches further into the past than any previous sync.
+        """
+        store = ActivityStore(self.cache_manager.cache_dir, self.get_athlete_id())
+        now = datetime.now(timezone.utc)
+        window_start = now - timedelta(days=days_back)
+        
+        first_sync = store.synced_since is None
+        
+        if first_sync or window_start < store.synced_since:
+            print(f"Backfilling activities since {window_start.date()}...")
+            backfill = self._fetch_activity_pages(
+                after=window_start,
+                before=store.synced_since,
+                on_page=store.advance_high_water_mark
+            )
+            store.merge(backfill)
+            store.synced_since = window_start
+        
+        # A first sync already listed everything up to now
+        if not first_sync and store.high_water_mark is not None:
+            relist_start = max(min(store.high_water_mark, now - timedelta(days=Config.SYNC_RELIST_DAYS)),
+                               store.synced_since)
+            print(f"Syncing activities since {relist_start.isoformat()}...")
+            listed = self._fetch_activity_pages(
+                after=relist_start,
+                on_page=store.advance_high_water_mark
+            )
+            added, removed = store.replace_window(relist_start, listed)
+            print(f"Found {added} new cycling activities" + (f", removed {removed} deleted" if removed else ""))
+        
+        store.save()
+        return store
+    
+    @timed('list_activities')
+    def get_all_cycling_activities(self, days_back: int = 365, incremental: Optional[bool] = None) -> pd.DataFrame:
+        """Get all cycling activities with GPS data, using the activity store or cache when possible"""
+        if incremental is None:
+            incremental = self.incremental_sync
+        
+        if incremental and self.cache_manager:
+            store = self.sync_activities(days_back)
+            all_activities = store.activities_since(datetime.now(timezone.utc) - timedelta(days=days_back))
+            print(f"Found {len(all_activities)} cycling activities total")
+            return self._activities_to_dataframe(all_activities)
+        
+        # Check cache first
+        if self.cache_manager:
+            cache_key = self.cache_manager.get_activities_cache_key(days_back, self.access_token)
+            cached_data = self.cache_manager.get(cache_key, namespace='activities')
+            if cached_data is not None:
+                print(f"Using cached activities data ({len(cached_data)} activities)")
+                return pd.DataFrame(cached_data)
+        
+        after_date = datetime.now() - timedelta(days=days_back)
+        
+        print("Fetching activities from Strava...")
+        all_activities = self._fetch_activity_pages(after=after_date)
+        
         print(f"Found {len(all_activities)} cycling activities total")
         
         # Cache the raw data
         if self.cache_manager and all_activities:
-            self.cache_manager.set(cache_key, all_activities)
+            self.cache_manager.set(cache_key, all_activities, namespace='activities')
         
-        # Convert to DataFrame
-        df = pd.DataFrame(all_activities)
+        return self._activities_to_dataframe(all_activities)
+    
+    @staticmethod
+    def _activities_to_dataframe(activities: List[Dict]) -> pd.DataFrame:
+        """Convert raw activity summaries to a DataFrame with derived columns"""
+        df = pd.DataFrame(activities)
         
         if not df.empty:
             df['start_date'] = pd.to_datetime(df['start_date'])
@@ -185,72 +362,183 @@ class StravaAPI:
         
         return df
     
-    def get_activities_with_detailed_streams(self, activity_ids: List[int] = None, limit: int = 50) -> List[Dict]:
-        """Get activities with detailed GPS streams for heatmap generation"""
+    @staticmethod
+    def get_summary_track_collection(activities_df: pd.DataFrame) -> TrackCollection:
+        """Tracks decoded from the listing's summary polylines, without any per-activity request
+        
+        A summary polyline is a simplified outline of the route with no streams: enough for
+        heatmaps and route maps of the whole history, but not for speed or elevation maps.
+        """
+        if activities_df.empty or 'map' not in activities_df:
+            return TrackCollection.empty()
+        
+        polylines = [m.get('summary_polyline') if isinstance(m, dict) else None for m in activities_df['map']]
+        offsets, lat, lon = decode_polylines(polylines)
+        start_dates = pd.to_datetime(activities_df['start_date'], utc=True)
+        start_times = (start_dates - pd.Timestamp(0, tz='UTC')).dt.total_seconds().to_numpy()
+        tracks = TrackCollection(activities_df['id'].to_numpy(dtype=np.int64), offsets, lat, lon,
+                                 start_times=start_times)
+        
+        tracks = tracks.subset(np.flatnonzero(tracks.lengths >= 2))
+        print(f"Decoded summary routes of {len(tracks)} activities ({tracks.point_count} points)")
+        return tracks
+    
+    def _get_cached_columns(self, activity_id: int) -> Optional[Dict]:
+        """Return cached stream columns for an activity, or None on a cache miss"""
+        if not self.cache_manager:
+            return None
+        
+        columns = self.track_store.get_columns(activity_id)
+        if columns is None:
+            streams = self._get_cached_streams(activity_id)
+            if streams is not None:
+                columns = TrackStore.streams_to_columns(streams)
+        increment('cache_lookups', namespace='tracks', result='miss' if columns is None else 'hit')
+        return columns
+    
+    def _fetch_activity_columns(self, activity_id: int) -> Dict:
+        """Fetch the standard streams for an activity as column arrays"""
+        return TrackStore.streams_to_columns(self._fetch_activity_streams(activity_id, self.DEFAULT_STREAM_TYPES))
+    
+    @timed('validate_streams')
+    def _build_track(self, activity_id: int, columns: Dict) -> Optional[ActivityTrack]:
+        """Validate stream columns for an activity and build its track, or None if unusable"""
+        if not len(columns['lat']):
+            print(f"Activity {activity_id} has no GPS data")
+            increment('activities_rejected', reason='no_gps')
+            return None
+        
+        # Drops points outside the valid latitude/longitude ranges
+        track = ActivityTrack.from_columns(activity_id, columns)
+        
+        if len(track) < MIN_TRACK_POINTS:
+            print(f"Activity {activity_id} has insufficient valid GPS points ({len(track)})")
+            increment('activities_rejected', reason='too_few_points')
+            return None
+        
+        return track
+    
+    def _build_detailed_activity(self, activity_id: int, columns: Dict) -> Optional[Dict]:
+        """Validate stream columns for an activity and build its heatmap data, or None if unusable"""
+        track = self._build_track(activity_id, columns)
+        return track.to_dict() if track is not None else None
+    
+    def iter_activities_with_detailed_streams(self, activity_ids: List[int], max_workers: Optional[int] = None,
+                                              as_tracks: bool = False) -> Iterator[Tuple[int, Optional[Dict]]]:
+        """Yield (activity_id, activity_data) pairs as they become available
+        
+        Cached activities are yielded first without touching the network; the rest are
+        fetched with up to max_workers requests in flight, sharing the client's rate limit.
+        activity_data is an ActivityTrack when as_tracks is set, otherwise a dict, and
+        None when the activity has no usable GPS data or failed to load.
+        """
+        workers = self.max_workers if max_workers is None else max(1, max_workers)
+        build = self._build_track if as_tracks else self._build_detailed_activity
+        to_fetch = []
+        
+        for activity_id in activity_ids:
+            try:
+                columns = self._get_cached_columns(activity_id)
+            except Exception as e:
+                print(f"Error reading cached streams for activity {activity_id}: {e}")
+                columns = None
+            
+            if columns is None:
+                to_fetch.append(activity_id)
+                continue
+            
+            try:
+                yield activity_id, build(activity_id, columns)
+            except Exception as e:
+                print(f"Error processing activity {activity_id}: {e}")
+                yield activity_id, None
+        
+        if not to_fetch:
+            if self.track_store:
+                self.track_store.flush()
+            return
+        
+        try:
+            with ThreadPoolExecutor(max_workers=min(workers, len(to_fetch))) as executor:
+                futures = {
+                    executor.submit(self._fetch_activity_columns, activity_id): activity_id
+                    for activity_id in to_fetch
+                }
+                
+                for future in as_completed(futures):
+                    activity_id = futures[future]
+                    try:
+                        yield activity_id, build(activity_id, future.result())
+                    except Exception as e:
+                        print(f"Error processing activity {activity_id}: {e}")
+                        yield activity_id, None
+        finally:
+            # Persist everything fetched as one track store segment
+            if self.track_store:
+                self.track_store.flush()
+    
+    @timed('load_tracks')
+    def get_activities_with_detailed_streams(self, activity_ids: List[int] = None, limit: int = 50,
+                                             max_workers: Optional[int] = None, as_tracks: bool = False,
+                                             progress: Optional[Callable[[int, int], None]] = None
+                                             ) -> Union[List[Dict], TrackCollection]:
+        """Get activities with detailed GPS streams for heatmap generation
+        
+        Returns a list of activity dicts, or a TrackCollection when as_tracks is set.
+        progress, if given, is called with (activities processed, total) after each activity.
+        """
         if activity_ids is None:
             # Get recent cycling activities
             activities_df = self.get_all_cycling_activities(days_back=365)
             if activities_df.empty:
-                return []
+                return TrackCollection.empty() if as_tracks else []
             
             # Sort by date and take the most recent ones
             activities_df = activities_df.sort_values('start_date', ascending=False)
             activity_ids = activities_df['id'].head(limit).tolist()
         
-        detailed_activities = []
+        results = {}
         failed_activities = []
         
         print(f"Fetching detailed GPS data for {len(activity_ids)} activities...")
         
-        for i, activity_id in enumerate(activity_ids):
-            print(f"Processing activity {i+1}/{len(activity_ids)}: {activity_id}")
+        for i, (activity_id, activity_data) in enumerate(
+                self.iter_activities_with_detailed_streams(activity_ids, max_workers, as_tracks=as_tracks)):
+            print(f"Processed activity {i+1}/{len(activity_ids)}: {activity_id}")
+            if progress:
+                progress(i + 1, len(activity_ids))
             
-            try:
-                streams = self.get_activity_streams(activity_id)
-                
-                if 'latlng' in streams and streams['latlng'].get('data'):
-                    # Validate GPS coordinates
-                    coords = streams['latlng']['data']
-                    valid_coords = []
-                    
-                    for coord in coords:
-                        if (len(coord) == 2 and 
-                            -90 <= coord[0] <= 90 and  # Valid latitude
-                            -180 <= coord[1] <= 180):  # Valid longitude
-                            valid_coords.append(coord)
-                    
-                    if len(valid_coords) >= 10:  # Minimum points for meaningful visualization
-                        activity_data = {
-                            'id': activity_id,
-                            'coordinates': valid_coords,
-                            'altitude': streams.get('altitude', {}).get('data', []),
-                            'velocity': streams.get('velocity_smooth', {}).get('data', []),
-                            'distance': streams.get('distance', {}).get('data', []),
-                            'time': streams.get('time', {}).get('data', [])
-                        }
-                        detailed_activities.append(activity_data)
-                    else:
-                        print(f"Activity {activity_id} has insufficient valid GPS points ({len(valid_coords)})")
-                        failed_activities.append(activity_id)
-                else:
-                    print(f"Activity {activity_id} has no GPS data")
-                    failed_activities.append(activity_id)
-                
-            except Exception as e:
-                print(f"Error processing activity {activity_id}: {e}")
+            if activity_data is None:
                 failed_activities.append(activity_id)
-                continue
+            else:
+                results[activity_id] = activity_data
+        
+        # Keep the caller's ordering regardless of completion order
+        detailed_activities = [results[activity_id] for activity_id in dict.fromkeys(activity_ids)
+                               if activity_id in results]
         
         if failed_activities:
             print(f"Warning: Failed to process {len(failed_activities)} activities: {failed_activities[:5]}{'...' if len(failed_activities) > 5 else ''}")
         
         print(f"Successfully processed {len(detailed_activities)} activities with GPS data")
+        
+        if as_tracks:
+            return TrackCollection.from_tracks(detailed_activities)
         return detailed_activities
+    
+    def get_track_collection(self, activity_ids: List[int] = None, limit: int = 50,
+                             max_workers: Optional[int] = None,
+                             progress: Optional[Callable[[int, int], None]] = None) -> TrackCollection:
+        """Get activities with detailed GPS streams as an array-backed TrackCollection"""
+        return self.get_activities_with_detailed_streams(activity_ids, limit, max_workers, as_tracks=True,
+                                                         progress=progress)
 
     def clear_cache(self) -> None:
         """Clear the API cache"""
         if self.cache_manager:
             self.cache_manager.clear()
+            self.track_store.clear()
+            clear_activity_stores(self.cache_manager.cache_dir)
             print("Cache cleared successfully")
         else:
             print("Cache is not enabled")
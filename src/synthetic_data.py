@@ -0,0 +1,360 @@
+"""
+Deterministic synthetic Strava activities for benchmarks and offline testing
+"""
+import argparse
+import math
+import os
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+from .activity_store import ActivityStore
+from .config import Config
+from .polyline_codec import encode_polyline
+from .spatial_index import METERS_PER_DEGREE
+from .strava_api import StravaAPI
+from .track_store import TrackStore
+from .tracks import ActivityTrack, TrackCollection
+
+FIRST_ATHLETE_ID = 1000
+FIRST_ACTIVITY_ID = 10_000_000
+
+ROAD_SPACING_M = 600.0  # mean distance between intersections of the synthetic road grid
+ROAD_JITTER = 0.3  # intersections are displaced by up to this fraction of the spacing
+GPS_NOISE_M = 2.5  # standard deviation of the GPS error added to every point
+
+# (type, share of rides, cruising speed in m/s, median distance in km)
+RIDE_TYPES = (('Ride', 0.9, 7.5, 35.0), ('EBikeRide', 0.1, 8.5, 25.0))
+_RIDE_TYPE_CDF = np.cumsum([share for _, share, _, _ in RIDE_TYPES])
+
+# Turn probabilities at an intersection while riding away from home: straight on, left, right
+TURN_WEIGHTS = (0.6, 0.2, 0.2)
+_DIRECTIONS = ((1, 0), (0, 1), (-1, 0), (0, -1))  # east, north, west, south on the road grid
+
+# Terrain: (amplitude m, wavelength m) ranges of the summed waves and the base altitude
+TERRAIN_WAVES = 5
+TERRAIN_AMPLITUDE = (15.0, 90.0)
+TERRAIN_WAVELENGTH = (3000.0, 20000.0)
+TERRAIN_BASE_M = 250.0
+
+
+def _hash_uniform(seed: int, salt: int, i: np.ndarray, j: np.ndarray) -> np.ndarray:
+    """Uniform [0, 1) values depending only on (seed, salt, i, j), from a splitmix64 mix"""
+    x = (np.atleast_1d(np.asarray(i, dtype=np.int64)).astype(np.uint64) * np.uint64(0x9E3779B97F4A7C15) ^
+         np.atleast_1d(np.asarray(j, dtype=np.int64)).astype(np.uint64) * np.uint64(0xC2B2AE3D27D4EB4F) ^
+         np.uint64((seed * 8 + salt) & 0xFFFFFFFFFFFFFFFF))
+    x = (x ^ (x >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+    x = (x ^ (x >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+    x ^= x >> np.uint64(31)
+    return (x >> np.uint64(11)).astype(np.float64) / float(1 << 53)
+
+
+class SyntheticDataset:
+    """Reproducible athletes, activity listings and GPS streams without a Strava account
+    
+    Athletes live around `center` and ride loops from home over a shared grid of roads
+    (jittered intersections, mostly straight on, turning back home halfway), so routes
+    overlap like real ones. Altitude follows a smooth terrain and velocity slows for
+    climbs and corners. Every value depends only on the constructor arguments: activity i
+    of athlete a is generated from (seed, a, i) alone, so any activity can be rebuilt on
+    demand and datasets of 100k activities never need to be held in memory.
+    
+    Listings come back in the raw summary format of GET /athlete/activities and streams in
+    the key_by_type format of GET /activities/{id}/streams; activities_dataframe,
+    detailed_activities and track_collection return what get_all_cycling_activities and
+    get_activities_with_detailed_streams return for the same data.
+    """
+    
+    def __init__(self, n_athletes: int = 1, rides_per_athlete: int = 100, points_per_ride: int = 2000,
+                 seed: int = 0, days: int = 365, center: Sequence[float] = Config.DEFAULT_MAP_CENTER,
+                 spread_km: float = 15.0, end: Optional[datetime] = None):
+        if n_athletes < 1 or rides_per_athlete < 0 or points_per_ride < 2:
+            raise ValueError("Need at least one athlete and two points per ride")
+        self.n_athletes = n_athletes
+        self.rides_per_athlete = rides_per_athlete
+        self.points_per_ride = points_per_ride
+        self.seed = seed
+        self.days = days
+        self.center = (float(center[0]), float(center[1]))
+        self.spread_km = spread_km
+        # Rides end before midnight UTC today unless pinned, so "last N days" queries find them
+        if end is None:
+            end = datetime.now(timezone.utc).replace(hour=0, minute=0, second=0, microsecond=0)
+        self.end = end if end.tzinfo else end.replace(tzinfo=timezone.utc)
+        self._meters_per_degree_lon = METERS_PER_DEGREE * math.cos(math.radians(self.center[0]))
+        
+        rng = np.random.default_rng([seed, 0x7E])
+        self._waves = np.column_stack([
+            rng.uniform(*TERRAIN_AMPLITUDE, TERRAIN_WAVES),
+            2 * math.pi / rng.uniform(*TERRAIN_WAVELENGTH, TERRAIN_WAVES),
+            rng.uniform(0, 2 * math.pi, TERRAIN_WAVES),
+            rng.uniform(0, 2 * math.pi, TERRAIN_WAVES)
+        ])
+        self._homes, self._start_times = zip(*(self._athlete_plan(a) for a in range(n_athletes)))
+        self._summaries: Dict[int, Dict] = {}
+    
+    def __len__(self) -> int:
+        return self.n_athletes * self.rides_per_athlete
+    
+    def _athlete_plan(self, athlete_index: int) -> Tuple[Tuple[int, int], np.ndarray]:
+        """Home intersection and sorted ride start times (epoch seconds) of an athlete"""
+        rng = np.random.default_rng([self.seed, athlete_index])
+        radius = self.spread_km * 1000 / ROAD_SPACING_M
+        home = tuple(int(v) for v in np.round(rng.uniform(-radius, radius, 2)))
+        
+        # Whole days back from the end, starting between 06:00 and 19:00
+        days_back = rng.integers(1, max(self.days, 1) + 1, self.rides_per_athlete)
+        seconds = rng.integers(6 * 3600, 19 * 3600, self.rides_per_athlete)
+        start_times = np.sort(self.end.timestamp() - days_back * 86400.0 + seconds)
+        return home, start_times
+    
+    @property
+    def athletes(self) -> List[Dict]:
+        """Athlete profiles in the format of GET /athlete"""
+        return [{'id': FIRST_ATHLETE_ID + a, 'resource_state': 2, 'firstname': 'Synthetic',
+                 'lastname': f"Rider {a + 1}"} for a in range(self.n_athletes)]
+    
+    def activity_ids(self, athlete_id: Optional[int] = None) -> List[int]:
+        """Activity ids, oldest first per athlete (ids grow with start time, as on Strava)"""
+        athletes = range(self.n_athletes) if athlete_id is None else [self._athlete_index(athlete_id)]
+        return [FIRST_ACTIVITY_ID + a * self.rides_per_athlete + i
+                for a in athletes for i in range(self.rides_per_athlete)]
+    
+    def _athlete_index(self, athlete_id: int) -> int:
+        index = athlete_id - FIRST_ATHLETE_ID
+        if not 0 <= index < self.n_athletes:
+            raise KeyError(f"Unknown synthetic athlete {athlete_id}")
+        return index
+    
+    def _locate(self, activity_id: int) -> Tuple[int, int]:
+        """(athlete index, ride index) of an activity id"""
+        offset = activity_id - FIRST_ACTIVITY_ID
+        if not 0 <= offset < len(self):
+            raise KeyError(f"Unknown synthetic activity {activity_id}")
+        return divmod(offset, self.rides_per_athlete)
+    
+    def __contains__(self, activity_id: int) -> bool:
+        return 0 <= activity_id - FIRST_ACTIVITY_ID < len(self)
+    
+    def start_time(self, activity_id: int) -> float:
+        athlete_index, ride_index = self._locate(activity_id)
+        return float(self._start_times[athlete_index][ride_index])
+    
+    def _node_xy(self, nodes: np.ndarray) -> np.ndarray:
+        """Meters east/north of the center of road grid intersections"""
+        i, j = nodes[:, 0], nodes[:, 1]
+        x = (i + ROAD_JITTER * (_hash_uniform(self.seed, 1, i, j) - 0.5) * 2) * ROAD_SPACING_M
+        y = (j + ROAD_JITTER * (_hash_uniform(self.seed, 2, i, j) - 0.5) * 2) * ROAD_SPACING_M
+        return np.column_stack([x, y])
+    
+    def _terrain(self, x: np.ndarray, y: np.ndarray) -> np.ndarray:
+        """Altitude in meters of points given in meters east/north of the center"""
+        amplitude, wavenumber, direction, phase = self._waves.T
+        along = np.multiply.outer(x, wavenumber * np.cos(direction)) + np.multiply.outer(y, wavenumber * np.sin(direction))
+        return TERRAIN_BASE_M + (amplitude * np.sin(along + phase)).sum(axis=-1)
+    
+    @staticmethod
+    def _route(home: Tuple[int, int], target_m: float, rng: np.random.Generator) -> np.ndarray:
+        """Intersections of a loop from home: wander for about half the distance, then head back"""
+        i, j = home
+        heading = int(rng.integers(4))
+        nodes = [home]
+        travelled = 0.0
+        while True:
+            to_home = abs(i - home[0]) + abs(j - home[1])
+            if len(nodes) > 2 and travelled + to_home * ROAD_SPACING_M >= target_m:
+                if to_home == 0:
+                    break
+                # Any turn that gets closer to home, straight on first
+                turns = [h for h in (heading, (heading + 1) % 4, (heading + 3) % 4)
+                         if abs(i + _DIRECTIONS[h][0] - home[0]) + abs(j + _DIRECTIONS[h][1] - home[1]) < to_home]
+                if heading not in turns:
+                    heading = turns[int(rng.integers(len(turns)))] if turns else (heading + 1) % 4
+            else:
+                roll = rng.random()
+                if roll >= TURN_WEIGHTS[0]:
+                    heading = (heading + (1 if roll < TURN_WEIGHTS[0] + TURN_WEIGHTS[1] else 3)) % 4
+            i, j = i + _DIRECTIONS[heading][0], j + _DIRECTIONS[heading][1]
+            nodes.append((i, j))
+            travelled += ROAD_SPACING_M
+        return np.array(nodes, dtype=np.int64)
+    
+    def _generate(self, activity_id: int) -> Tuple[Dict, Dict[str, np.ndarray]]:
+        """Summary and stream columns of one activity (rounded like Strava's JSON)"""
+        athlete_index, ride_index = self._locate(activity_id)
+        rng = np.random.default_rng([self.seed, athlete_index, ride_index])
+        kind = min(int(np.searchsorted(_RIDE_TYPE_CDF, rng.random(), side='right')), len(RIDE_TYPES) - 1)
+        ride_type, _, cruising_speed, median_km = RIDE_TYPES[kind]
+        target_m = min(max(rng.lognormal(math.log(median_km * 1000), 0.45), 5000.0), 200000.0)
+        n_points = self.points_per_ride
+        
+        nodes = self._route(self._homes[athlete_index], target_m, rng)
+        node_xy = self._node_xy(nodes)
+        node_s = np.concatenate([[0.0], np.cumsum(np.hypot(*np.diff(node_xy, axis=0).T))])
+        s = np.linspace(0.0, node_s[-1], n_points)
+        x, y = np.interp(s, node_s, node_xy[:, 0]), np.interp(s, node_s, node_xy[:, 1])
+        altitude = self._terrain(x, y)
+        
+        # Cruising speed, slower uphill and into corners, with slowly varying effort
+        grade = np.gradient(altitude, s[1] - s[0]) if s[-1] > 0 else np.zeros(n_points)
+        waves = rng.uniform(0, 2 * math.pi, 2)
+        effort = (1 + 0.08 * np.sin(s / 3000 * 2 * math.pi + waves[0]) + 0.05 * np.sin(s / 700 * 2 * math.pi + waves[1])
+                  + rng.normal(0, 0.02, n_points))
+        headings = np.diff(nodes, axis=0)
+        corners = node_s[1:-1][np.any(headings[1:] != headings[:-1], axis=1)]
+        corner_gap = np.full(n_points, np.inf)
+        if len(corners):
+            nearest = np.clip(np.searchsorted(corners, s), 1, len(corners)) - 1
+            corner_gap = np.minimum(np.abs(s - corners[nearest]),
+                                    np.abs(s - corners[np.minimum(nearest + 1, len(corners) - 1)]))
+        climbing = np.minimum(np.maximum(1 - 6 * grade, 0.35), 1.5)
+        velocity = cruising_speed * effort * climbing * (1 - 0.6 * np.exp(-(corner_gap / 30) ** 2))
+        velocity = np.maximum(velocity, 1.0)
+        elapsed = np.concatenate([[0.0], np.cumsum(np.diff(s) / ((velocity[:-1] + velocity[1:]) / 2))])
+        
+        lat0, lon0 = self.center
+        columns = {
+            'lat': np.round(lat0 + (y + rng.normal(0, GPS_NOISE_M, n_points)) / METERS_PER_DEGREE, 6),
+            'lon': np.round(lon0 + (x + rng.normal(0, GPS_NOISE_M, n_points)) / self._meters_per_degree_lon, 6),
+            'altitude': np.round(altitude + rng.normal(0, 0.3, n_points), 1),
+            'velocity': np.round(velocity, 2),
+            'distance': np.round(s, 1),
+            'time': np.round(elapsed)
+        }
+        
+        moving_time = int(columns['time'][-1])
+        distance = float(columns['distance'][-1])
+        start = datetime.fromtimestamp(self._start_times[athlete_index][ride_index], timezone.utc)
+        part_of_day = 'Morning' if start.hour < 12 else 'Afternoon' if start.hour < 17 else 'Evening'
+        summary = {
+            'resource_state': 2,
+            'athlete': {'id': FIRST_ATHLETE_ID + athlete_index, 'resource_state': 1},
+            'name': f"{part_of_day} {'E-Bike Ride' if ride_type == 'EBikeRide' else 'Ride'}",
+            'distance': distance,
+            'moving_time': moving_time,
+            'elapsed_time': moving_time + int(rng.exponential(300)),
+            'total_elevation_gain': round(float(np.maximum(np.diff(columns['altitude']), 0).sum()), 1),
+            'type': ride_type,
+            'sport_type': ride_type,
+            'id': activity_id,
+            'start_date': start.strftime('%Y-%m-%dT%H:%M:%SZ'),
+            'achievement_count': int(rng.poisson(2)),
+            'kudos_count': int(rng.poisson(5)),
+            'trainer': False,
+            'manual': False,
+            'map': {'id': f"a{activity_id}", 'resource_state': 2,
+                    'summary_polyline': encode_polyline(lat0 + node_xy[:, 1] / METERS_PER_DEGREE,
+                                                        lon0 + node_xy[:, 0] / self._meters_per_degree_lon)},
+            'start_latlng': [float(columns['lat'][0]), float(columns['lon'][0])],
+            'end_latlng': [float(columns['lat'][-1]), float(columns['lon'][-1])],
+            'average_speed': round(distance / max(moving_time, 1), 3),
+            'max_speed': float(columns['velocity'].max()),
+            'elev_high': float(columns['altitude'].max()),
+            'elev_low': float(columns['altitude'].min())
+        }
+        return summary, columns
+    
+    def summary(self, activity_id: int) -> Dict:
+        """Activity summary as listed by GET /athlete/activities"""
+        if activity_id not in self._summaries:
+            self._summaries[activity_id] = self._generate(activity_id)[0]
+        return self._summaries[activity_id]
+    
+    def activities(self, athlete_id: Optional[int] = None) -> List[Dict]:
+        """Raw activity summaries, newest first, of one athlete or all of them"""
+        summaries = [self.summary(activity_id) for activity_id in self.activity_ids(athlete_id)]
+        return sorted(summaries, key=lambda activity: activity['start_date'], reverse=True)
+    
+    def activities_dataframe(self, athlete_id: Optional[int] = None) -> pd.DataFrame:
+        """The activities as get_all_cycling_activities returns them"""
+        return StravaAPI._activities_to_dataframe(
+            [activity for activity in self.activities(athlete_id) if StravaAPI._is_cycling_activity(activity)])
+    
+    def columns(self, activity_id: int) -> Dict[str, np.ndarray]:
+        """Stream columns of an activity in TrackStore's layout"""
+        summary, columns = self._generate(activity_id)
+        self._summaries.setdefault(activity_id, summary)
+        for name in ('altitude', 'velocity', 'distance', 'time'):
+            columns[name] = columns[name].astype(np.float32)
+        return columns
+    
+    def streams(self, activity_id: int) -> Dict[str, list]:
+        """{stream type: data} of an activity, for the types StravaAPI requests"""
+        columns = self._generate(activity_id)[1]
+        return {
+            'latlng': np.column_stack([columns['lat'], columns['lon']]).tolist(),
+            'altitude': columns['altitude'].tolist(),
+            'velocity_smooth': columns['velocity'].tolist(),
+            'distance': columns['distance'].tolist(),
+            'time': columns['time'].astype(np.int64).tolist()
+        }
+    
+    def stream_payload(self, activity_id: int) -> Dict[str, Dict]:
+        """Streams in the key_by_type format of GET /activities/{id}/streams"""
+        return {
+            stream_type: {'data': data, 'series_type': 'distance', 'original_size': len(data), 'resolution': 'high'}
+            for stream_type, data in self.streams(activity_id).items()
+        }
+    
+    def _ordered_ids(self, activity_ids: Optional[Sequence[int]]) -> List[int]:
+        if activity_ids is not None:
+            return list(activity_ids)
+        return [activity['id'] for activity in self.activities()]
+    
+    def detailed_activities(self, activity_ids: Optional[Sequence[int]] = None) -> List[Dict]:
+        """Activity dicts as get_activities_with_detailed_streams returns them (newest first by default)"""
+        return [ActivityTrack.from_columns(activity_id, self.columns(activity_id)).to_dict()
+                for activity_id in self._ordered_ids(activity_ids)]
+    
+    def track_collection(self, activity_ids: Optional[Sequence[int]] = None) -> TrackCollection:
+        """Activities as the TrackCollection get_track_collection returns (newest first by default)"""
+        activity_ids = self._ordered_ids(activity_ids)
+        if not activity_ids:
+            return TrackCollection.empty()
+        
+        columns = [self.columns(activity_id) for activity_id in activity_ids]
+        offsets = np.zeros(len(columns) + 1, dtype=np.int64)
+        np.cumsum([len(c['lat']) for c in columns], out=offsets[1:])
+        arrays = {name: np.concatenate([c[name] for c in columns])
+                  for name in ('lat', 'lon', 'altitude', 'velocity', 'distance', 'time')}
+        return TrackCollection(np.array(activity_ids, dtype=np.int64), offsets,
+                               start_times=[self.start_time(activity_id) for activity_id in activity_ids], **arrays)
+    
+    def write_cache(self, cache_dir: str = 'cache') -> None:
+        """Store the dataset as a synced cache: per-athlete activity stores plus the track store
+        
+        The result can be replayed by the mock server (python -m src.mock_strava --from-cache)
+        and read by everything that works from the track store.
+        """
+        track_store = TrackStore(os.path.join(cache_dir, 'tracks'))
+        for athlete in self.athletes:
+            store = ActivityStore(cache_dir, athlete['id'])
+            activities = self.activities(athlete['id'])
+            store.merge([activity for activity in activities if StravaAPI._is_cycling_activity(activity)])
+            store.advance_high_water_mark(activities)
+            store.synced_since = self.end - timedelta(days=self.days)
+            store.save()
+            for activity in activities:
+                track_store.put_columns(activity['id'], self.columns(activity['id']))
+        track_store.flush()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Generate a deterministic synthetic activity cache')
+    parser.add_argument('--athletes', type=int, default=1, help='Number of athletes (default: 1)')
+    parser.add_argument('--rides', type=int, default=100, help='Rides per athlete (default: 100)')
+    parser.add_argument('--points', type=int, default=2000, help='GPS points per ride (default: 2000)')
+    parser.add_argument('--seed', type=int, default=0, help='Seed of the generated data')
+    parser.add_argument('--days', type=int, default=365, help='Days the rides are spread over (default: 365)')
+    parser.add_argument('--cache-dir', default='cache', help='Cache directory to write (default: cache)')
+    args = parser.parse_args()
+    
+    dataset = SyntheticDataset(args.athletes, args.rides, args.points, seed=args.seed, days=args.days)
+    dataset.write_cache(args.cache_dir)
+    print(f"Wrote {len(dataset)} synthetic rides ({len(dataset) * args.points} points) to {args.cache_dir}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,196 @@
+"""
+Server-side heatmap rendering into a slippy-map (XYZ) PNG tile pyramid
+"""
+import io
+import os
+import shutil
+import tempfile
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+import matplotlib.image as mimage
+
+from .colormaps import gradient_lut
+from .config import Config
+from .instrumentation import timed
+
+TILE_SIZE = 256
+
+# Web Mercator is undefined at the poles; tiles cover this latitude range
+MAX_MERCATOR_LAT = 85.05112878
+
+
+def lonlat_to_mercator(lat: np.ndarray, lon: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Project coordinates to normalized Web Mercator x/y in [0, 1), y growing southwards"""
+    lat = np.clip(np.asarray(lat, dtype=np.float64), -MAX_MERCATOR_LAT, MAX_MERCATOR_LAT)
+    lon = np.asarray(lon, dtype=np.float64)
+    x = (lon + 180.0) / 360.0
+    lat_rad = np.radians(lat)
+    y = (1.0 - np.log(np.tan(lat_rad) + 1.0 / np.cos(lat_rad)) / np.pi) / 2.0
+    # Points exactly on the east/south edge belong to the last tile
+    limit = np.nextafter(1.0, 0.0)
+    return np.clip(x, 0.0, limit), np.clip(y, 0.0, limit)
+
+
+def _gaussian_kernel(radius: int) -> np.ndarray:
+    """1-D Gaussian weights with a peak of 1, so a lone point keeps an intensity of 1"""
+    if radius <= 0:
+        return np.ones(1)
+    offsets = np.arange(-radius, radius + 1)
+    sigma = radius / 2.0
+    return np.exp(-0.5 * (offsets / sigma) ** 2)
+
+
+def _blur(grid: np.ndarray, kernel: np.ndarray) -> np.ndarray:
+    """Separable convolution that shrinks the grid by the kernel radius on every side"""
+    radius = len(kernel) // 2
+    if radius == 0:
+        return grid
+    height, width = grid.shape
+    rows = np.zeros((height, width - 2 * radius))
+    for k, weight in enumerate(kernel):
+        rows += weight * grid[:, k:k + width - 2 * radius]
+    out = np.zeros((height - 2 * radius, width - 2 * radius))
+    for k, weight in enumerate(kernel):
+        out += weight * rows[k:k + height - 2 * radius, :]
+    return out
+
+
+def neighbourhood_index(ranges: Dict[int, Tuple[int, int]], tx: int, ty: int, n_tiles: int) -> np.ndarray:
+    """Indices of the points in tile (tx, ty) and its 8 neighbours, whose blur can bleed across the edge
+    
+    ranges maps a tile key (tx * n_tiles + ty) to its [start, end) slice of the tile-sorted points.
+    """
+    parts = [np.arange(*ranges[key])
+             for nx in (tx - 1, tx, tx + 1) for ny in (ty - 1, ty, ty + 1)
+             if 0 <= nx < n_tiles and 0 <= ny < n_tiles
+             for key in [nx * n_tiles + ny] if key in ranges]
+    return np.concatenate(parts) if parts else np.empty(0, dtype=np.int64)
+
+
+def encode_png(image: np.ndarray) -> bytes:
+    """Encode an RGBA image as PNG bytes"""
+    buffer = io.BytesIO()
+    mimage.imsave(buffer, image, format='png')
+    return buffer.getvalue()
+
+
+class TileRenderer:
+    """Renders point density into XYZ PNG tiles with NumPy
+    
+    Each zoom level is rendered independently: points are binned into per-pixel counts,
+    smoothed with a small Gaussian, scaled against a percentile of the occupied pixels
+    of that zoom (so a few very busy pixels don't wash the rest out) and colored through
+    a lookup table built from Config.HEATMAP_GRADIENT. Only tiles containing data are written.
+    """
+    
+    def __init__(self, gradient: Optional[Dict[float, str]] = None, blur_radius: int = Config.HEATMAP_TILE_BLUR_RADIUS,
+                 percentile: float = Config.HEATMAP_TILE_PERCENTILE, scale: str = 'log'):
+        if scale not in ('log', 'linear'):
+            raise ValueError(f"Unknown scale {scale!r}; expected 'log' or 'linear'")
+        self.lut = gradient_lut(gradient or Config.HEATMAP_GRADIENT)
+        self.blur_radius = blur_radius
+        self.kernel = _gaussian_kernel(blur_radius)
+        self.percentile = percentile
+        self.scale = scale
+    
+    def _scale(self, density: np.ndarray, vmax: float) -> np.ndarray:
+        """Map densities to [0, 1] with log or linear scaling"""
+        if self.scale == 'log':
+            scaled = np.log1p(density) / np.log1p(vmax)
+        else:
+            scaled = density / vmax
+        return np.clip(scaled, 0.0, 1.0)
+    
+    def colorize(self, density: np.ndarray, vmax: float) -> np.ndarray:
+        """RGBA image (uint8) for a density grid; empty pixels are fully transparent"""
+        index = np.round(self._scale(density, vmax) * (len(self.lut) - 1)).astype(np.intp)
+        image = self.lut[index]
+        image[density <= 1e-3] = 0
+        return image
+    
+    def _zoom_vmax(self, px: np.ndarray, py: np.ndarray, world_size: int) -> float:
+        """Reference density for a zoom level: a high percentile of the per-pixel point counts"""
+        _, counts = np.unique(py * world_size + px, return_counts=True)
+        return self.reference_density(counts)
+    
+    def reference_density(self, pixel_counts: np.ndarray) -> float:
+        """The configured percentile of the occupied pixels' counts (at least 1)"""
+        if not len(pixel_counts):
+            return 1.0
+        return max(float(np.percentile(pixel_counts, self.percentile)), 1.0)
+    
+    def render_tile(self, px: np.ndarray, py: np.ndarray, tx: int, ty: int, vmax: float,
+                    weights: Optional[np.ndarray] = None) -> np.ndarray:
+        """RGBA image of tile (tx, ty) from global pixel coordinates of the points on or near it
+        
+        weights are per-point counts (for pre-binned pixels); points further than the blur
+        radius outside the tile are ignored.
+        """
+        pad = self.blur_radius
+        padded = TILE_SIZE + 2 * pad
+        local_x = px - tx * TILE_SIZE + pad
+        local_y = py - ty * TILE_SIZE + pad
+        inside = (local_x >= 0) & (local_x < padded) & (local_y >= 0) & (local_y < padded)
+        
+        counts = np.bincount(local_y[inside] * padded + local_x[inside],
+                             weights=None if weights is None else weights[inside],
+                             minlength=padded * padded)
+        density = _blur(counts.reshape(padded, padded).astype(np.float64), self.kernel)
+        return self.colorize(density, vmax)
+    
+    def render_zoom(self, x: np.ndarray, y: np.ndarray, zoom: int, output_dir: str) -> int:
+        """Write every non-empty tile of one zoom level; returns the number of tiles written"""
+        world_size = TILE_SIZE << zoom
+        px = np.minimum((x * world_size).astype(np.int64), world_size - 1)
+        py = np.minimum((y * world_size).astype(np.int64), world_size - 1)
+        vmax = self._zoom_vmax(px, py, world_size)
+        
+        # Group points by tile
+        n_tiles = 1 << zoom
+        tile_keys = (px // TILE_SIZE) * n_tiles + (py // TILE_SIZE)
+        order = np.argsort(tile_keys, kind='stable')
+        px, py, tile_keys = px[order], py[order], tile_keys[order]
+        keys, starts = np.unique(tile_keys, return_index=True)
+        ends = np.append(starts[1:], len(tile_keys))
+        ranges = dict(zip(keys.tolist(), zip(starts.tolist(), ends.tolist())))
+        
+        written = 0
+        for key in keys.tolist():
+            tx, ty = divmod(key, n_tiles)
+            index = neighbourhood_index(ranges, tx, ty, n_tiles)
+            
+            tile_dir = os.path.join(output_dir, str(zoom), str(tx))
+            os.makedirs(tile_dir, exist_ok=True)
+            mimage.imsave(os.path.join(tile_dir, f"{ty}.png"),
+                          self.render_tile(px[index], py[index], tx, ty, vmax), format='png')
+            written += 1
+        
+        return written
+    
+    @timed('render_tiles')
+    def render_pyramid(self, lat: np.ndarray, lon: np.ndarray, output_dir: str,
+                       min_zoom: int, max_zoom: int) -> Dict[int, int]:
+        """Render zoom levels min_zoom..max_zoom into output_dir/{z}/{x}/{y}.png
+        
+        The pyramid is built in a temporary directory and swapped in at the end,
+        so a half-written pyramid never replaces a complete one.
+        Returns the number of tiles written per zoom level.
+        """
+        x, y = lonlat_to_mercator(lat, lon)
+        output_dir = output_dir.rstrip(os.sep)
+        parent_dir = os.path.dirname(output_dir) or '.'
+        os.makedirs(parent_dir, exist_ok=True)
+        tmp_dir = tempfile.mkdtemp(prefix=f"{os.path.basename(output_dir)}.tmp_", dir=parent_dir)
+        
+        tiles_per_zoom = {}
+        try:
+            for zoom in range(min_zoom, max_zoom + 1):
+                tiles_per_zoom[zoom] = self.render_zoom(x, y, zoom, tmp_dir) if len(x) else 0
+        except Exception:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+            raise
+        
+        shutil.rmtree(output_dir, ignore_errors=True)
+        os.rename(tmp_dir, output_dir)
+        return tiles_per_zoom
@@ -0,0 +1,195 @@
+"""
+On-demand heatmap tiles rendered from the stored GPS tracks, with memory and disk caches
+"""
+import hashlib
+import os
+import shutil
+import threading
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+
+from .config import Config
+from .tile_renderer import TILE_SIZE, TileRenderer, encode_png, lonlat_to_mercator, neighbourhood_index
+from .tracks import valid_coordinate_mask
+
+
+class DensityPyramid:
+    """Per-pixel point counts for every zoom level from max_zoom down to 0
+    
+    The deepest level bins every point once; each coarser level is derived from the
+    one below by halving pixel coordinates and summing counts, so building the whole
+    pyramid touches the raw points only once. Levels are stored sorted by tile, so the
+    pixels around any tile are a few contiguous slices.
+    """
+    
+    def __init__(self, lat: np.ndarray, lon: np.ndarray, max_zoom: int, renderer: TileRenderer):
+        self.max_zoom = max_zoom
+        self._levels: Dict[int, Dict] = {}
+        self._ranges: Dict[int, Dict[int, Tuple[int, int]]] = {}
+        
+        x, y = lonlat_to_mercator(lat, lon)
+        world_size = TILE_SIZE << max_zoom
+        px = np.minimum((x * world_size).astype(np.int64), world_size - 1)
+        py = np.minimum((y * world_size).astype(np.int64), world_size - 1)
+        counts = np.ones(len(px), dtype=np.int64)
+        
+        for zoom in range(max_zoom, -1, -1):
+            if zoom < max_zoom:
+                px, py = px >> 1, py >> 1
+            px, py, counts = self._merge_pixels(px, py, counts, zoom)
+            self._levels[zoom] = {
+                'px': px,
+                'py': py,
+                'counts': counts,
+                'vmax': renderer.reference_density(counts)
+            }
+    
+    @staticmethod
+    def _merge_pixels(px: np.ndarray, py: np.ndarray, counts: np.ndarray, zoom: int):
+        """Sum counts of identical pixels, ordered by tile key (tx * n_tiles + ty)"""
+        n_tiles = 1 << zoom
+        tile_keys = (px // TILE_SIZE) * n_tiles + (py // TILE_SIZE)
+        pixel_keys = (tile_keys * TILE_SIZE + py % TILE_SIZE) * TILE_SIZE + px % TILE_SIZE
+        unique_keys, inverse = np.unique(pixel_keys, return_inverse=True)
+        merged = np.bincount(inverse, weights=counts).astype(np.int64)
+        
+        tile_keys, local = np.divmod(unique_keys, TILE_SIZE * TILE_SIZE)
+        local_y, local_x = np.divmod(local, TILE_SIZE)
+        tx, ty = np.divmod(tile_keys, n_tiles)
+        return tx * TILE_SIZE + local_x, ty * TILE_SIZE + local_y, merged
+    
+    def _tile_ranges(self, zoom: int) -> Dict[int, Tuple[int, int]]:
+        """Tile key -> [start, end) slice of a level's pixels, built on first use"""
+        if zoom not in self._ranges:
+            level = self._levels[zoom]
+            n_tiles = 1 << zoom
+            tile_keys = (level['px'] // TILE_SIZE) * n_tiles + (level['py'] // TILE_SIZE)
+            keys, starts = np.unique(tile_keys, return_index=True)
+            ends = np.append(starts[1:], len(tile_keys))
+            self._ranges[zoom] = dict(zip(keys.tolist(), zip(starts.tolist(), ends.tolist())))
+        return self._ranges[zoom]
+    
+    def tile_pixels(self, zoom: int, tx: int, ty: int) -> Optional[Tuple[np.ndarray, np.ndarray, np.ndarray, float]]:
+        """(px, py, counts, vmax) for the pixels on and around a tile, or None if there are none"""
+        level = self._levels[zoom]
+        index = neighbourhood_index(self._tile_ranges(zoom), tx, ty, 1 << zoom)
+        if not len(index):
+            return None
+        return level['px'][index], level['py'][index], level['counts'][index], level['vmax']
+
+
+class TileServer:
+    """Serves heatmap PNG tiles for every track in a TrackStore
+    
+    Tiles are looked up in a bounded in-memory LRU, then in a disk cache, and only then
+    rendered from the density pyramid. Everything is keyed by the track store's version,
+    so tiles (and their ETags) change as soon as new activities are stored.
+    """
+    
+    LAYERS = ('heatmap',)
+    
+    def __init__(self, track_store, cache_dir: str = os.path.join('cache', 'tiles'),
+                 memory_tiles: int = Config.TILE_MEMORY_CACHE_SIZE, max_zoom: int = Config.TILE_SERVER_MAX_ZOOM,
+                 renderer: Optional[TileRenderer] = None):
+        self.track_store = track_store
+        self.cache_dir = cache_dir
+        self.memory_tiles = memory_tiles
+        self.max_zoom = max_zoom
+        self.renderer = renderer or TileRenderer()
+        self._lock = threading.Lock()
+        self._memory: 'OrderedDict[Tuple, bytes]' = OrderedDict()
+        self._version: Optional[str] = None
+        self._pyramid: Optional[DensityPyramid] = None
+        self._empty_tile = encode_png(np.zeros((TILE_SIZE, TILE_SIZE, 4), dtype=np.uint8))
+        self.stats = {'memory_hits': 0, 'disk_hits': 0, 'rendered': 0}
+    
+    def _current_version(self) -> str:
+        """Short digest of the track store version, resetting the caches when it changes"""
+        self.track_store.refresh()
+        version = hashlib.sha1(self.track_store.version().encode()).hexdigest()[:12]
+        with self._lock:
+            if version != self._version:
+                self._version = version
+                self._pyramid = None
+                self._memory.clear()
+                self._remove_stale_disk_tiles(version)
+        return version
+    
+    def _remove_stale_disk_tiles(self, version: str) -> None:
+        """Delete disk-cached tiles rendered from older track data"""
+        if not os.path.isdir(self.cache_dir):
+            return
+        for name in os.listdir(self.cache_dir):
+            if name != version:
+                shutil.rmtree(os.path.join(self.cache_dir, name), ignore_errors=True)
+    
+    def _get_pyramid(self) -> DensityPyramid:
+        with self._lock:
+            if self._pyramid is None:
+                _, _, columns = self.track_store.load_columns()
+                valid = valid_coordinate_mask(columns['lat'], columns['lon'])
+                self._pyramid = DensityPyramid(columns['lat'][valid], columns['lon'][valid],
+                                               self.max_zoom, self.renderer)
+            return self._pyramid
+    
+    def is_valid_tile(self, layer: str, z: int, x: int, y: int) -> bool:
+        return layer in self.LAYERS and 0 <= z <= self.max_zoom and 0 <= x < (1 << z) and 0 <= y < (1 << z)
+    
+    def etag(self, layer: str, z: int, x: int, y: int) -> str:
+        """Entity tag for a tile, available without rendering it"""
+        return f"{self._current_version()}-{layer}-{z}-{x}-{y}"
+    
+    def get_tile(self, layer: str, z: int, x: int, y: int) -> Optional[bytes]:
+        """PNG bytes of a tile, or None for an unknown layer or out-of-range coordinates"""
+        if not self.is_valid_tile(layer, z, x, y):
+            return None
+        
+        version = self._current_version()
+        key = (version, layer, z, x, y)
+        with self._lock:
+            if key in self._memory:
+                self._memory.move_to_end(key)
+                self.stats['memory_hits'] += 1
+                return self._memory[key]
+        
+        disk_path = os.path.join(self.cache_dir, version, layer, str(z), str(x), f"{y}.png")
+        png = self._read_disk_tile(disk_path)
+        if png is not None:
+            self.stats['disk_hits'] += 1
+        else:
+            pixels = self._get_pyramid().tile_pixels(z, x, y)
+            if pixels is None:
+                # Nothing to draw; the shared blank tile is neither rendered nor written
+                return self._empty_tile
+            px, py, counts, vmax = pixels
+            png = encode_png(self.renderer.render_tile(px, py, x, y, vmax, weights=counts))
+            self._write_disk_tile(disk_path, png)
+            self.stats['rendered'] += 1
+        
+        with self._lock:
+            self._memory[key] = png
+            while len(self._memory) > self.memory_tiles:
+                self._memory.popitem(last=False)
+        return png
+    
+    @staticmethod
+    def _read_disk_tile(path: str) -> Optional[bytes]:
+        try:
+            with open(path, 'rb') as f:
+                return f.read()
+        except OSError:
+            return None
+    
+    @staticmethod
+    def _write_disk_tile(path: str, png: bytes) -> None:
+        """Write a tile atomically so concurrent readers never see a partial file"""
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp_path = f"{path}.{threading.get_ident()}.tmp"
+            with open(tmp_path, 'wb') as f:
+                f.write(png)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            print(f"Warning: Error writing tile cache {path}: {e}")
@@ -0,0 +1,394 @@
+"""
+Columnar on-disk store for activity GPS streams
+"""
+import errno
+import os
+import shutil
+import tempfile
+import threading
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from .route_pyramid import point_min_zoom
+
+
+class TrackStore:
+    """Activity streams stored as contiguous NumPy columns plus a per-activity offsets index
+    
+    Each flush writes a segment directory holding one .npy file per column
+    (lat, lon, altitude, velocity, distance, time), the route pyramid level of every
+    point, the activity ids, a bitmask of which streams each activity has, and offsets
+    into the point columns. Segments
+    are memory-mapped on read and merged into one once there are too many of them,
+    so loading every GPS point for a heatmap means opening a handful of files.
+    """
+    
+    # column name -> (Strava stream type, dtype)
+    COLUMNS = {
+        'lat': ('latlng', np.float64),
+        'lon': ('latlng', np.float64),
+        'altitude': ('altitude', np.float32),
+        'velocity': ('velocity_smooth', np.float32),
+        'distance': ('distance', np.float32),
+        'time': ('time', np.float32)
+    }
+    STREAM_TYPES = ['latlng', 'altitude', 'velocity_smooth', 'distance', 'time']
+    # Derived per-point column: route pyramid level of each vertex (see route_pyramid)
+    LEVEL_COLUMN = 'min_zoom'
+    
+    def __init__(self, store_dir: str, compact_threshold: int = 8):
+        self.store_dir = store_dir
+        self.compact_threshold = compact_threshold
+        self._lock = threading.RLock()
+        self._segments: List[Dict[str, np.ndarray]] = []
+        self._segment_paths: List[str] = []
+        self._index: Dict[int, Tuple[int, int]] = {}
+        self._pending: Dict[int, Dict[str, np.ndarray]] = {}
+        os.makedirs(store_dir, exist_ok=True)
+        self._load_segments()
+    
+    def _segment_dirs(self) -> List[str]:
+        """Committed segment directories in write order"""
+        names = sorted(name for name in os.listdir(self.store_dir) if name.startswith('seg_'))
+        return [os.path.join(self.store_dir, name) for name in names]
+    
+    def _load_segments(self) -> None:
+        """Memory-map every committed segment and rebuild the id index"""
+        self._segments = []
+        self._segment_paths = []
+        self._index = {}
+        seg_dirs = self._segment_dirs()
+        self._loaded_version = self._version_of(seg_dirs)
+        for seg_dir in seg_dirs:
+            try:
+                segment = {
+                    name: _load_array(os.path.join(seg_dir, f"{name}.npy"))
+                    for name in ['ids', 'offsets', 'present'] + list(self.COLUMNS)
+                }
+            except Exception as e:
+                print(f"Warning: Error reading track store segment {seg_dir}: {e}")
+                continue
+            
+            level_path = os.path.join(seg_dir, f"{self.LEVEL_COLUMN}.npy")
+            if os.path.exists(level_path):
+                segment[self.LEVEL_COLUMN] = _load_array(level_path)
+            else:
+                # Segments written before route pyramids: computed here, persisted on compaction
+                segment[self.LEVEL_COLUMN] = point_min_zoom(segment['offsets'], segment['lat'], segment['lon'])
+            
+            seg_idx = len(self._segments)
+            self._segments.append(segment)
+            self._segment_paths.append(seg_dir)
+            for row, activity_id in enumerate(segment['ids'].tolist()):
+                self._index[activity_id] = (seg_idx, row)
+    
+    @staticmethod
+    def _version_of(seg_dirs: List[str]) -> str:
+        """Segment names plus write times, so numbering that restarts after clear() still changes it"""
+        parts = []
+        for seg_dir in seg_dirs:
+            try:
+                parts.append(f"{os.path.basename(seg_dir)}@{os.stat(seg_dir).st_mtime_ns}")
+            except OSError:
+                continue
+        return ','.join(parts)
+    
+    def version(self) -> str:
+        """Identifier of the committed data on disk; changes whenever a segment is written or compacted"""
+        return self._version_of(self._segment_dirs())
+    
+    def refresh(self) -> bool:
+        """Pick up segments written by another TrackStore on the same directory; returns True if reloaded"""
+        with self._lock:
+            if self.version() == self._loaded_version:
+                return False
+            self._load_segments()
+            return True
+    
+    def __contains__(self, activity_id: int) -> bool:
+        with self._lock:
+            return activity_id in self._index or activity_id in self._pending
+    
+    def __len__(self) -> int:
+        with self._lock:
+            return len(set(self._index) | set(self._pending))
+    
+    def ids(self) -> List[int]:
+        """All stored activity ids"""
+        with self._lock:
+            return sorted(set(self._index) | set(self._pending))
+    
+    @classmethod
+    def streams_to_columns(cls, streams: Dict) -> Dict[str, np.ndarray]:
+        """Convert a Strava key_by_type streams payload into aligned column arrays
+        
+        Columns are aligned to the latlng stream; streams that are missing or of a
+        different length are stored as NaN and flagged absent in the 'present' bitmask.
+        """
+        latlng = streams.get('latlng', {}).get('data') or []
+        n_points = len(latlng)
+        columns = {'present': np.uint8(0)}
+        
+        coords = _to_array(latlng, np.float64, width=2).reshape(n_points, 2)
+        columns['lat'] = coords[:, 0].copy()
+        columns['lon'] = coords[:, 1].copy()
+        if n_points:
+            columns['present'] |= 1
+        
+        for bit, (name, (stream_type, dtype)) in enumerate(list(cls.COLUMNS.items())[2:], start=1):
+            data = streams.get(stream_type, {}).get('data') or []
+            if n_points and len(data) == n_points:
+                columns[name] = _to_array(data, dtype)
+                columns['present'] |= 1 << bit
+            else:
+                columns[name] = np.full(n_points, np.nan, dtype=dtype)
+        
+        return columns
+    
+    def _point_columns(self) -> Dict[str, type]:
+        """Per-point columns of a committed segment and their dtypes"""
+        columns = {name: dtype for name, (_, dtype) in self.COLUMNS.items()}
+        columns[self.LEVEL_COLUMN] = np.uint8
+        return columns
+    
+    def put_streams(self, activity_id: int, streams: Dict) -> None:
+        """Buffer an activity's streams; call flush() to persist them"""
+        columns = self.streams_to_columns(streams)
+        with self._lock:
+            self._pending[activity_id] = columns
+    
+    def put_columns(self, activity_id: int, columns: Dict[str, np.ndarray]) -> None:
+        """Buffer an activity given as aligned column arrays (NaN or missing where a stream is absent)"""
+        lat = np.asarray(columns['lat'], dtype=np.float64)
+        n_points = len(lat)
+        converted = {'present': np.uint8(1 if n_points else 0), 'lat': lat,
+                     'lon': np.asarray(columns['lon'], dtype=np.float64)}
+        for bit, (name, (_, dtype)) in enumerate(list(self.COLUMNS.items())[2:], start=1):
+            values = columns.get(name)
+            if values is not None and len(values) == n_points and n_points and not np.isnan(values).all():
+                converted[name] = np.asarray(values, dtype=dtype)
+                converted['present'] |= 1 << bit
+            else:
+                converted[name] = np.full(n_points, np.nan, dtype=dtype)
+        with self._lock:
+            self._pending[activity_id] = converted
+    
+    def get_columns(self, activity_id: int) -> Optional[Dict[str, np.ndarray]]:
+        """Column arrays (views into the memory map) for one activity, or None if not stored"""
+        with self._lock:
+            if activity_id in self._pending:
+                return self._pending[activity_id]
+            if activity_id not in self._index:
+                return None
+            seg_idx, row = self._index[activity_id]
+            segment = self._segments[seg_idx]
+        
+        start, end = int(segment['offsets'][row]), int(segment['offsets'][row + 1])
+        columns = {name: segment[name][start:end] for name in self._point_columns()}
+        columns['present'] = segment['present'][row]
+        return columns
+    
+    def get_streams(self, activity_id: int) -> Optional[Dict]:
+        """An activity's streams in Strava's key_by_type shape, or None if not stored"""
+        columns = self.get_columns(activity_id)
+        if columns is None:
+            return None
+        
+        present = int(columns['present'])
+        if not present & 1:
+            return {}
+        
+        streams = {'latlng': {'data': np.column_stack([columns['lat'], columns['lon']]).tolist()}}
+        for bit, (name, (stream_type, _)) in enumerate(list(self.COLUMNS.items())[2:], start=1):
+            if present & (1 << bit):
+                values = columns[name]
+                data = values.tolist()
+                if np.isnan(values).any():
+                    data = [None if v != v else v for v in data]
+                streams[stream_type] = {'data': data}
+        return streams
+    
+    def load_columns(self, activity_ids: Optional[List[int]] = None) -> Tuple[np.ndarray, np.ndarray, Dict[str, np.ndarray]]:
+        """Load stored activities as (ids, offsets, columns) with one contiguous array per column
+        
+        With a single committed segment and no id filter the columns are the memory-mapped
+        arrays themselves; otherwise the requested rows are gathered into new arrays.
+        """
+        self.flush()
+        with self._lock:
+            if activity_ids is None:
+                if len(self._segments) == 1:
+                    segment = self._segments[0]
+                    columns = {name: segment[name] for name in self._point_columns()}
+                    columns['present'] = segment['present']
+                    return segment['ids'], segment['offsets'], columns
+                activity_ids = list(self._index)
+            
+            found = [(activity_id, self._index[activity_id]) for activity_id in activity_ids
+                     if activity_id in self._index]
+            segments = self._segments
+        
+        ids = np.array([activity_id for activity_id, _ in found], dtype=np.int64)
+        lengths = np.zeros(len(found), dtype=np.int64)
+        starts = np.zeros(len(found), dtype=np.int64)
+        seg_of = np.zeros(len(found), dtype=np.int64)
+        present = np.zeros(len(found), dtype=np.uint8)
+        for i, (_, (seg_idx, row)) in enumerate(found):
+            offsets = segments[seg_idx]['offsets']
+            starts[i] = offsets[row]
+            lengths[i] = offsets[row + 1] - offsets[row]
+            seg_of[i] = seg_idx
+            present[i] = segments[seg_idx]['present'][row]
+        
+        offsets = np.zeros(len(found) + 1, dtype=np.int64)
+        np.cumsum(lengths, out=offsets[1:])
+        
+        columns = {}
+        for name, dtype in self._point_columns().items():
+            out = np.empty(offsets[-1], dtype=dtype)
+            for seg_idx, segment in enumerate(segments):
+                mask = seg_of == seg_idx
+                if not mask.any():
+                    continue
+                src = _ranges_to_index(starts[mask], lengths[mask])
+                dst = _ranges_to_index(offsets[:-1][mask], lengths[mask])
+                out[dst] = segment[name][src]
+            columns[name] = out
+        columns['present'] = present
+        
+        return ids, offsets, columns
+    
+    def flush(self) -> None:
+        """Write buffered activities as a new segment, compacting if there are too many segments"""
+        with self._lock:
+            if not self._pending:
+                return
+            pending = self._pending
+            self._pending = {}
+            
+            ids = list(pending)
+            lengths = [len(pending[activity_id]['lat']) for activity_id in ids]
+            offsets = np.zeros(len(ids) + 1, dtype=np.int64)
+            np.cumsum(lengths, out=offsets[1:])
+            
+            arrays = {
+                'ids': np.array(ids, dtype=np.int64),
+                'offsets': offsets,
+                'present': np.array([pending[activity_id]['present'] for activity_id in ids], dtype=np.uint8)
+            }
+            for name, (_, dtype) in self.COLUMNS.items():
+                arrays[name] = np.concatenate(
+                    [pending[activity_id][name] for activity_id in ids]
+                ).astype(dtype, copy=False)
+            arrays[self.LEVEL_COLUMN] = point_min_zoom(offsets, arrays['lat'], arrays['lon'])
+            
+            try:
+                self._write_segment(arrays)
+            except Exception as e:
+                print(f"Warning: Error writing track store segment: {e}")
+                self._pending.update(pending)
+                return
+            
+            self._load_segments()
+            if len(self._segments) > self.compact_threshold:
+                self.compact()
+    
+    def compact(self) -> None:
+        """Merge the loaded segments into one (later writes of an activity win)
+        
+        Only segments this instance has loaded are merged and removed; segments another
+        writer commits in the meantime are left alone and picked up on the next load.
+        """
+        with self._lock:
+            self.flush()
+            if len(self._segments) <= 1:
+                return
+            
+            merged_dirs = list(self._segment_paths)
+            ids, offsets, columns = self.load_columns(list(self._index))
+            arrays = {'ids': ids, 'offsets': offsets}
+            arrays.update(columns)
+            
+            self._write_segment(arrays)
+            # Drop the memory maps before removing the files underneath them
+            self._segments = []
+            self._segment_paths = []
+            for seg_dir in merged_dirs:
+                shutil.rmtree(seg_dir, ignore_errors=True)
+            self._load_segments()
+    
+    def _write_segment(self, arrays: Dict[str, np.ndarray]) -> str:
+        """Write a segment atomically: fill a temporary directory, then rename it into place
+        
+        If another writer commits the same segment number first, the next free number is used.
+        Returns the committed segment directory.
+        """
+        tmp_dir = tempfile.mkdtemp(prefix='tmp_', dir=self.store_dir)
+        try:
+            for name, array in arrays.items():
+                np.save(os.path.join(tmp_dir, f"{name}.npy"), np.ascontiguousarray(array))
+            
+            existing = self._segment_dirs()
+            number = int(os.path.basename(existing[-1])[4:]) + 1 if existing else 1
+            while True:
+                final_dir = os.path.join(self.store_dir, f"seg_{number:06d}")
+                try:
+                    os.rename(tmp_dir, final_dir)
+                    return final_dir
+                except OSError as e:
+                    if e.errno not in (errno.EEXIST, errno.ENOTEMPTY):
+                        raise
+                    number += 1
+        except Exception:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+            raise
+    
+    def clear(self) -> None:
+        """Remove every stored track"""
+        with self._lock:
+            self._segments = []
+            self._index = {}
+            self._pending = {}
+            for name in os.listdir(self.store_dir):
+                shutil.rmtree(os.path.join(self.store_dir, name), ignore_errors=True)
+
+
+def _load_array(path: str) -> np.ndarray:
+    """Memory-map a .npy file (empty arrays cannot be mapped and are read normally)"""
+    try:
+        return np.load(path, mmap_mode='r')
+    except ValueError:
+        return np.load(path)
+
+
+def _to_array(values: list, dtype, width: int = 1) -> np.ndarray:
+    """Convert a stream's data list to a flat array, mapping None and malformed entries to NaN"""
+    try:
+        array = np.asarray(values, dtype=dtype)
+        if array.shape == ((len(values), width) if width > 1 else (len(values),)):
+            return array.ravel()
+    except (TypeError, ValueError):
+        pass
+    
+    blank = [np.nan] * width
+    rows = []
+    for value in values:
+        items = list(value) if isinstance(value, (list, tuple)) else [value]
+        valid = len(items) == width and all(isinstance(v, (int, float)) for v in items)
+        rows.extend(items if valid else blank)
+    return np.asarray(rows, dtype=dtype)
+
+
+def _ranges_to_index(starts: np.ndarray, lengths: np.ndarray) -> np.ndarray:
+    """Concatenate the index ranges [start, start + length) without a Python loop"""
+    total = int(lengths.sum())
+    if total == 0:
+        return np.empty(0, dtype=np.int64)
+    nonempty = lengths > 0
+    starts, lengths = starts[nonempty], lengths[nonempty]
+    steps = np.ones(total, dtype=np.int64)
+    boundaries = np.cumsum(lengths)[:-1]
+    steps[0] = starts[0]
+    steps[boundaries] = starts[1:] - (starts[:-1] + lengths[:-1] - 1)
+    return np.cumsum(steps)
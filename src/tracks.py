@@ -0,0 +1,422 @@
+"""
+Array-backed activity track model shared by the API client and the map builders
+"""
+import json
+import os
+from typing import Dict, Iterator, List, Optional, Sequence, Union
+
+import numpy as np
+
+from .instrumentation import span
+
+# Minimum valid GPS points for a meaningful visualization
+MIN_TRACK_POINTS = 10
+
+STREAM_FIELDS = ('altitude', 'velocity', 'distance', 'time')
+SUMMARIES_FILE = 'summaries.json'  # DatasetSummary cache written next to a saved collection's arrays
+
+
+def valid_coordinate_mask(lat: np.ndarray, lon: np.ndarray) -> np.ndarray:
+    """Points with finite coordinates inside the valid latitude/longitude ranges"""
+    with np.errstate(invalid='ignore'):
+        return (np.isfinite(lat) & np.isfinite(lon) &
+                (lat >= -90) & (lat <= 90) &
+                (lon >= -180) & (lon <= 180))
+
+
+def _stream_array(values, n_points: int, dtype=np.float32) -> np.ndarray:
+    """Convert a stream to an array aligned with the track, NaN-filled when missing or misaligned"""
+    if values is None or len(values) != n_points:
+        return np.full(n_points, np.nan, dtype=dtype)
+    return np.asarray(values, dtype=dtype)
+
+
+def _level_array(values, n_points: int) -> Optional[np.ndarray]:
+    """Per-point uint8 pyramid levels, or None when missing or misaligned"""
+    if values is None or len(values) != n_points:
+        return None
+    return np.asarray(values, dtype=np.uint8)
+
+
+class ActivityTrack:
+    """One activity's GPS track with its streams as NumPy arrays
+    
+    lat/lon are float64; altitude, velocity (m/s), distance (m) and time (s) are
+    float32 arrays of the same length, NaN where the stream or a sample is missing.
+    """
+    
+    __slots__ = ('id', 'lat', 'lon', 'altitude', 'velocity', 'distance', 'time', 'start_time', 'min_zoom')
+    
+    def __init__(self, activity_id, lat, lon, altitude=None, velocity=None, distance=None, time=None,
+                 start_time: Optional[float] = None, min_zoom=None):
+        self.id = activity_id
+        self.lat = np.asarray(lat, dtype=np.float64)
+        self.lon = np.asarray(lon, dtype=np.float64)
+        n_points = len(self.lat)
+        self.altitude = _stream_array(altitude, n_points)
+        self.velocity = _stream_array(velocity, n_points)
+        self.distance = _stream_array(distance, n_points)
+        self.time = _stream_array(time, n_points)
+        self.start_time = start_time  # epoch seconds, if known
+        # Route pyramid level of each vertex (see route_pyramid), when precomputed by the TrackStore
+        self.min_zoom = _level_array(min_zoom, n_points)
+    
+    def __len__(self) -> int:
+        return len(self.lat)
+    
+    def __repr__(self) -> str:
+        return f"ActivityTrack(id={self.id!r}, points={len(self)})"
+    
+    @property
+    def coords(self) -> np.ndarray:
+        """(N, 2) array of [lat, lon] rows"""
+        return np.column_stack([self.lat, self.lon])
+    
+    def has_stream(self, name: str) -> bool:
+        """Whether the track has any valid samples of a stream"""
+        return bool(np.isfinite(getattr(self, name)).any())
+    
+    @classmethod
+    def from_columns(cls, activity_id, columns: Dict[str, np.ndarray],
+                     start_time: Optional[float] = None) -> 'ActivityTrack':
+        """Build a validated track from aligned column arrays, dropping invalid GPS points"""
+        lat = np.asarray(columns['lat'], dtype=np.float64)
+        lon = np.asarray(columns['lon'], dtype=np.float64)
+        mask = valid_coordinate_mask(lat, lon)
+        streams = {}
+        for name in STREAM_FIELDS:
+            values = columns.get(name)
+            streams[name] = None if values is None else np.asarray(values, dtype=np.float32)[mask]
+        min_zoom = columns.get('min_zoom')
+        return cls(activity_id, lat[mask], lon[mask], start_time=start_time,
+                   min_zoom=None if min_zoom is None else np.asarray(min_zoom)[mask], **streams)
+    
+    @classmethod
+    def from_activity(cls, activity: Dict) -> 'ActivityTrack':
+        """Build a track from the dict format returned by get_activities_with_detailed_streams"""
+        coords = activity.get('coordinates', [])
+        try:
+            coords = np.array(coords, dtype=np.float64).reshape(-1, 2)
+        except (TypeError, ValueError):
+            # Ragged input: fall back to keeping only [lat, lon] pairs
+            coords = np.array([c[:2] for c in coords if len(c) == 2], dtype=np.float64).reshape(-1, 2)
+        
+        streams = {}
+        for name in STREAM_FIELDS:
+            values = activity.get(name)
+            if values is not None and len(values) == len(coords):
+                # None samples become NaN
+                values = np.array(values, dtype=np.float32)
+            streams[name] = values
+        
+        mask = valid_coordinate_mask(coords[:, 0], coords[:, 1])
+        if not mask.all():
+            coords = coords[mask]
+            streams = {name: (values[mask] if isinstance(values, np.ndarray) else None)
+                       for name, values in streams.items()}
+        
+        return cls(activity.get('id'), coords[:, 0], coords[:, 1],
+                   start_time=activity.get('start_time'), **streams)
+    
+    def to_dict(self) -> Dict:
+        """Convert back to the list-based dict format"""
+        activity = {'id': self.id, 'coordinates': self.coords.tolist()}
+        for name in STREAM_FIELDS:
+            values = getattr(self, name)
+            activity[name] = [None if v != v else v for v in values.tolist()] if self.has_stream(name) else []
+        return activity
+
+
+class DatasetSummary:
+    """Bounds, centers, zoom and counts for a collection, computed together in one pass
+    
+    Centers are [lat, lon] lists and are None (like bounds) when there are no points,
+    so callers can fall back to their own defaults.
+    """
+    
+    # (coordinate span in degrees, zoom level) from largest to smallest area
+    ZOOM_LEVELS = [
+        (2.0, 8),    # Very large area (multiple cities)
+        (1.0, 9),    # Large area (city-wide)
+        (0.5, 10),   # Medium area (multiple neighborhoods)
+        (0.2, 11),   # Small area (neighborhood)
+        (0.1, 12),   # Very small area (few blocks)
+        (0.05, 13)   # Tiny area (single area)
+    ]
+    MAX_ZOOM = 14    # Extremely small area
+    
+    def __init__(self, activity_count: int, point_count: int, bounds: Optional[Dict] = None,
+                 density_center: Optional[List[float]] = None):
+        self.activity_count = activity_count
+        self.point_count = point_count
+        self.bounds = bounds
+        self.density_center = density_center
+    
+    def __repr__(self) -> str:
+        return f"DatasetSummary(activities={self.activity_count}, points={self.point_count}, zoom={self.zoom})"
+    
+    def to_dict(self) -> Dict:
+        return {'activity_count': self.activity_count, 'point_count': self.point_count,
+                'bounds': self.bounds, 'density_center': self.density_center}
+    
+    @classmethod
+    def from_dict(cls, data: Dict) -> 'DatasetSummary':
+        return cls(data['activity_count'], data['point_count'], data.get('bounds'), data.get('density_center'))
+    
+    @property
+    def mean_center(self) -> Optional[List[float]]:
+        if self.bounds is None:
+            return None
+        return [self.bounds['center_lat'], self.bounds['center_lon']]
+    
+    @property
+    def zoom(self) -> Optional[int]:
+        """Zoom level that fits the larger of the latitude/longitude spans"""
+        if self.bounds is None:
+            return None
+        max_span = max(self.bounds['max_lat'] - self.bounds['min_lat'],
+                       self.bounds['max_lon'] - self.bounds['min_lon'])
+        for span, zoom in self.ZOOM_LEVELS:
+            if max_span > span:
+                return zoom
+        return self.MAX_ZOOM
+    
+    @classmethod
+    def compute(cls, lat: np.ndarray, lon: np.ndarray, activity_count: int, grid_size: int = 50) -> 'DatasetSummary':
+        """Summarize the given points; the density center is the busiest cell of a grid_size grid"""
+        if not len(lat):
+            return cls(activity_count, 0)
+        
+        min_lat, max_lat = float(lat.min()), float(lat.max())
+        min_lon, max_lon = float(lon.min()), float(lon.max())
+        bounds = {
+            'min_lat': min_lat,
+            'max_lat': max_lat,
+            'min_lon': min_lon,
+            'max_lon': max_lon,
+            'center_lat': float(lat.mean()),
+            'center_lon': float(lon.mean())
+        }
+        
+        # Density grid over the bounds just computed
+        lat_bins = np.linspace(min_lat, max_lat, grid_size)
+        lon_bins = np.linspace(min_lon, max_lon, grid_size)
+        density_grid, _, _ = np.histogram2d(lat, lon, bins=[lat_bins, lon_bins])
+        
+        # Center of the grid cell with maximum density
+        row, col = np.unravel_index(np.argmax(density_grid), density_grid.shape)
+        density_center = [float((lat_bins[row] + lat_bins[row + 1]) / 2),
+                          float((lon_bins[col] + lon_bins[col + 1]) / 2)]
+        
+        return cls(activity_count, len(lat), bounds, density_center)
+
+
+class TrackCollection:
+    """Many tracks stored as concatenated point arrays plus per-activity offsets
+    
+    Track i owns points offsets[i]:offsets[i + 1] of lat, lon and the stream arrays,
+    so whole-dataset operations run on a few contiguous arrays instead of per-point lists.
+    """
+    
+    def __init__(self, ids, offsets, lat, lon, altitude=None, velocity=None, distance=None, time=None,
+                 start_times=None, min_zoom=None):
+        self.ids = np.asarray(ids)
+        self.offsets = np.asarray(offsets, dtype=np.int64)
+        self.lat = np.asarray(lat, dtype=np.float64)
+        self.lon = np.asarray(lon, dtype=np.float64)
+        n_points = len(self.lat)
+        self.altitude = _stream_array(altitude, n_points)
+        self.velocity = _stream_array(velocity, n_points)
+        self.distance = _stream_array(distance, n_points)
+        self.time = _stream_array(time, n_points)
+        if start_times is None:
+            start_times = np.full(len(self.ids), np.nan)
+        self.start_times = np.asarray(start_times, dtype=np.float64)
+        self.min_zoom = _level_array(min_zoom, n_points)
+        self._activity_index = None
+        self._summaries = {}
+        self._route_pyramid = None
+    
+    @classmethod
+    def empty(cls) -> 'TrackCollection':
+        return cls(np.empty(0, dtype=np.int64), np.zeros(1, dtype=np.int64), np.empty(0), np.empty(0))
+    
+    @classmethod
+    def from_tracks(cls, tracks: Sequence[ActivityTrack]) -> 'TrackCollection':
+        """Concatenate individual tracks into one collection"""
+        tracks = list(tracks)
+        if not tracks:
+            return cls.empty()
+        
+        lengths = np.array([len(track) for track in tracks], dtype=np.int64)
+        offsets = np.zeros(len(tracks) + 1, dtype=np.int64)
+        np.cumsum(lengths, out=offsets[1:])
+        
+        ids = [track.id for track in tracks]
+        ids = np.array(ids, dtype=np.int64) if all(isinstance(i, (int, np.integer)) for i in ids) else np.array(ids, dtype=object)
+        start_times = [np.nan if track.start_time is None else track.start_time for track in tracks]
+        
+        arrays = {
+            name: np.concatenate([getattr(track, name) for track in tracks])
+            for name in ('lat', 'lon') + STREAM_FIELDS
+        }
+        if all(track.min_zoom is not None for track in tracks):
+            arrays['min_zoom'] = np.concatenate([track.min_zoom for track in tracks])
+        return cls(ids, offsets, start_times=start_times, **arrays)
+    
+    @classmethod
+    def from_activities(cls, activities: Sequence) -> 'TrackCollection':
+        """Build a collection from activity dicts and/or ActivityTrack objects"""
+        return cls.from_tracks([
+            ActivityTrack.from_activity(activity) if isinstance(activity, dict) else activity
+            for activity in activities
+        ])
+    
+    @classmethod
+    def coerce(cls, data: Union['TrackCollection', Sequence]) -> 'TrackCollection':
+        """Accept a TrackCollection as-is, or convert a list of activity dicts/tracks"""
+        if isinstance(data, (list, tuple)):
+            return cls.from_activities(data)
+        if data is None:
+            return cls.empty()
+        return data
+    
+    def __len__(self) -> int:
+        return len(self.ids)
+    
+    def __iter__(self) -> Iterator[ActivityTrack]:
+        for i in range(len(self)):
+            yield self[i]
+    
+    def __getitem__(self, i: int) -> ActivityTrack:
+        """A track view (no copies) of activity i"""
+        if i < 0:
+            i += len(self)
+        start, end = self.offsets[i], self.offsets[i + 1]
+        start_time = self.start_times[i]
+        return ActivityTrack(
+            self.ids[i].item() if hasattr(self.ids[i], 'item') else self.ids[i],
+            self.lat[start:end], self.lon[start:end],
+            altitude=self.altitude[start:end], velocity=self.velocity[start:end],
+            distance=self.distance[start:end], time=self.time[start:end],
+            start_time=None if np.isnan(start_time) else float(start_time),
+            min_zoom=None if self.min_zoom is None else self.min_zoom[start:end]
+        )
+    
+    def __repr__(self) -> str:
+        return f"TrackCollection(activities={len(self)}, points={self.point_count})"
+    
+    @property
+    def point_count(self) -> int:
+        return len(self.lat)
+    
+    @property
+    def lengths(self) -> np.ndarray:
+        """Number of points in each track"""
+        return np.diff(self.offsets)
+    
+    @property
+    def coords(self) -> np.ndarray:
+        """(N, 2) array of [lat, lon] rows for every point"""
+        return np.column_stack([self.lat, self.lon])
+    
+    @property
+    def activity_index(self) -> np.ndarray:
+        """Index of the owning track for every point"""
+        if self._activity_index is None:
+            self._activity_index = np.repeat(np.arange(len(self)), self.lengths)
+        return self._activity_index
+    
+    @property
+    def point_index(self) -> np.ndarray:
+        """Position of every point within its own track"""
+        return np.arange(self.point_count) - np.repeat(self.offsets[:-1], self.lengths)
+    
+    def summary(self, grid_size: int = 50) -> DatasetSummary:
+        """Dataset summary (bounds, centers, zoom, counts), computed once and then reused"""
+        if grid_size not in self._summaries:
+            with span('precompute_geometry', step='dataset_summary'):
+                self._summaries[grid_size] = DatasetSummary.compute(self.lat, self.lon, len(self), grid_size)
+        return self._summaries[grid_size]
+    
+    def subset(self, indices) -> 'TrackCollection':
+        """A new collection holding the given tracks (by position), in that order"""
+        indices = np.asarray(indices)
+        if indices.dtype == bool:
+            indices = np.flatnonzero(indices)
+        indices = indices.astype(np.int64, copy=False)
+        lengths = self.lengths[indices]
+        offsets = np.zeros(len(indices) + 1, dtype=np.int64)
+        np.cumsum(lengths, out=offsets[1:])
+        
+        point_idx = np.repeat(self.offsets[:-1][indices] - offsets[:-1], lengths) + np.arange(offsets[-1])
+        return TrackCollection(
+            self.ids[indices], offsets, self.lat[point_idx], self.lon[point_idx],
+            altitude=self.altitude[point_idx], velocity=self.velocity[point_idx],
+            distance=self.distance[point_idx], time=self.time[point_idx],
+            start_times=self.start_times[indices],
+            min_zoom=None if self.min_zoom is None else self.min_zoom[point_idx]
+        )
+    
+    def head(self, n: int) -> 'TrackCollection':
+        """The first n tracks"""
+        return self.subset(np.arange(min(n, len(self))))
+    
+    def take_points(self, mask: np.ndarray) -> 'TrackCollection':
+        """A new collection with the same tracks holding only the points selected by a boolean mask"""
+        point_idx = np.flatnonzero(mask)
+        lengths = np.bincount(self.activity_index[point_idx], minlength=len(self))
+        offsets = np.zeros(len(self) + 1, dtype=np.int64)
+        np.cumsum(lengths, out=offsets[1:])
+        return TrackCollection(
+            self.ids, offsets, self.lat[point_idx], self.lon[point_idx],
+            altitude=self.altitude[point_idx], velocity=self.velocity[point_idx],
+            distance=self.distance[point_idx], time=self.time[point_idx],
+            start_times=self.start_times,
+            min_zoom=None if self.min_zoom is None else self.min_zoom[point_idx]
+        )
+    
+    ARRAY_FIELDS = ('ids', 'offsets', 'lat', 'lon') + STREAM_FIELDS + ('start_times', 'min_zoom')
+    
+    def save(self, directory: str) -> None:
+        """Write every array as a .npy file, so other processes can memory-map the collection
+        
+        Dataset summaries computed so far are saved too, so loading processes reuse them.
+        """
+        os.makedirs(directory, exist_ok=True)
+        for name in self.ARRAY_FIELDS:
+            if getattr(self, name) is not None:
+                np.save(os.path.join(directory, f"{name}.npy"), getattr(self, name),
+                        allow_pickle=self.ids.dtype == object)
+        summaries_path = os.path.join(directory, SUMMARIES_FILE)
+        if self._summaries:
+            with open(summaries_path, 'w') as f:
+                json.dump({str(grid_size): summary.to_dict() for grid_size, summary in self._summaries.items()}, f)
+        elif os.path.exists(summaries_path):
+            os.remove(summaries_path)
+    
+    @classmethod
+    def load(cls, directory: str, mmap_mode: Optional[str] = 'r') -> 'TrackCollection':
+        """Open a collection written by save(); arrays are memory-mapped (read-only) by default"""
+        arrays = {}
+        for name in cls.ARRAY_FIELDS:
+            path = os.path.join(directory, f"{name}.npy")
+            if name == 'min_zoom' and not os.path.exists(path):
+                continue
+            try:
+                arrays[name] = np.load(path, mmap_mode=mmap_mode)
+            except ValueError:
+                # Object arrays (non-integer ids) and empty arrays cannot be memory-mapped
+                arrays[name] = np.load(path, allow_pickle=True)
+        collection = cls(**arrays)
+        
+        summaries_path = os.path.join(directory, SUMMARIES_FILE)
+        if os.path.exists(summaries_path):
+            with open(summaries_path, 'r') as f:
+                collection._summaries = {int(grid_size): DatasetSummary.from_dict(summary)
+                                         for grid_size, summary in json.load(f).items()}
+        return collection
+    
+    def to_activities(self) -> List[Dict]:
+        """Convert to the list-of-dicts format"""
+        return [track.to_dict() for track in self]
@@ -0,0 +1,95 @@
+"""
+Heatmap data for one map viewport: the stored points inside it, binned at the zoom's resolution
+"""
+from typing import Dict, Optional, Sequence
+
+import numpy as np
+
+from .config import Config
+from .spatial_index import SpatialIndex
+from .tile_renderer import TILE_SIZE, lonlat_to_mercator
+
+MAX_ZOOM = 22
+
+# Largest dense count grid allocated while binning (cells are coarsened beyond it)
+MAX_GRID_CELLS = 1 << 20
+
+
+def mercator_to_lonlat(x: np.ndarray, y: np.ndarray):
+    """Inverse of lonlat_to_mercator: (lat, lon) of normalized Web Mercator x/y"""
+    lon = np.asarray(x) * 360.0 - 180.0
+    lat = np.degrees(np.arctan(np.sinh(np.pi * (1.0 - 2.0 * np.asarray(y)))))
+    return lat, lon
+
+
+def activity_time_mask(ids: np.ndarray, start_times: Dict[int, float], start: Optional[float] = None,
+                       end: Optional[float] = None) -> Optional[np.ndarray]:
+    """Which activities started within [start, end) (epoch seconds), or None without a range
+    
+    Activities with an unknown start time are left out of any time range.
+    """
+    if start is None and end is None:
+        return None
+    times = np.array([start_times.get(int(activity_id), np.nan) for activity_id in ids], dtype=np.float64)
+    with np.errstate(invalid='ignore'):
+        mask = ~np.isnan(times)
+        if start is not None:
+            mask &= times >= start
+        if end is not None:
+            mask &= times < end
+    return mask
+
+
+def viewport_cells(index: SpatialIndex, bbox: Sequence[float], zoom: int,
+                   activity_mask: Optional[np.ndarray] = None, cell_pixels: int = Config.VIEWPORT_CELL_PIXELS,
+                   max_cells: int = Config.VIEWPORT_MAX_CELLS) -> Dict:
+    """Point counts of the non-empty cells of a viewport, for a client-side heatmap layer
+    
+    bbox is (min_lat, min_lon, max_lat, max_lon). Cells are squares of cell_pixels screen
+    pixels at the zoom level, aligned to the Web Mercator pixel grid so neighbouring
+    viewports share cell boundaries; they are doubled in size until at most max_cells are
+    non-empty. activity_mask (one bool per index.ids) restricts the points to some activities.
+    Each cell is returned as [lat, lon, count] at its center.
+    """
+    min_lat, min_lon, max_lat, max_lon = (float(v) for v in bbox)
+    if min_lat > max_lat or min_lon > max_lon:
+        raise ValueError("Bounding box must be min_lat,min_lon,max_lat,max_lon")
+    if not 0 <= zoom <= MAX_ZOOM:
+        raise ValueError(f"Zoom must be between 0 and {MAX_ZOOM}")
+    
+    point_idx = index.points_in_bbox(min_lat, min_lon, max_lat, max_lon)
+    if activity_mask is not None:
+        point_idx = point_idx[activity_mask[index.point_activity[point_idx]]]
+    
+    world_size = TILE_SIZE << zoom
+    x, y = lonlat_to_mercator(index.point_lat[point_idx], index.point_lon[point_idx])
+    px, py = x * world_size, y * world_size
+    # Viewport corners in pixels: north-west is the top-left
+    left, top = (v * world_size for v in lonlat_to_mercator(max_lat, min_lon))
+    right, bottom = (v * world_size for v in lonlat_to_mercator(min_lat, max_lon))
+    
+    cell = cell_pixels
+    while True:
+        first_col, first_row = left // cell, top // cell
+        n_cols = int(right // cell - first_col) + 1
+        n_rows = int(bottom // cell - first_row) + 1
+        if n_cols * n_rows <= MAX_GRID_CELLS:
+            cols = (px // cell - first_col).astype(np.int64)
+            rows = (py // cell - first_row).astype(np.int64)
+            counts = np.bincount(rows * n_cols + cols, minlength=n_cols * n_rows)
+            occupied = np.flatnonzero(counts)
+            if len(occupied) <= max_cells:
+                break
+        cell *= 2
+    
+    rows, cols = np.divmod(occupied, n_cols)
+    lat, lon = mercator_to_lonlat((first_col + cols + 0.5) * cell / world_size,
+                                  (first_row + rows + 0.5) * cell / world_size)
+    counts = counts[occupied]
+    return {
+        'zoom': zoom,
+        'cell_pixels': int(cell),
+        'point_count': int(len(point_idx)),
+        'max_count': int(counts.max()) if len(counts) else 0,
+        'cells': [list(values) for values in zip(np.round(lat, 6).tolist(), np.round(lon, 6).tolist(), counts.tolist())]
+    }
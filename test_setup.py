@@ -6,11 +6,8 @@ import os
 import sys
 from dotenv import load_dotenv
 
-# Add src directory to path
-sys.path.append(os.path.join(os.path.dirname(__file__), 'src'))
-
-from strava_api import StravaAPI
-from config import Config, validate_credentials
+from src.strava_api import StravaAPI
+from src.config import Config, validate_credentials
 
 
 def test_strava_connection():
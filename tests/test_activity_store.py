@@ -0,0 +1,140 @@
+import os
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from src.activity_store import ActivityStore, clear_activity_stores
+from src.config import Config
+from src.strava_api import StravaAPI
+
+NOW = datetime.now(timezone.utc)
+
+
+def _activity(activity_id, days_ago, activity_type='Ride'):
+    return {
+        'id': activity_id,
+        'type': activity_type,
+        'start_date': (NOW - timedelta(days=days_ago)).strftime('%Y-%m-%dT%H:%M:%SZ'),
+        'distance': 20000.0,
+        'moving_time': 3600,
+        'average_speed': 5.5,
+        'map': {'summary_polyline': '_p~iF~ps|U_ulLnnqC'}
+    }
+
+
+class FakeListing:
+    """Stands in for StravaAPI.get_activities over a mutable list of the athlete's activities"""
+    
+    def __init__(self, activities):
+        self.activities = list(activities)
+        self.calls = []
+    
+    def __call__(self, limit=200, page=1, after=None, before=None):
+        self.calls.append((after, before))
+        listed = [activity for activity in self.activities
+                  if (after is None or _start(activity) > after) and
+                  (before is None or _start(activity) < before)]
+        listed.sort(key=_start)
+        return listed[(page - 1) * limit:page * limit]
+
+
+def _start(activity):
+    return datetime.fromisoformat(activity['start_date'].replace('Z', '+00:00'))
+
+
+@pytest.fixture
+def api(monkeypatch, tmp_path):
+    monkeypatch.chdir(tmp_path)
+    api = StravaAPI('id', 'secret', 'token')
+    api._athlete_id = 7
+    api.listing = FakeListing([_activity(1, 300), _activity(2, 40), _activity(3, 10),
+                               _activity(4, 2, activity_type='Run')])
+    api.get_activities = api.listing
+    return api
+
+
+def _stored_ids(store):
+    return sorted(int(key) for key in store.activities)
+
+
+def test_first_sync_lists_the_window_once(api):
+    store = api.sync_activities(days_back=60)
+    
+    assert _stored_ids(store) == [2, 3]
+    assert api.listing.calls == [(store.synced_since, None)]
+    # The high-water mark covers non-cycling activities too
+    assert store.high_water_mark == _start(api.listing.activities[3])
+    
+    reloaded = ActivityStore(api.cache_manager.cache_dir, 7)
+    assert _stored_ids(reloaded) == [2, 3]
+    assert reloaded.high_water_mark == store.high_water_mark
+    assert reloaded.synced_since == store.synced_since
+
+
+def test_later_sync_relists_only_the_trailing_window(api):
+    api.sync_activities(days_back=60)
+    api.listing.calls.clear()
+    api.listing.activities.append(_activity(5, 1))
+    
+    store = api.sync_activities(days_back=60)
+    
+    assert _stored_ids(store) == [2, 3, 5]
+    (after, before), = api.listing.calls
+    assert before is None
+    relist_start = NOW - timedelta(days=Config.SYNC_RELIST_DAYS)
+    assert abs((after - relist_start).total_seconds()) < 60
+
+
+def test_relisting_picks_up_late_uploads_and_drops_deletions(api):
+    api.sync_activities(days_back=60)
+    
+    # A ride recorded five days ago but uploaded after the sync, and a deleted one
+    api.listing.activities.append(_activity(6, 5))
+    api.listing.activities = [activity for activity in api.listing.activities if activity['id'] != 3]
+    store = api.sync_activities(days_back=60)
+    
+    assert _stored_ids(store) == [2, 6]
+
+
+def test_deletions_before_the_relist_window_are_kept(api):
+    api.sync_activities(days_back=60)
+    api.listing.activities = [activity for activity in api.listing.activities if activity['id'] != 2]
+    
+    store = api.sync_activities(days_back=60)
+    
+    assert 2 in _stored_ids(store)
+
+
+def test_longer_window_backfills_only_the_older_range(api):
+    first = api.sync_activities(days_back=60)
+    synced_since = first.synced_since
+    api.listing.calls.clear()
+    
+    store = api.sync_activities(days_back=365)
+    
+    assert _stored_ids(store) == [1, 2, 3]
+    assert api.listing.calls[0][1] == synced_since
+    assert store.synced_since < synced_since
+    
+    frame = api.get_all_cycling_activities(days_back=60)
+    assert sorted(frame['id']) == [2, 3]
+
+
+def test_replace_window_only_touches_activities_after_its_start():
+    store = ActivityStore('unused', 1)
+    store.merge([_activity(1, 30), _activity(2, 10), _activity(3, 5)])
+    
+    added, removed = store.replace_window(NOW - timedelta(days=14), [_activity(3, 5), _activity(4, 3)])
+    
+    assert (added, removed) == (1, 1)
+    assert _stored_ids(store) == [1, 3, 4]
+
+
+def test_clear_cache_deletes_the_activity_store(api):
+    api.sync_activities(days_back=60)
+    assert os.path.exists(ActivityStore(api.cache_manager.cache_dir, 7).path)
+    
+    api.clear_cache()
+    
+    assert ActivityStore(api.cache_manager.cache_dir, 7).activities == {}
+    assert clear_activity_stores(api.cache_manager.cache_dir) == 0
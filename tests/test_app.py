@@ -0,0 +1,116 @@
+import os
+import threading
+
+import pytest
+
+import app
+from src.config import Config
+from src.strava_api import StravaAPI
+from src.synthetic_data import SyntheticDataset
+
+
+class FakeStravaAPI:
+    """The parts of StravaAPI the map job uses, over a synthetic dataset"""
+    
+    def __init__(self, dataset):
+        self.dataset = dataset
+    
+    def get_all_cycling_activities(self, days_back=365):
+        return self.dataset.activities_dataframe()
+    
+    def get_track_collection(self, activity_ids, progress=None):
+        return self.dataset.track_collection(activity_ids)
+    
+    get_summary_track_collection = staticmethod(StravaAPI.get_summary_track_collection)
+
+
+@pytest.fixture
+def client(monkeypatch, tmp_path):
+    monkeypatch.chdir(tmp_path)
+    dataset = SyntheticDataset(1, 6, 100, center=Config.DEFAULT_MAP_CENTER, spread_km=2.0)
+    monkeypatch.setattr(app, 'strava_api', FakeStravaAPI(dataset))
+    return app.app.test_client()
+
+
+def _job_file(result, name):
+    return os.path.join('maps', result['generated_files'][name])
+
+
+def _tiles_dir(result):
+    return os.path.join(os.path.dirname(_job_file(result, 'basic')), 'tiles', 'basic_heatmap')
+
+
+@pytest.mark.parametrize('region', [
+    {'bbox': '1,2'},
+    {'radius': '100'},
+    {'polyline': '40.7,-74.0;oops'},
+    'bbox',
+])
+def test_invalid_region_is_a_bad_request(client, region):
+    response = client.post('/api/generate-heatmaps', json={'region': region})
+    assert response.status_code == 400
+    assert 'Invalid region' in response.get_json()['error']
+
+
+def test_region_scopes_the_basic_map(client):
+    lat, lon = Config.DEFAULT_MAP_CENTER
+    params = {'map_types': ['basic'], 'activity_limit': 6, 'days_back': 365, 'quick': False,
+              'region': app.parse_region({'bbox': f"{lat - 1},{lon - 1},{lat + 1},{lon + 1}"})}
+    result = app.run_generate_heatmaps(params, lambda *args: None)
+    
+    assert os.path.basename(result['generated_files']['basic']) == 'basic_heatmap.html'
+    page = open(_job_file(result, 'basic')).read()
+    # Tiles rendered from the job's tracks, not the whole track store behind /tiles
+    assert '/tiles/heatmap/' not in page
+    assert os.path.isdir(_tiles_dir(result))
+
+
+def test_basic_map_draws_only_the_requested_activities(client):
+    params = {'map_types': ['basic'], 'activity_limit': 2, 'days_back': 365, 'quick': False}
+    result = app.run_generate_heatmaps(params, lambda *args: None)
+    
+    assert result['activities_processed'] == 2
+    page = open(_job_file(result, 'basic')).read()
+    assert '/tiles/heatmap/' not in page
+    assert os.listdir(_tiles_dir(result))
+
+
+def test_quick_basic_map_draws_the_summary_polylines(client):
+    params = {'map_types': ['basic'], 'activity_limit': 2, 'days_back': 365, 'quick': True}
+    result = app.run_generate_heatmaps(params, lambda *args: None)
+    
+    assert result['summary_activities'] == 6
+    assert result['activities_processed'] == 0
+    page = open(_job_file(result, 'basic')).read()
+    assert '/tiles/heatmap/' not in page
+    assert os.listdir(_tiles_dir(result))
+
+
+def test_concurrent_jobs_write_separate_outputs(client):
+    params = [{'map_types': ['basic', 'routes'], 'activity_limit': limit, 'days_back': 365, 'quick': False}
+              for limit in (2, 4)]
+    results = [None, None]
+    
+    def run(index):
+        results[index] = app.run_generate_heatmaps(params[index], lambda *args: None)
+    
+    threads = [threading.Thread(target=run, args=(index,)) for index in range(2)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    
+    first, second = results
+    assert os.path.dirname(first['generated_files']['basic']) != os.path.dirname(second['generated_files']['basic'])
+    for result in results:
+        assert os.path.basename(result['generated_files']['routes']) == 'routes_map.html'
+        assert os.listdir(_tiles_dir(result))
+        for path in result['generated_files'].values():
+            assert client.get(f"/maps/{path}").status_code == 200
+
+
+def test_old_job_outputs_are_removed(client, monkeypatch):
+    monkeypatch.setattr(Config, 'JOB_HISTORY_SIZE', 2)
+    job_dirs = [app.create_job_dir() for _ in range(4)]
+    
+    assert [os.path.isdir(job_dir) for job_dir in job_dirs] == [False, False, True, True]
@@ -0,0 +1,133 @@
+import gzip
+import os
+import struct
+
+import numpy as np
+import pytest
+
+from src.bulk_import import FIT_EPOCH, file_format, parse_activity_file, parse_fit, parse_gpx, parse_tcx
+
+FIXTURES = os.path.join(os.path.dirname(__file__), 'fixtures')
+START = 1714809600.0  # 2024-05-04T08:00:00Z
+
+
+def _fixture(name):
+    with open(os.path.join(FIXTURES, name), 'rb') as f:
+        return f.read()
+
+
+def test_parse_gpx():
+    columns = parse_gpx(_fixture('ride.gpx'))
+    np.testing.assert_allclose(columns['lat'], [45.0, 45.0009, 45.0018, 45.0018])
+    np.testing.assert_allclose(columns['lon'], [7.0, 7.0, 7.0, 7.00127])
+    np.testing.assert_allclose(columns['altitude'][:3], [250.0, 251.5, 253.0])
+    assert np.isnan(columns['altitude'][3])
+    assert columns['start_time'] == START
+    np.testing.assert_allclose(columns['time'], [0, 10, 20, 30])
+    # No distance or speed in GPX: derived from the points (0.0009 degrees of latitude is about 100 m)
+    np.testing.assert_allclose(np.diff(columns['distance']), 100.0, rtol=0.01)
+    np.testing.assert_allclose(columns['velocity'], 10.0, rtol=0.01)
+
+
+def test_parse_gpx_without_timestamps():
+    data = b''.join(line for line in _fixture('ride.gpx').splitlines(keepends=True) if b'<time>' not in line)
+    columns = parse_gpx(data)
+    assert len(columns['lat']) == 4
+    assert columns['start_time'] is None
+    assert np.isnan(columns['time']).all()
+    assert np.isnan(columns['velocity']).all()
+    assert columns['distance'][-1] > 0
+
+
+def test_parse_tcx():
+    # The fixture starts with a blank line, like Strava's TCX files
+    columns = parse_tcx(_fixture('ride.tcx'))
+    # The trackpoint without a position is skipped
+    np.testing.assert_allclose(columns['lat'], [45.0, 45.0009])
+    np.testing.assert_allclose(columns['distance'], [0.0, 100.1])
+    np.testing.assert_allclose(columns['velocity'], [0.0, 10.0])
+    np.testing.assert_allclose(columns['time'], [0, 10])
+    assert columns['start_time'] == START
+
+
+def _fit_file(messages):
+    """A FIT file of (header byte, payload bytes) messages, with a 14-byte file header"""
+    body = b''.join(bytes([header]) + payload for header, payload in messages)
+    return struct.pack('<BBHI4sH', 14, 0x20, 2132, len(body), b'.FIT', 0) + body + b'\x00\x00'
+
+
+def _definition(local_type, global_number, fields, endian='<'):
+    """Definition message of (field number, size, base type) fields"""
+    payload = struct.pack(endian + 'BBH', 0, 1 if endian == '>' else 0, global_number)
+    payload += bytes([len(fields)]) + b''.join(bytes(field) for field in fields)
+    return 0x40 | local_type, payload
+
+
+def _semicircles(degrees):
+    return int(round(degrees * 2 ** 31 / 180.0))
+
+
+RECORD_FIELDS = [(253, 4, 0x86), (0, 4, 0x85), (1, 4, 0x85), (2, 2, 0x84), (5, 4, 0x86), (6, 2, 0x84)]
+
+
+def _record(timestamp, lat, lon, altitude, distance, speed, endian='<', local_type=0):
+    return local_type, struct.pack(endian + 'IiiHIH', int(timestamp - FIT_EPOCH), _semicircles(lat),
+                                   _semicircles(lon), int((altitude + 500) * 5), int(distance * 100),
+                                   int(speed * 1000))
+
+
+def test_parse_fit():
+    data = _fit_file([
+        # A file_id message (global 0) is skipped
+        _definition(1, 0, [(4, 4, 0x86)]),
+        (1, struct.pack('<I', 1)),
+        _definition(0, 20, RECORD_FIELDS),
+        _record(START, 45.0, 7.0, 250.0, 0.0, 0.0),
+        _record(START + 10, 45.0009, 7.0, 251.4, 100.1, 10.0),
+        # A record without a position (invalid lat/lon) is skipped
+        (0, struct.pack('<IiiHIH', int(START + 15 - FIT_EPOCH), 0x7FFFFFFF, 0x7FFFFFFF, 0xFFFF, 0xFFFFFFFF, 0xFFFF)),
+    ])
+    columns = parse_fit(data)
+    np.testing.assert_allclose(columns['lat'], [45.0, 45.0009], atol=1e-7)
+    np.testing.assert_allclose(columns['lon'], [7.0, 7.0], atol=1e-7)
+    np.testing.assert_allclose(columns['altitude'], [250.0, 251.4])
+    np.testing.assert_allclose(columns['distance'], [0.0, 100.1])
+    np.testing.assert_allclose(columns['velocity'], [0.0, 10.0])
+    np.testing.assert_allclose(columns['time'], [0, 10])
+    assert columns['start_time'] == START
+
+
+def test_parse_fit_big_endian_and_compressed_timestamps():
+    position_fields = [(0, 4, 0x85), (1, 4, 0x85)]
+    data = _fit_file([
+        _definition(0, 20, RECORD_FIELDS, endian='>'),
+        _record(START, 45.0, 7.0, 250.0, 0.0, 0.0, endian='>'),
+        # Local type 1 records carry no timestamp field; their compressed headers hold one
+        _definition(1, 20, position_fields, endian='>'),
+        (0x80 | (1 << 5) | ((int(START - FIT_EPOCH) + 3) & 0x1F),
+         struct.pack('>ii', _semicircles(45.0003), _semicircles(7.0))),
+        (0x80 | (1 << 5) | ((int(START - FIT_EPOCH) + 33) & 0x1F),
+         struct.pack('>ii', _semicircles(45.0006), _semicircles(7.0))),
+    ])
+    columns = parse_fit(data)
+    np.testing.assert_allclose(columns['lat'], [45.0, 45.0003, 45.0006], atol=1e-7)
+    # The 5-bit offset wraps around: 30 s after the previous record, not 2 s before it
+    np.testing.assert_allclose(columns['time'], [0, 3, 33])
+
+
+def test_parse_fit_rejects_other_files():
+    with pytest.raises(ValueError):
+        parse_fit(b'not a fit file at all')
+    with pytest.raises(ValueError):
+        # A data message before any definition
+        parse_fit(_fit_file([(0, b'\x00' * 4)]))
+
+
+def test_parse_activity_file_dispatch():
+    assert file_format('activities/123.fit.gz') == 'fit'
+    assert file_format('activities/123.GPX') == 'gpx'
+    assert file_format('activities/123.csv') is None
+    columns = parse_activity_file('activities/1.gpx.gz', gzip.compress(_fixture('ride.gpx')))
+    assert len(columns['lat']) == 4
+    with pytest.raises(ValueError):
+        parse_activity_file('activities/1.kml', b'')
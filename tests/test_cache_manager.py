@@ -0,0 +1,80 @@
+import os
+import threading
+import time
+from datetime import timedelta
+
+import pytest
+
+from src.cache_manager import CacheManager
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return CacheManager(cache_dir=str(tmp_path / 'cache'), cache_duration_hours=1)
+
+
+def _age(cache, key, namespace, hours):
+    """Backdate an entry's modification time"""
+    path = cache._get_cache_path(key, namespace)
+    then = time.time() - hours * 3600
+    os.utime(path, (then, then))
+
+
+@pytest.mark.parametrize('namespace', ['default', 'activities'])
+def test_listing_namespaces_expire(cache, namespace):
+    cache.set('key', [1, 2, 3], namespace=namespace)
+    assert cache.get('key', namespace=namespace) == [1, 2, 3]
+    
+    _age(cache, 'key', namespace, 0.5)
+    assert cache.get('key', namespace=namespace) == [1, 2, 3]
+    
+    _age(cache, 'key', namespace, 2)
+    assert cache.get('key', namespace=namespace) is None
+
+
+@pytest.mark.parametrize('namespace', ['streams', 'athlete'])
+def test_immutable_namespaces_never_expire(cache, namespace):
+    cache.set('key', {'id': 1}, namespace=namespace)
+    _age(cache, 'key', namespace, 24 * 365 * 5)
+    assert cache.get('key', namespace=namespace) == {'id': 1}
+
+
+def test_namespace_policies_can_be_overridden(tmp_path):
+    cache = CacheManager(cache_dir=str(tmp_path), namespace_policies={'streams': timedelta(hours=1)})
+    cache.set('42', [0], namespace='streams')
+    _age(cache, '42', 'streams', 2)
+    assert cache.get('42', namespace='streams') is None
+
+
+def test_namespaces_are_separate_directories(cache):
+    cache.set('42', 'streams', namespace='streams')
+    cache.set('42', 'athlete', namespace='athlete')
+    
+    assert os.path.exists(os.path.join(cache.cache_dir, 'streams', '42.cache'))
+    assert cache.get('42', namespace='streams') == 'streams'
+    assert cache.get('42', namespace='athlete') == 'athlete'
+    
+    cache.clear('streams')
+    assert cache.get('42', namespace='streams') is None
+    assert cache.get('42', namespace='athlete') == 'athlete'
+
+
+def test_concurrent_writers_of_one_key_leave_a_complete_entry(cache, capsys):
+    payloads = [list(range(n, n + 20000)) for n in range(8)]
+    barrier = threading.Barrier(len(payloads))
+    
+    def write(payload):
+        barrier.wait()
+        for _ in range(5):
+            cache.set('shared', payload, namespace='streams')
+    
+    threads = [threading.Thread(target=write, args=(payload,)) for payload in payloads]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    
+    assert 'Error writing' not in capsys.readouterr().out
+    assert cache.get('shared', namespace='streams') in payloads
+    # No temporary files left behind
+    assert os.listdir(os.path.join(cache.cache_dir, 'streams')) == ['shared.cache']
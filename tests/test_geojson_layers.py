@@ -0,0 +1,40 @@
+import numpy as np
+
+from src.geojson_layers import colored_line_features
+from src.heatmap_generator import StravaHeatmapGenerator
+from src.tracks import ActivityTrack, TrackCollection
+
+
+def _collection(*lengths):
+    return TrackCollection.from_tracks([
+        ActivityTrack(i + 1, 40.7 + np.linspace(0, 0.01, n), -74.0 + np.linspace(0, 0.01, n))
+        for i, n in enumerate(lengths)
+    ])
+
+
+def test_runs_are_merged_per_class():
+    collection = _collection(5, 4)
+    classes = np.array([0, 0, 1, 1, 1, 0, 0, 0, 0])
+    features = colored_line_features(collection, np.arange(9), classes)
+    
+    lines = {feature['properties']['c']: feature['geometry']['coordinates'] for feature in features}
+    # Track 1: points 0-2 in class 0, 2-4 in class 1; track 2 is one class-0 run (no line across tracks)
+    assert [len(line) for line in lines[0]] == [3, 4]
+    assert [len(line) for line in lines[1]] == [3]
+
+
+def test_no_valid_values():
+    collection = _collection(5, 4)
+    assert colored_line_features(collection, np.arange(9), np.full(9, -1)) == []
+
+
+def test_single_point_tracks():
+    collection = _collection(1, 1, 1)
+    assert colored_line_features(collection, np.arange(3), np.zeros(3, dtype=int)) == []
+    assert colored_line_features(collection, np.arange(1), np.zeros(1, dtype=int)) == []
+
+
+def test_speed_heatmap_without_velocity_stream(tmp_path):
+    output = tmp_path / 'speed.html'
+    StravaHeatmapGenerator().create_speed_heatmap(_collection(50, 30), str(output))
+    assert output.exists()
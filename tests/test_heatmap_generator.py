@@ -0,0 +1,21 @@
+import numpy as np
+
+from src.config import Config
+from src.heatmap_generator import StravaHeatmapGenerator
+from src.tracks import ActivityTrack, TrackCollection
+
+
+def test_speed_legend_follows_speed_colors(tmp_path, monkeypatch):
+    monkeypatch.setattr(Config, 'SPEED_COLORS', {
+        'slow': {'color': 'purple', 'threshold': 20},
+        'fast': {'color': 'black', 'threshold': float('inf')}
+    })
+    track = ActivityTrack(1, 40.7 + np.linspace(0, 0.01, 50), -74.0 + np.linspace(0, 0.01, 50),
+                          velocity=np.linspace(1, 12, 50))
+    output = tmp_path / 'speed.html'
+    StravaHeatmapGenerator().create_speed_heatmap(TrackCollection.from_tracks([track]), str(output))
+    
+    legend = output.read_text().split('Speed Legend', 1)[1].split('</div>', 1)[0]
+    assert 'style="color:purple"></i> &lt; 20 km/h' in legend
+    assert 'style="color:black"></i> &gt; 20 km/h' in legend
+    assert 'km/h' not in legend.replace('20 km/h', '')
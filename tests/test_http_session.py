@@ -0,0 +1,91 @@
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from src.http_session import ConnectionTimings, PooledSession
+
+
+class KeepAliveHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    
+    def do_GET(self):
+        body = b'{"ok": true}'
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+    
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def server_url():
+    server = ThreadingHTTPServer(('127.0.0.1', 0), KeepAliveHandler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_address[1]}"
+    server.shutdown()
+    server.server_close()
+
+
+def test_summary_splits_connect_and_transfer_time():
+    timings = ConnectionTimings()
+    timings.record_connect(0.02)
+    for _ in range(4):
+        timings.record_request(0.05)
+    
+    summary = timings.summary()
+    assert summary['requests'] == 4
+    assert summary['connections_opened'] == 1
+    assert summary['connections_reused'] == 3
+    assert summary['connect_seconds'] == pytest.approx(0.02)
+    assert summary['transfer_seconds'] == pytest.approx(0.18)
+    assert summary['avg_connect_ms'] == pytest.approx(20.0)
+    assert summary['avg_transfer_ms'] == pytest.approx(45.0)
+    
+    timings.reset()
+    assert timings.summary()['requests'] == 0
+    assert timings.summary()['avg_transfer_ms'] == 0.0
+
+
+def test_sequential_requests_reuse_one_connection(server_url):
+    session = PooledSession(pool_size=2)
+    try:
+        for _ in range(5):
+            assert session.get(f"{server_url}/athlete", timeout=5).json() == {'ok': True}
+    finally:
+        session.close()
+    
+    summary = session.timings.summary()
+    assert summary['requests'] == 5
+    assert summary['connections_opened'] == 1
+    assert summary['connections_reused'] == 4
+
+
+def test_concurrent_requests_stay_within_the_pool(server_url):
+    session = PooledSession(pool_size=4)
+    barrier = threading.Barrier(4)
+    errors = []
+    
+    def worker():
+        barrier.wait()
+        try:
+            for _ in range(5):
+                session.get(f"{server_url}/activities", timeout=5).raise_for_status()
+        except Exception as e:
+            errors.append(e)
+    
+    threads = [threading.Thread(target=worker) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    session.close()
+    
+    assert errors == []
+    summary = session.timings.summary()
+    assert summary['requests'] == 20
+    assert 1 <= summary['connections_opened'] <= 4
@@ -0,0 +1,58 @@
+import numpy as np
+import pytest
+
+from src.polyline_codec import decode_polyline, decode_polylines, encode_polyline
+
+# Example from Google's encoded polyline algorithm format documentation
+GOOGLE_EXAMPLE = '_p~iF~ps|U_ulLnnqC_mqNvxq`@'
+GOOGLE_POINTS = [(38.5, -120.2), (40.7, -120.95), (43.252, -126.453)]
+
+
+def test_decode_reference_polyline():
+    np.testing.assert_allclose(decode_polyline(GOOGLE_EXAMPLE), GOOGLE_POINTS)
+
+
+def test_encode_reference_polyline():
+    lat, lon = zip(*GOOGLE_POINTS)
+    assert encode_polyline(np.array(lat), np.array(lon)) == GOOGLE_EXAMPLE
+
+
+def test_decode_empty_inputs():
+    offsets, lat, lon = decode_polylines([])
+    assert offsets.tolist() == [0] and len(lat) == 0 and len(lon) == 0
+    
+    offsets, lat, lon = decode_polylines(['', None, ''])
+    assert offsets.tolist() == [0, 0, 0, 0] and len(lat) == 0
+    assert decode_polyline('').shape == (0, 2)
+
+
+def test_decode_multiple_polylines():
+    rng = np.random.default_rng(0)
+    tracks = [np.round(np.column_stack([40 + np.cumsum(rng.normal(0, 0.01, n)),
+                                        -74 + np.cumsum(rng.normal(0, 0.01, n))]), 5)
+              for n in (3, 1, 0, 250)]
+    encoded = [encode_polyline(track[:, 0], track[:, 1]) for track in tracks]
+    encoded.insert(2, None)
+    
+    offsets, lat, lon = decode_polylines(encoded)
+    assert np.diff(offsets).tolist() == [3, 1, 0, 0, 250]
+    # Each polyline's deltas restart from zero, so no track leaks into the next
+    expected = np.concatenate([track for track in tracks if len(track)])
+    np.testing.assert_allclose(np.column_stack([lat, lon]), expected, atol=1e-9)
+
+
+def test_round_trip_large_deltas():
+    lat = np.array([-89.99999, 89.99999, 0.0, 0.00001])
+    lon = np.array([179.99999, -179.99999, 0.0, -0.00001])
+    np.testing.assert_allclose(decode_polyline(encode_polyline(lat, lon)), np.column_stack([lat, lon]), atol=1e-9)
+
+
+@pytest.mark.parametrize('malformed', [
+    GOOGLE_EXAMPLE[:-1],  # ends inside a value
+    '_p~iF',  # a latitude without its longitude
+    'abcé',  # not ASCII
+    '_p~iF ps|U',  # outside the polyline alphabet
+])
+def test_decode_malformed_polylines(malformed):
+    with pytest.raises(ValueError):
+        decode_polylines([GOOGLE_EXAMPLE, malformed])
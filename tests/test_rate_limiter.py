@@ -0,0 +1,123 @@
+import pytest
+
+from src.rate_limiter import RateLimiter, parse_retry_after
+
+MIDNIGHT = 86400.0 * 20000  # a UTC midnight, also a quarter-hour boundary
+
+
+class FakeClock:
+    def __init__(self, now):
+        self.now = now
+    
+    def __call__(self):
+        return self.now
+
+
+def _limiter(clock, **kwargs):
+    return RateLimiter(clock=clock, **kwargs)
+
+
+def _send(limiter, clock, seconds, interval=0.0):
+    """Send requests as fast as allowed (plus interval between them) for some seconds; returns the count"""
+    sent = 0
+    end = clock.now + seconds
+    while clock.now < end:
+        wait = limiter._reserve()
+        if wait > 0:
+            clock.now += wait
+        else:
+            sent += 1
+            clock.now += interval
+    return sent
+
+
+def test_full_window_budget_just_after_midnight():
+    clock = FakeClock(MIDNIGHT + 1)
+    limiter = _limiter(clock)
+    assert _send(limiter, clock, 898, interval=0.01) == 600
+
+
+def test_no_pacing_while_budget_remains():
+    clock = FakeClock(MIDNIGHT + 1)
+    limiter = _limiter(clock, short_limit=600, burst=50, reserve_fraction=0.1)
+    # Everything above the 60-request reserve goes out back-to-back, beyond the burst size
+    for _ in range(540):
+        assert limiter._reserve() == 0
+    assert limiter.remaining()['short']['remaining'] == 60
+
+
+def test_pacing_near_the_cap():
+    clock = FakeClock(MIDNIGHT + 1)
+    limiter = _limiter(clock, short_limit=100, burst=5, reserve_fraction=0.2)
+    for _ in range(80):
+        assert limiter._reserve() == 0
+    # The reserve starts with a burst of 5 ...
+    for _ in range(5):
+        assert limiter._reserve() == 0
+    # ... then the remaining 15 are spread over the rest of the window
+    wait = limiter._reserve()
+    assert wait == pytest.approx((900 - 1) / 15, rel=1e-6)
+    clock.now += wait
+    assert limiter._reserve() == 0
+    # Every one of them still fits in the window
+    assert _send(limiter, clock, MIDNIGHT + 900 - clock.now - 1e-6) == 14
+
+
+def test_exhausted_window_waits_for_reset():
+    clock = FakeClock(MIDNIGHT + 100)
+    limiter = _limiter(clock, short_limit=10, burst=10, reserve_fraction=0.0)
+    for _ in range(10):
+        assert limiter._reserve() == 0
+    assert limiter._reserve() == pytest.approx(800)
+    clock.now = MIDNIGHT + 900
+    assert limiter._reserve() == 0
+
+
+def test_header_updates_are_authoritative():
+    clock = FakeClock(MIDNIGHT + 1)
+    limiter = _limiter(clock)
+    limiter.update_from_headers({'X-RateLimit-Limit': '200,2000', 'X-RateLimit-Usage': '195,1000'})
+    report = limiter.remaining()
+    assert report['short'] == {'limit': 200, 'usage': 195, 'remaining': 5, 'resets_in_seconds': 899.0}
+    assert report['daily']['remaining'] == 1000
+    # The last 5 requests of the window fit in one burst, then the window is exhausted
+    for _ in range(5):
+        assert limiter._reserve() == 0
+    assert limiter._reserve() == pytest.approx(899)
+    
+    # Malformed or partial headers are ignored
+    limiter.update_from_headers({'X-RateLimit-Limit': 'abc', 'X-RateLimit-Usage': '1,2'})
+    limiter.update_from_headers({'X-RateLimit-Usage': '1,2'})
+    assert limiter.remaining()['short']['limit'] == 200
+
+
+def test_daily_window_paces_near_its_cap():
+    clock = FakeClock(MIDNIGHT + 3600)
+    limiter = _limiter(clock, short_limit=600, daily_limit=1000, burst=10, reserve_fraction=0.1)
+    limiter.update_from_headers({'X-RateLimit-Limit': '600,1000', 'X-RateLimit-Usage': '0,950'})
+    assert _send(limiter, clock, 60) < 20
+
+
+def test_penalize():
+    clock = FakeClock(MIDNIGHT + 300)
+    limiter = _limiter(clock)
+    assert limiter.penalize(30) == 30
+    assert limiter._reserve() == pytest.approx(30)
+    clock.now += 30
+    assert limiter._reserve() == 0
+    
+    # Without Retry-After the wait lasts until the 15-minute window resets
+    clock.now = MIDNIGHT + 1000
+    assert limiter.penalize() == pytest.approx(800)
+    assert limiter.penalize(-5) == 0
+
+
+def test_parse_retry_after():
+    assert parse_retry_after('120') == 120
+    assert parse_retry_after(' 1.5 ') == 1.5
+    assert parse_retry_after('-3') == 0
+    assert parse_retry_after('Wed, 21 Oct 2015 07:28:00 GMT', now=1445412470) == 10
+    assert parse_retry_after('Wed, 21 Oct 2015 07:28:00 GMT', now=1445412500) == 0
+    assert parse_retry_after(None) is None
+    assert parse_retry_after('') is None
+    assert parse_retry_after('soon') is None
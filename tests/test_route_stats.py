@@ -0,0 +1,52 @@
+import numpy as np
+import pytest
+
+from src.route_stats import ellipsoidal_distances, haversine_distances, segment_distances
+
+
+def _dms(degrees, minutes, seconds):
+    sign = -1 if degrees < 0 else 1
+    return sign * (abs(degrees) + minutes / 60 + seconds / 3600)
+
+
+# (lat1, lon1, lat2, lon2, meters) from published solutions of Vincenty's inverse problem
+KNOWN_DISTANCES = [
+    # Flinders Peak to Buninyong (Geoscience Australia worked example)
+    (_dms(-37, 57, 3.72030), _dms(144, 25, 29.52440), _dms(-37, 39, 10.15610), _dms(143, 55, 35.38390), 54972.271),
+    # Newport, RI to Cleveland, OH (geopy documentation)
+    (41.49008, -71.312796, 41.499498, -81.695391, 866455.4329),
+    # One degree of longitude along the equator
+    (0.0, 0.0, 0.0, 1.0, 111319.4908),
+    # One degree of latitude from the equator
+    (0.0, 0.0, 1.0, 0.0, 110574.3886),
+]
+
+
+@pytest.mark.parametrize('lat1, lon1, lat2, lon2, meters', KNOWN_DISTANCES)
+def test_ellipsoidal_distances_known_values(lat1, lon1, lat2, lon2, meters):
+    distance = ellipsoidal_distances([lat1], [lon1], [lat2], [lon2])[0]
+    assert distance == pytest.approx(meters, abs=1e-3)
+
+
+def test_ellipsoidal_distances_vectorized():
+    lat1, lon1, lat2, lon2, meters = (np.array(column) for column in zip(*KNOWN_DISTANCES))
+    np.testing.assert_allclose(ellipsoidal_distances(lat1, lon1, lat2, lon2), meters, atol=1e-3)
+
+
+def test_ellipsoidal_distances_identical_points():
+    assert ellipsoidal_distances([52.2], [21.0], [52.2], [21.0])[0] == 0.0
+
+
+def test_ellipsoidal_distances_nearly_antipodal_falls_back_to_haversine():
+    distance = ellipsoidal_distances([0.0], [0.0], [0.5], [179.7])[0]
+    assert np.isfinite(distance)
+    assert distance == pytest.approx(haversine_distances([0.0], [0.0], [0.5], [179.7])[0], rel=1e-2)
+
+
+def test_ellipsoidal_distances_match_geopy():
+    geodesic = pytest.importorskip('geopy.distance').geodesic
+    rng = np.random.default_rng(0)
+    lat = 45 + np.cumsum(rng.normal(0, 1e-3, 200))
+    lon = 7 + np.cumsum(rng.normal(0, 1e-3, 200))
+    expected = [geodesic((lat[i], lon[i]), (lat[i + 1], lon[i + 1])).meters for i in range(len(lat) - 1)]
+    np.testing.assert_allclose(segment_distances(lat, lon), expected, atol=1e-3)
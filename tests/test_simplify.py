@@ -0,0 +1,78 @@
+import numpy as np
+import pytest
+
+from src.simplify import douglas_peucker, simplify_collection, visvalingam
+from src.tracks import ActivityTrack, TrackCollection
+
+
+def _segment_distance(x, y, i, start, end):
+    dx, dy = x[end] - x[start], y[end] - y[start]
+    px, py = x[i] - x[start], y[i] - y[start]
+    length_sq = dx * dx + dy * dy
+    t = min(max((px * dx + py * dy) / length_sq, 0.0), 1.0) if length_sq > 0 else 0.0
+    return np.hypot(px - t * dx, py - t * dy)
+
+
+def reference_douglas_peucker(x, y, tolerance):
+    """Textbook recursive Douglas-Peucker on one line"""
+    keep = np.zeros(len(x), dtype=bool)
+    if not len(x):
+        return keep
+    keep[0] = keep[-1] = True
+    
+    def split(start, end):
+        if end - start < 2:
+            return
+        distances = [_segment_distance(x, y, i, start, end) for i in range(start + 1, end)]
+        farthest = start + 1 + int(np.argmax(distances))
+        if distances[farthest - start - 1] > tolerance:
+            keep[farthest] = True
+            split(start, farthest)
+            split(farthest, end)
+    
+    split(0, len(x) - 1)
+    return keep
+
+
+def _random_walks(lengths, seed=0):
+    rng = np.random.default_rng(seed)
+    offsets = np.concatenate([[0], np.cumsum(lengths)])
+    x = np.cumsum(rng.normal(0, 10, offsets[-1]))
+    y = np.cumsum(rng.normal(0, 10, offsets[-1]))
+    return x, y, offsets
+
+
+@pytest.mark.parametrize('tolerance', [0.5, 5.0, 25.0, 200.0])
+def test_douglas_peucker_matches_reference(tolerance):
+    x, y, offsets = _random_walks([0, 1, 2, 3, 50, 400, 1000])
+    keep = douglas_peucker(x, y, offsets, tolerance)
+    expected = np.concatenate([reference_douglas_peucker(x[a:b], y[a:b], tolerance)
+                               for a, b in zip(offsets[:-1], offsets[1:])])
+    np.testing.assert_array_equal(keep, expected)
+
+
+def test_douglas_peucker_per_track_tolerance():
+    x, y, offsets = _random_walks([300, 300], seed=1)
+    tolerances = np.array([2.0, 50.0])
+    keep = douglas_peucker(x, y, offsets, tolerances)
+    for (a, b), tolerance in zip(zip(offsets[:-1], offsets[1:]), tolerances):
+        np.testing.assert_array_equal(keep[a:b], reference_douglas_peucker(x[a:b], y[a:b], tolerance))
+
+
+def test_visvalingam_keeps_ends_and_spikes():
+    x = np.arange(11, dtype=float) * 10
+    y = np.zeros(11)
+    y[5] = 100.0
+    keep = visvalingam(x, y, np.array([0, 11]), tolerance=5.0)
+    assert keep[0] and keep[-1] and keep[5]
+    # The collinear points on both sides of the spike collapse
+    assert keep.sum() == 5
+
+
+def test_simplify_collection_keeps_track_structure():
+    tracks = [ActivityTrack(i, 40.7 + np.linspace(0, 0.05, 500), -74.0 + np.linspace(0, 0.05, 500) ** 1.5)
+              for i in range(3)]
+    simplified = simplify_collection(TrackCollection.from_tracks(tracks), tolerance=5.0)
+    assert len(simplified) == 3
+    assert (simplified.lengths >= 2).all()
+    assert simplified.point_count < 3 * 500
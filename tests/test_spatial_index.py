@@ -0,0 +1,59 @@
+import numpy as np
+import pytest
+
+from src.spatial_index import SpatialIndex
+
+CELL = 0.5
+
+
+def _index(tracks, cell_size=CELL):
+    lat = np.concatenate([np.asarray(track, dtype=float).reshape(-1, 2)[:, 0] for track in tracks])
+    lon = np.concatenate([np.asarray(track, dtype=float).reshape(-1, 2)[:, 1] for track in tracks])
+    offsets = np.concatenate([[0], np.cumsum([len(track) for track in tracks])])
+    return SpatialIndex.build(np.arange(1, len(tracks) + 1), offsets, lat, lon, cell_size)
+
+
+def _brute_force(tracks, min_lat, min_lon, max_lat, max_lon):
+    return sorted(i + 1 for i, track in enumerate(tracks)
+                  if any(min_lat <= lat <= max_lat and min_lon <= lon <= max_lon for lat, lon in track))
+
+
+def test_points_on_cell_edges():
+    # Track 1 sits exactly on a cell corner, track 2 just below it, track 3 just left of it
+    tracks = [[(1.0, 2.0)], [(0.999999, 2.25)], [(1.25, 1.999999)]]
+    index = _index(tracks)
+    assert sorted(index.query_bbox(1.0, 2.0, 1.5, 2.5)) == [1]
+    assert sorted(index.query_bbox(0.5, 2.0, 1.0, 2.5)) == [1, 2]
+    assert sorted(index.query_bbox(1.0, 1.5, 1.5, 2.0)) == [1, 3]
+    # A box that is a single edge line
+    assert sorted(index.query_bbox(1.0, 1.0, 1.0, 3.0)) == [1]
+
+
+def test_interior_cells_come_from_the_pair_table():
+    # One point in the middle cell of a 3x3-cell box, which is never tested point by point
+    tracks = [[(10.75, 20.75)], [(10.25, 20.25)], [(11.6, 21.6)]]
+    index = _index(tracks)
+    assert sorted(index.query_bbox(10.5, 20.5, 11.0, 21.0)) == [1]
+    assert sorted(index.query_bbox(10.0, 20.0, 11.5, 21.5)) == [1, 2]
+
+
+def test_world_edges_and_empty_queries():
+    tracks = [[(90.0, 180.0)], [(-90.0, -180.0)]]
+    index = _index(tracks)
+    assert sorted(index.query_bbox(89.5, 179.5, 90.0, 180.0)) == [1]
+    assert sorted(index.query_bbox(-90.0, -180.0, 90.0, 180.0)) == [1, 2]
+    assert len(index.query_bbox(1.0, 1.0, 0.0, 2.0)) == 0
+    assert len(_index([[]]).query_bbox(-90.0, -180.0, 90.0, 180.0)) == 0
+
+
+@pytest.mark.parametrize('seed', range(5))
+def test_query_bbox_matches_brute_force(seed):
+    rng = np.random.default_rng(seed)
+    # Points snapped to a quarter-cell lattice, so many lie exactly on cell and box edges
+    tracks = [rng.integers(0, 24, (rng.integers(1, 8), 2)) * CELL / 4 for _ in range(60)]
+    index = _index(tracks)
+    for _ in range(50):
+        min_lat, max_lat = np.sort(rng.integers(0, 24, 2) * CELL / 4)
+        min_lon, max_lon = np.sort(rng.integers(0, 24, 2) * CELL / 4)
+        assert sorted(index.query_bbox(min_lat, min_lon, max_lat, max_lon)) == \
+            _brute_force(tracks, min_lat, min_lon, max_lat, max_lon)
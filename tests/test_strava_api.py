@@ -0,0 +1,181 @@
+import json
+import os
+import threading
+import time
+
+import pytest
+import requests
+
+from src.rate_limiter import RateLimiter
+from src.strava_api import StravaAPI
+from src.synthetic_data import SyntheticDataset
+from src.track_store import TrackStore
+
+
+class FakeClock:
+    def __init__(self, now=86400.0 * 20000):
+        self.now = now
+    
+    def __call__(self):
+        return self.now
+
+
+def _response(url, status=200, payload=None, headers=None):
+    response = requests.Response()
+    response.url = url
+    response.status_code = status
+    response._content = json.dumps(payload if payload is not None else {}).encode()
+    response.headers.update(headers or {})
+    return response
+
+
+class FakeSession:
+    """Serves stream requests from a synthetic dataset, with scripted failures per activity"""
+    
+    def __init__(self, dataset):
+        self.dataset = dataset
+        self.scripts = {}
+        self.calls = []
+        self._lock = threading.Lock()
+    
+    def get(self, url, headers=None, params=None, timeout=None):
+        activity_id = int(url.rstrip('/').split('/')[-2])
+        with self._lock:
+            self.calls.append(activity_id)
+            script = self.scripts.get(activity_id)
+            action = script.pop(0) if script else None
+        
+        if isinstance(action, Exception):
+            raise action
+        if isinstance(action, requests.Response):
+            return action
+        return _response(url, payload=self.dataset.stream_payload(activity_id))
+    
+    def close(self):
+        pass
+
+
+@pytest.fixture
+def dataset():
+    return SyntheticDataset(1, 5, 50)
+
+
+class FakeSleep:
+    """Stands in for time.sleep: records each wait and advances the clock instead"""
+    
+    def __init__(self, clock):
+        self.clock = clock
+        self.waits = []
+    
+    def __call__(self, seconds):
+        self.waits.append(seconds)
+        self.clock.now += seconds
+
+
+@pytest.fixture
+def sleeps(monkeypatch):
+    sleep = FakeSleep(FakeClock())
+    monkeypatch.setattr(time, 'sleep', sleep)
+    return sleep
+
+
+def _api(dataset, sleeps, **kwargs):
+    api = StravaAPI('id', 'secret', 'token', **kwargs)
+    api.rate_limiter = RateLimiter(clock=sleeps.clock)
+    api.session = FakeSession(dataset)
+    return api
+
+
+@pytest.fixture
+def cache_dir(monkeypatch, tmp_path):
+    monkeypatch.chdir(tmp_path)
+    return os.path.join(tmp_path, 'cache')
+
+
+def test_fetches_and_builds_every_activity(cache_dir, dataset, sleeps):
+    api = _api(dataset, sleeps, max_workers=3)
+    ids = dataset.activity_ids()
+    
+    results = dict(api.iter_activities_with_detailed_streams(ids, as_tracks=True))
+    
+    assert sorted(results) == ids
+    assert all(track is not None for track in results.values())
+    assert sorted(api.session.calls) == ids
+    assert sleeps.waits == []
+
+
+def test_cache_hits_are_served_without_requests(cache_dir, dataset, sleeps):
+    ids = dataset.activity_ids()
+    list(_api(dataset, sleeps).iter_activities_with_detailed_streams(ids))
+    
+    api = _api(dataset, sleeps)
+    results = dict(api.iter_activities_with_detailed_streams(ids))
+    
+    assert api.session.calls == []
+    assert sorted(results) == ids
+    assert all(activity is not None for activity in results.values())
+
+
+def test_fetch_errors_are_isolated_per_activity(cache_dir, dataset, sleeps):
+    api = _api(dataset, sleeps, max_workers=2)
+    ids = dataset.activity_ids()
+    server_error, broken_connection = ids[1], ids[3]
+    api.session.scripts[server_error] = [_response('streams', status=500) for _ in range(3)]
+    api.session.scripts[broken_connection] = [requests.exceptions.ConnectionError('reset')] * 3
+    
+    results = dict(api.iter_activities_with_detailed_streams(ids))
+    
+    assert sorted(results) == ids
+    assert results[server_error] is None
+    assert results[broken_connection] is None
+    assert all(results[activity_id] is not None for activity_id in ids
+               if activity_id not in (server_error, broken_connection))
+    assert api.session.calls.count(server_error) == 3
+    # Exponential backoff between connection attempts
+    assert sleeps.waits == [1, 2]
+    
+    # Failed activities are not cached, so the next run retries only those
+    api = _api(dataset, sleeps)
+    results = dict(api.iter_activities_with_detailed_streams(ids))
+    assert sorted(api.session.calls) == sorted([server_error, broken_connection])
+    assert all(activity is not None for activity in results.values())
+
+
+def test_rate_limited_request_waits_and_retries(cache_dir, dataset, sleeps):
+    api = _api(dataset, sleeps, max_workers=1)
+    activity_id = dataset.activity_ids()[0]
+    api.session.scripts[activity_id] = [_response('streams', status=429, headers={'Retry-After': '7'})]
+    
+    results = dict(api.iter_activities_with_detailed_streams([activity_id]))
+    
+    assert results[activity_id] is not None
+    assert api.session.calls == [activity_id, activity_id]
+    assert sleeps.waits == [7]
+
+
+def test_unparseable_retry_after_waits_for_window_reset(cache_dir, dataset, sleeps):
+    api = _api(dataset, sleeps, max_workers=1)
+    activity_id = dataset.activity_ids()[0]
+    api.session.scripts[activity_id] = [
+        _response('streams', status=429, headers={'Retry-After': 'not a date'})
+    ]
+    
+    results = dict(api.iter_activities_with_detailed_streams([activity_id]))
+    
+    assert results[activity_id] is not None
+    # The fake clock starts on a quarter-hour boundary
+    assert sleeps.waits == [900]
+
+
+def test_fetched_tracks_are_flushed_when_iteration_stops_early(cache_dir, dataset, sleeps):
+    api = _api(dataset, sleeps, max_workers=2)
+    ids = dataset.activity_ids()
+    
+    iterator = api.iter_activities_with_detailed_streams(ids)
+    next(iterator)
+    iterator.close()
+    
+    # The executor finished every submitted fetch; all of them were written in one segment
+    store = TrackStore(os.path.join(cache_dir, 'tracks'))
+    assert all(store.get_columns(activity_id) is not None for activity_id in ids)
+    assert len(store._segment_dirs()) == 1
@@ -0,0 +1,55 @@
+import numpy as np
+
+from src.tile_renderer import lonlat_to_mercator
+from src.tile_server import TileServer
+from src.track_store import TrackStore
+
+
+def _store(tmp_path, lat, lon):
+    store = TrackStore(str(tmp_path / 'tracks'))
+    store.put_columns(1, {'lat': np.asarray(lat, dtype=np.float64), 'lon': np.asarray(lon, dtype=np.float64)})
+    store.flush()
+    return store
+
+
+def _tile_of(lat, lon, z):
+    x, y = lonlat_to_mercator(np.array([lat]), np.array([lon]))
+    return int(x[0] * (1 << z)), int(y[0] * (1 << z))
+
+
+def test_tile_cache_hits_and_lru_eviction(tmp_path):
+    lat = 40.7 + np.linspace(0, 0.05, 200)
+    lon = -74.0 + np.linspace(0, 0.05, 200)
+    server = TileServer(_store(tmp_path, lat, lon), cache_dir=str(tmp_path / 'tiles'), memory_tiles=1)
+    z = 12
+    x, y = _tile_of(lat[0], lon[0], z)
+    
+    png = server.get_tile('heatmap', z, x, y)
+    assert png.startswith(b'\x89PNG')
+    assert server.stats['rendered'] == 1
+    
+    assert server.get_tile('heatmap', z, x, y) == png
+    assert server.stats['memory_hits'] == 1
+    
+    # A second tile evicts the first from memory; it comes back from disk, not re-rendered
+    server.get_tile('heatmap', z - 1, x // 2, y // 2)
+    assert server.get_tile('heatmap', z, x, y) == png
+    assert server.stats['disk_hits'] == 1
+    assert server.stats['rendered'] == 2
+
+
+def test_empty_and_invalid_tiles(tmp_path):
+    server = TileServer(_store(tmp_path, [40.7] * 20, [-74.0] * 20), cache_dir=str(tmp_path / 'tiles'))
+    assert server.get_tile('heatmap', 3, 0, 0) == server._empty_tile
+    assert server.stats['rendered'] == 0
+    assert server.get_tile('heatmap', 3, 8, 0) is None
+    assert server.get_tile('unknown', 3, 0, 0) is None
+
+
+def test_new_tracks_change_the_etag(tmp_path):
+    store = _store(tmp_path, [40.7] * 20, [-74.0] * 20)
+    server = TileServer(store, cache_dir=str(tmp_path / 'tiles'))
+    etag = server.etag('heatmap', 3, 2, 3)
+    store.put_columns(2, {'lat': np.full(20, 41.0), 'lon': np.full(20, -73.0)})
+    store.flush()
+    assert server.etag('heatmap', 3, 2, 3) != etag
@@ -0,0 +1,165 @@
+import os
+
+import numpy as np
+import pytest
+
+from src.cache_manager import CacheManager
+from src.strava_api import StravaAPI
+from src.synthetic_data import SyntheticDataset
+from src.track_store import TrackStore
+
+
+@pytest.fixture
+def dataset():
+    return SyntheticDataset(1, 6, 40)
+
+
+@pytest.fixture
+def store_dir(tmp_path):
+    return str(tmp_path / 'tracks')
+
+
+def _segments(store_dir):
+    return sorted(name for name in os.listdir(store_dir) if name.startswith('seg_'))
+
+
+def _assert_same_streams(actual, expected):
+    assert sorted(actual) == sorted(expected)
+    for stream_type, data in expected.items():
+        np.testing.assert_allclose(np.asarray(actual[stream_type]['data'], dtype=float),
+                                   np.asarray(data['data'], dtype=float), rtol=1e-6)
+
+
+def test_streams_round_trip_through_a_memory_mapped_segment(store_dir, dataset):
+    store = TrackStore(store_dir)
+    ids = dataset.activity_ids()
+    for activity_id in ids:
+        store.put_streams(activity_id, dataset.stream_payload(activity_id))
+    
+    # Buffered activities are readable before they are flushed
+    assert ids[0] in store and len(store) == len(ids)
+    store.flush()
+    assert _segments(store_dir) == ['seg_000001']
+    
+    reloaded = TrackStore(store_dir)
+    assert reloaded.ids() == ids
+    for activity_id in ids:
+        _assert_same_streams(reloaded.get_streams(activity_id), dataset.stream_payload(activity_id))
+    assert isinstance(reloaded.get_columns(ids[0])['lat'], np.memmap)
+    
+    loaded_ids, offsets, columns = reloaded.load_columns()
+    assert loaded_ids.tolist() == ids
+    assert offsets[-1] == len(columns['lat']) == len(columns['min_zoom'])
+
+
+def test_missing_streams_are_flagged_absent(store_dir, dataset):
+    activity_id = dataset.activity_ids()[0]
+    payload = dataset.stream_payload(activity_id)
+    del payload['altitude']
+    payload['velocity_smooth']['data'] = payload['velocity_smooth']['data'][:-1]
+    
+    store = TrackStore(store_dir)
+    store.put_streams(activity_id, payload)
+    store.put_streams(activity_id + 100, {})
+    store.flush()
+    
+    reloaded = TrackStore(store_dir)
+    streams = reloaded.get_streams(activity_id)
+    assert sorted(streams) == ['distance', 'latlng', 'time']
+    assert np.isnan(reloaded.get_columns(activity_id)['altitude']).all()
+    assert reloaded.get_streams(activity_id + 100) == {}
+
+
+def test_compact_merges_segments_and_later_writes_win(store_dir, dataset):
+    store = TrackStore(store_dir, compact_threshold=100)
+    ids = dataset.activity_ids()
+    for activity_id in ids:
+        store.put_streams(activity_id, dataset.stream_payload(activity_id))
+        store.flush()
+    # A newer version of the first activity
+    short = dataset.stream_payload(ids[1])
+    store.put_streams(ids[0], short)
+    store.flush()
+    assert len(_segments(store_dir)) == len(ids) + 1
+    
+    store.compact()
+    
+    assert len(_segments(store_dir)) == 1
+    reloaded = TrackStore(store_dir)
+    assert reloaded.ids() == ids
+    _assert_same_streams(reloaded.get_streams(ids[0]), short)
+    _assert_same_streams(reloaded.get_streams(ids[-1]), dataset.stream_payload(ids[-1]))
+
+
+def test_flush_compacts_past_the_threshold(store_dir, dataset):
+    store = TrackStore(store_dir, compact_threshold=3)
+    for activity_id in dataset.activity_ids()[:4]:
+        store.put_streams(activity_id, dataset.stream_payload(activity_id))
+        store.flush()
+    
+    assert len(_segments(store_dir)) == 1
+    assert len(TrackStore(store_dir)) == 4
+
+
+def test_compact_keeps_segments_written_by_other_stores(store_dir, dataset):
+    ids = dataset.activity_ids()
+    store = TrackStore(store_dir, compact_threshold=100)
+    for activity_id in ids[:3]:
+        store.put_streams(activity_id, dataset.stream_payload(activity_id))
+        store.flush()
+    
+    # Another process flushes after this store last loaded the directory
+    other = TrackStore(store_dir, compact_threshold=100)
+    other.put_streams(ids[3], dataset.stream_payload(ids[3]))
+    other.flush()
+    
+    store.compact()
+    
+    assert len(_segments(store_dir)) == 2
+    assert TrackStore(store_dir).ids() == ids[:4]
+
+
+def test_segment_number_taken_by_another_writer_is_skipped(store_dir, dataset, monkeypatch):
+    ids = dataset.activity_ids()
+    store = TrackStore(store_dir)
+    store.put_streams(ids[0], dataset.stream_payload(ids[0]))
+    store.flush()
+    
+    # A listing taken before another writer committed seg_000001
+    monkeypatch.setattr(store, '_segment_dirs', lambda: [])
+    store.put_streams(ids[1], dataset.stream_payload(ids[1]))
+    store.flush()
+    monkeypatch.undo()
+    
+    assert _segments(store_dir) == ['seg_000001', 'seg_000002']
+    assert not [name for name in os.listdir(store_dir) if name.startswith('tmp_')]
+    assert TrackStore(store_dir).ids() == ids[:2]
+
+
+def test_clear_removes_committed_and_buffered_tracks(store_dir, dataset):
+    ids = dataset.activity_ids()
+    store = TrackStore(store_dir)
+    store.put_streams(ids[0], dataset.stream_payload(ids[0]))
+    store.flush()
+    store.put_streams(ids[1], dataset.stream_payload(ids[1]))
+    
+    store.clear()
+    
+    assert len(store) == 0
+    assert os.listdir(store_dir) == []
+    store.flush()
+    assert len(TrackStore(store_dir)) == 0
+
+
+def test_streams_from_the_old_pickle_cache_move_into_the_store(tmp_path, monkeypatch, dataset):
+    monkeypatch.chdir(tmp_path)
+    activity_id = dataset.activity_ids()[0]
+    legacy = CacheManager()
+    legacy.set(legacy.get_streams_cache_key(activity_id), dataset.stream_payload(activity_id), namespace='streams')
+    
+    api = StravaAPI('id', 'secret', 'token')
+    _assert_same_streams(api.get_activity_streams(activity_id), dataset.stream_payload(activity_id))
+    api.close()
+    
+    store = TrackStore(os.path.join('cache', 'tracks'))
+    _assert_same_streams(store.get_streams(activity_id), dataset.stream_payload(activity_id))
@@ -0,0 +1,42 @@
+import numpy as np
+
+from src.tracks import ActivityTrack, TrackCollection
+
+
+def _collection():
+    return TrackCollection.from_tracks([
+        ActivityTrack(1, 40.7 + np.linspace(0, 0.02, 30), -74.0 + np.linspace(0, 0.03, 30)),
+        ActivityTrack(2, 40.8 + np.linspace(0, 0.01, 20), -73.9 + np.linspace(0, 0.01, 20))
+    ])
+
+
+def test_save_and_load_round_trip(tmp_path):
+    collection = _collection()
+    collection.save(str(tmp_path))
+    loaded = TrackCollection.load(str(tmp_path))
+    np.testing.assert_array_equal(loaded.ids, collection.ids)
+    np.testing.assert_array_equal(loaded.offsets, collection.offsets)
+    np.testing.assert_array_equal(loaded.lat, collection.lat)
+
+
+def test_saved_summary_is_reused(tmp_path, monkeypatch):
+    collection = _collection()
+    summary = collection.summary()
+    collection.save(str(tmp_path))
+    
+    def fail(*args, **kwargs):
+        raise AssertionError("summary recomputed")
+    monkeypatch.setattr('src.tracks.DatasetSummary.compute', fail)
+    loaded = TrackCollection.load(str(tmp_path)).summary()
+    assert loaded.bounds == summary.bounds
+    assert loaded.density_center == summary.density_center
+    assert loaded.zoom == summary.zoom
+    assert loaded.point_count == 50
+
+
+def test_saving_without_summary_drops_a_stale_one(tmp_path):
+    collection = _collection()
+    collection.summary()
+    collection.save(str(tmp_path))
+    _collection().head(1).save(str(tmp_path))
+    assert TrackCollection.load(str(tmp_path)).summary().activity_count == 1
@@ -0,0 +1,62 @@
+import numpy as np
+import pytest
+
+from src.spatial_index import SpatialIndex
+from src.tile_renderer import lonlat_to_mercator
+from src.viewport_heatmap import activity_time_mask, mercator_to_lonlat, viewport_cells
+
+
+def _index(seed=0, n_activities=20, points=200):
+    rng = np.random.default_rng(seed)
+    lat = 40.7 + rng.uniform(0, 0.1, n_activities * points)
+    lon = -74.0 + rng.uniform(0, 0.1, n_activities * points)
+    offsets = np.arange(n_activities + 1) * points
+    return SpatialIndex.build(np.arange(100, 100 + n_activities), offsets, lat, lon, 0.01)
+
+
+def test_mercator_round_trip():
+    lat, lon = np.array([-60.0, 0.0, 40.7, 85.0]), np.array([-179.0, 0.0, -74.0, 179.0])
+    back_lat, back_lon = mercator_to_lonlat(*lonlat_to_mercator(lat, lon))
+    np.testing.assert_allclose(back_lat, lat, atol=1e-9)
+    np.testing.assert_allclose(back_lon, lon, atol=1e-9)
+
+
+def test_cells_count_every_point_in_the_viewport():
+    index = _index()
+    bbox = (40.72, -73.98, 40.78, -73.92)
+    result = viewport_cells(index, bbox, zoom=14)
+    expected = len(index.points_in_bbox(*bbox))
+    assert result['point_count'] == expected
+    assert sum(count for _, _, count in result['cells']) == expected
+    for lat, lon, _ in result['cells']:
+        assert bbox[0] - 0.01 <= lat <= bbox[2] + 0.01 and bbox[1] - 0.01 <= lon <= bbox[3] + 0.01
+
+
+def test_cells_are_coarsened_to_the_budget():
+    index = _index()
+    result = viewport_cells(index, (40.7, -74.0, 40.8, -73.9), zoom=18, max_cells=50)
+    assert len(result['cells']) <= 50
+    assert result['cell_pixels'] > 4
+    assert sum(count for _, _, count in result['cells']) == result['point_count']
+
+
+def test_activity_mask_and_time_range():
+    index = _index()
+    start_times = {int(activity_id): 1000.0 * i for i, activity_id in enumerate(index.ids)}
+    mask = activity_time_mask(index.ids, start_times, 5000.0, 10000.0)
+    assert mask.sum() == 5
+    assert activity_time_mask(index.ids, start_times) is None
+    
+    everything = viewport_cells(index, (40.7, -74.0, 40.8, -73.9), zoom=12)
+    some = viewport_cells(index, (40.7, -74.0, 40.8, -73.9), zoom=12, activity_mask=mask)
+    assert some['point_count'] == 5 * 200
+    assert everything['point_count'] == 20 * 200
+
+
+def test_invalid_viewports():
+    index = _index()
+    with pytest.raises(ValueError):
+        viewport_cells(index, (41.0, -74.0, 40.0, -73.0), zoom=10)
+    with pytest.raises(ValueError):
+        viewport_cells(index, (40.0, -74.0, 41.0, -73.0), zoom=30)
+    assert viewport_cells(index, (10.0, 10.0, 11.0, 11.0), zoom=10)['cells'] == []